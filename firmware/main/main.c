@@ -1,6 +1,7 @@
 #include <freertos/FreeRTOS.h>
 #include <freertos/task.h>
 #include <stdio.h>
+#include <string.h>
 #include <time.h>
 
 #include "DHT.h"
@@ -18,6 +19,7 @@
 #include "nvs_flash.h"
 #include "protocol_examples_common.h"
 #define MQTT_TOPIC "Test"
+#define DEVICE_ID "esp32-1"
 #ifndef INET6_ADDRSTRLEN
 #define INET6_ADDRSTRLEN 48
 #endif
@@ -31,6 +33,47 @@ static esp_mqtt5_user_property_item_t user_property_arr[] = {
 
 #define USE_PROPERTY_ARR_SIZE sizeof(user_property_arr) / sizeof(esp_mqtt5_user_property_item_t)
 
+#if CONFIG_TELEMETRY_BINARY_PAYLOAD
+/* Binary format v1, little-endian: u8 version, u8 id length, id bytes, u16 sample
+ * count, then per sample u32 epoch seconds, i16 centi-degrees, i16 centi-percent. */
+#define BIN_VERSION 1
+#define BIN_SAMPLE_SIZE 8
+#define BIN_HEADER_SIZE (2 + sizeof(DEVICE_ID) - 1 + 2)
+
+static uint8_t g_bin_buf[BIN_HEADER_SIZE + CONFIG_TELEMETRY_BINARY_BATCH * BIN_SAMPLE_SIZE];
+static uint16_t g_bin_count = 0U;
+
+static void put_le16(uint8_t* p, uint16_t v) {
+  p[0] = (uint8_t)(v & 0xFF);
+  p[1] = (uint8_t)(v >> 8);
+}
+
+static void put_le32(uint8_t* p, uint32_t v) {
+  put_le16(p, (uint16_t)(v & 0xFFFF));
+  put_le16(p + 2, (uint16_t)(v >> 16));
+}
+
+/* Append one sample; returns the message length once the batch is full, else 0. */
+static int bin_append(time_t ts, float tmp, float hum) {
+  if (g_bin_count == 0U) {
+    g_bin_buf[0] = BIN_VERSION;
+    g_bin_buf[1] = (uint8_t)(sizeof(DEVICE_ID) - 1);
+    memcpy(&g_bin_buf[2], DEVICE_ID, sizeof(DEVICE_ID) - 1);
+  }
+  uint8_t* p = &g_bin_buf[BIN_HEADER_SIZE + g_bin_count * BIN_SAMPLE_SIZE];
+  put_le32(p, (uint32_t)ts);
+  put_le16(p + 4, (uint16_t)(int16_t)(tmp * 100.0f + (tmp < 0 ? -0.5f : 0.5f)));
+  put_le16(p + 6, (uint16_t)(int16_t)(hum * 100.0f + 0.5f));
+  g_bin_count++;
+  put_le16(&g_bin_buf[BIN_HEADER_SIZE - 2], g_bin_count);
+  if (g_bin_count < CONFIG_TELEMETRY_BINARY_BATCH) {
+    return 0;
+  }
+  g_bin_count = 0U;
+  return BIN_HEADER_SIZE + CONFIG_TELEMETRY_BINARY_BATCH * BIN_SAMPLE_SIZE;
+}
+#endif
+
 void DHT_task(void* pvParameter) {
   static uint16_t seq = 0U;
   setDHTgpio(GPIO_NUM_25);
@@ -49,15 +92,32 @@ void DHT_task(void* pvParameter) {
     ESP_LOGI(TAG, "Hum: %.1f Tmp: %.1f", hum, tmp);
 
     /* Get system time. */
-    char ts[32];
     time_t now = time(NULL);
+
+#if CONFIG_TELEMETRY_BINARY_PAYLOAD
+    (void)seq;
+    int len = bin_append(now, tmp, hum);
+    if (len > 0) {
+      if (g_mqtt && g_mqtt_connected) {
+        int msg_id = esp_mqtt_client_publish(g_mqtt, CONFIG_TELEMETRY_BINARY_TOPIC,
+                                             (const char*)g_bin_buf, len, 1, 0);
+        ESP_LOGI(TAG, "MQTT published. [%s] id=%d bytes=%d", CONFIG_TELEMETRY_BINARY_TOPIC,
+                 msg_id, len);
+      } else {
+        ESP_LOGW(TAG, "MQTT not connected, dropped %d binary samples",
+                 CONFIG_TELEMETRY_BINARY_BATCH);
+      }
+    }
+#else
+    char ts[32];
     struct tm tm_utc;
     gmtime_r(&now, &tm_utc);
     strftime(ts, sizeof(ts), "%Y-%m-%dT%H:%M:%SZ", &tm_utc);
 
     char payload[160];
     int n = snprintf(payload, sizeof(payload),
-                     "{\"deviceId\":\"esp32-1\",\"ts\":\"%s\",\"temperature\":%.2f,\"humidity\":%."
+                     "{\"deviceId\":\"" DEVICE_ID
+                     "\",\"ts\":\"%s\",\"temperature\":%.2f,\"humidity\":%."
                      "2f,\"seq\":%u}",
                      ts, tmp, hum, seq++);
 
@@ -67,6 +127,7 @@ void DHT_task(void* pvParameter) {
     } else {
       ESP_LOGW(TAG, "MQTT not connected, payload=%s", payload);
     }
+#endif
     ESP_ERROR_CHECK(esp_task_wdt_reset());
 
     vTaskDelay(2000 / portTICK_PERIOD_MS);
@@ -0,0 +1,38 @@
+"""coalesced error counts
+
+Revision ID: 1b6e0f3a9c58
+Revises: e5a9b3c2d417
+Create Date: 2026-10-18 11:20:15.804412
+
+"""
+
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision: str = "1b6e0f3a9c58"
+down_revision: Union[str, Sequence[str], None] = "e5a9b3c2d417"
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+def upgrade() -> None:
+    """Upgrade schema."""
+    with op.batch_alter_table("errors") as batch:
+        batch.add_column(sa.Column("last_ts", sa.BigInteger(), nullable=True))
+        batch.add_column(
+            sa.Column("count", sa.Integer(), nullable=False, server_default="1")
+        )
+    op.execute("UPDATE errors SET last_ts = ts")
+    with op.batch_alter_table("errors") as batch:
+        batch.alter_column("last_ts", existing_type=sa.BigInteger(), nullable=False)
+
+
+def downgrade() -> None:
+    """Downgrade schema."""
+    with op.batch_alter_table("errors") as batch:
+        batch.drop_column("count")
+        batch.drop_column("last_ts")
@@ -0,0 +1,48 @@
+"""telemetry rollups
+
+Revision ID: 4f7c2d91ab36
+Revises: 9239aa2d281b
+Create Date: 2026-10-18 10:30:12.418205
+
+"""
+
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision: str = "4f7c2d91ab36"
+down_revision: Union[str, Sequence[str], None] = "9239aa2d281b"
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+ROLLUP_TABLES = ("telemetry_1m", "telemetry_1h")
+
+
+def upgrade() -> None:
+    """Upgrade schema."""
+    for table in ROLLUP_TABLES:
+        op.create_table(
+            table,
+            sa.Column("device_id", sa.String(length=100), nullable=False),
+            sa.Column("bucket", sa.BigInteger(), nullable=False),
+            sa.Column("count", sa.BigInteger(), nullable=False),
+            sa.Column("temp_sum", sa.Float(), nullable=False),
+            sa.Column("temp_min", sa.Float(), nullable=False),
+            sa.Column("temp_max", sa.Float(), nullable=False),
+            sa.Column("hum_sum", sa.Float(), nullable=False),
+            sa.Column("hum_min", sa.Float(), nullable=False),
+            sa.Column("hum_max", sa.Float(), nullable=False),
+            sa.ForeignKeyConstraint(
+                ["device_id"], ["devices.device_id"], ondelete="CASCADE"
+            ),
+            sa.PrimaryKeyConstraint("device_id", "bucket"),
+        )
+
+
+def downgrade() -> None:
+    """Downgrade schema."""
+    for table in reversed(ROLLUP_TABLES):
+        op.drop_table(table)
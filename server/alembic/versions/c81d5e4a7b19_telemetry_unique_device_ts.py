@@ -0,0 +1,43 @@
+"""unique telemetry (device_id, ts)
+
+Revision ID: c81d5e4a7b19
+Revises: 4f7c2d91ab36
+Create Date: 2026-10-18 10:41:03.562214
+
+"""
+
+from typing import Sequence, Union
+
+from alembic import op
+
+from app.dedup import disable_unique_key, enable_unique_key
+from app.settings import settings
+
+
+# revision identifiers, used by Alembic.
+revision: str = "c81d5e4a7b19"
+down_revision: Union[str, Sequence[str], None] = "4f7c2d91ab36"
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+def upgrade() -> None:
+    """Upgrade schema."""
+    # The unique key is opt-in: with INGEST_DEDUP off this revision changes
+    # nothing, and ``python -m app.dedup enable`` adds the key later. Rows
+    # sharing a key are moved to ``telemetry_duplicates``, not deleted; rollups
+    # built from them can be rebuilt with ``python -m app.rollups backfill``.
+    if settings.INGEST_DEDUP == "off":
+        return
+    bind = op.get_bind()
+    if bind.dialect.name == "postgresql":
+        # CREATE INDEX CONCURRENTLY cannot run inside the migration transaction.
+        with op.get_context().autocommit_block():
+            enable_unique_key(bind)
+    else:
+        enable_unique_key(bind)
+
+
+def downgrade() -> None:
+    """Downgrade schema."""
+    disable_unique_key(op.get_bind())
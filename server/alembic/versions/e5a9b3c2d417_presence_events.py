@@ -0,0 +1,43 @@
+"""presence events
+
+Revision ID: e5a9b3c2d417
+Revises: c81d5e4a7b19
+Create Date: 2026-10-18 11:02:47.130958
+
+"""
+
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision: str = "e5a9b3c2d417"
+down_revision: Union[str, Sequence[str], None] = "c81d5e4a7b19"
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+def upgrade() -> None:
+    """Upgrade schema."""
+    op.create_table(
+        "presence_events",
+        sa.Column("id", sa.Integer(), autoincrement=True, nullable=False),
+        sa.Column("device_id", sa.String(length=100), nullable=False),
+        sa.Column("ts", sa.BigInteger(), nullable=False),
+        sa.Column("online", sa.Boolean(), nullable=False),
+        sa.ForeignKeyConstraint(
+            ["device_id"], ["devices.device_id"], ondelete="CASCADE"
+        ),
+        sa.PrimaryKeyConstraint("id"),
+    )
+    op.create_index(
+        "ix_presence_events_device_id", "presence_events", ["device_id", "id"]
+    )
+
+
+def downgrade() -> None:
+    """Downgrade schema."""
+    op.drop_index("ix_presence_events_device_id", table_name="presence_events")
+    op.drop_table("presence_events")
@@ -0,0 +1,4 @@
+import time
+
+# Read before any submodule is imported so startup timing covers the imports.
+STARTED = time.perf_counter()
@@ -0,0 +1,273 @@
+"""Fleet-wide statistics computed column-wise with NumPy.
+
+A window of ``telemetry`` is loaded with a Core select straight into four
+arrays (device id, ts, temperature, humidity), ordered by ``(device_id, ts)``
+so each device's rows are contiguous. Every statistic is then one vectorized
+pass over all devices at once: ``bincount`` for sums, a ``lexsort`` for
+percentiles and ``maximum.at`` for per-device maxima.
+"""
+
+from __future__ import annotations
+
+import math
+import threading
+import time
+from collections import OrderedDict
+from typing import Any, Hashable, NamedTuple
+
+import numpy as np
+from sqlalchemy import Select, select
+from sqlalchemy.orm import Session
+
+from .models import Telemetry
+from .settings import settings
+from .timeutil import to_iso
+
+PERCENTILES = (5, 50, 95)
+
+
+class Columns(NamedTuple):
+    devices: np.ndarray  # object array of device ids, one per row
+    ts: np.ndarray  # int64
+    temperature: np.ndarray  # float64
+    humidity: np.ndarray  # float64
+
+
+class Thresholds(NamedTuple):
+    temp_min: float
+    temp_max: float
+    hum_min: float
+    hum_max: float
+
+
+def window_bounds(
+    window: int, bucket: int, now: float | None = None
+) -> tuple[int, int]:
+    """``[start, end]`` of the last ``window`` seconds, aligned to ``bucket``.
+
+    Alignment makes every request within the same bucket share a cache key.
+    """
+
+    bucket = max(1, bucket)
+    now = time.time() if now is None else now
+    end = int(now) // bucket * bucket
+    return end - max(1, window), end - 1
+
+
+def columns_statement(start: int, end: int) -> Select:
+    return (
+        select(
+            Telemetry.device_id,
+            Telemetry.ts,
+            Telemetry.temperature,
+            Telemetry.humidity,
+        )
+        .where(Telemetry.ts >= start, Telemetry.ts <= end)
+        .order_by(Telemetry.device_id, Telemetry.ts)
+    )
+
+
+def load_columns(db: Session, start: int, end: int, chunk: int = 10000) -> Columns:
+    """Fetch ``[start, end]`` as column arrays without building ORM objects."""
+
+    devices: list[str] = []
+    ts: list[int] = []
+    temperature: list[float] = []
+    humidity: list[float] = []
+    result = db.execute(
+        columns_statement(start, end).execution_options(yield_per=chunk)
+    )
+    for part in result.partitions():
+        d, t, te, h = zip(*part)
+        devices.extend(d)
+        ts.extend(t)
+        temperature.extend(te)
+        humidity.extend(h)
+    return Columns(
+        np.array(devices, dtype=object),
+        np.array(ts, dtype=np.int64),
+        np.array(temperature, dtype=np.float64),
+        np.array(humidity, dtype=np.float64),
+    )
+
+
+def _column_stats(
+    codes: np.ndarray,
+    counts: np.ndarray,
+    starts: np.ndarray,
+    values: np.ndarray,
+    low: float,
+    high: float,
+) -> dict[str, np.ndarray]:
+    n = len(counts)
+    mean = np.bincount(codes, weights=values, minlength=n) / counts
+    sq = np.bincount(codes, weights=values * values, minlength=n) / counts
+    stats = {
+        "mean": mean,
+        "std": np.sqrt(np.maximum(sq - mean * mean, 0.0)),
+        "outOfRange": np.bincount(
+            codes, weights=(values < low) | (values > high), minlength=n
+        ).astype(np.int64),
+    }
+
+    # Sorting by (device, value) puts each device's values in order within
+    # its own contiguous slice, so percentiles are plain index arithmetic.
+    ordered = values[np.lexsort((values, codes))]
+    stats["min"] = ordered[starts]
+    stats["max"] = ordered[starts + counts - 1]
+    for pct in PERCENTILES:
+        pos = (counts - 1) * (pct / 100)
+        lo = np.floor(pos).astype(np.int64)
+        hi = np.ceil(pos).astype(np.int64)
+        below, above = ordered[starts + lo], ordered[starts + hi]
+        stats[f"p{pct}"] = below + (above - below) * (pos - lo)
+    return stats
+
+
+def _rates(
+    codes: np.ndarray,
+    counts: np.ndarray,
+    starts: np.ndarray,
+    ts: np.ndarray,
+    values: np.ndarray,
+) -> dict[str, np.ndarray]:
+    """Per-hour rate of change: overall trend and steepest step per device."""
+
+    n = len(counts)
+    last = starts + counts - 1
+    span = (ts[last] - ts[starts]).astype(np.float64)
+    with np.errstate(divide="ignore", invalid="ignore"):
+        trend = np.where(
+            span > 0, (values[last] - values[starts]) * 3600 / span, np.nan
+        )
+
+        dt = np.diff(ts).astype(np.float64)
+        same = (codes[1:] == codes[:-1]) & (dt > 0)
+        step = np.abs(np.diff(values)[same] * 3600 / dt[same])
+    steepest = np.full(n, np.nan)
+    if step.size:
+        peak = np.zeros(n)
+        np.maximum.at(peak, codes[1:][same], step)
+        has_step = np.bincount(codes[1:][same], minlength=n) > 0
+        steepest = np.where(has_step, peak, np.nan)
+    return {"trendPerHour": trend, "maxStepPerHour": steepest}
+
+
+def summarize(columns: Columns, thresholds: Thresholds) -> list[dict[str, Any]]:
+    """Per-device statistics for rows ordered by ``(device_id, ts)``."""
+
+    devices = columns.devices
+    if not len(devices):
+        return []
+    change = devices[1:] != devices[:-1]
+    codes = np.concatenate(([0], np.cumsum(change))).astype(np.int64)
+    starts = np.concatenate(([0], np.flatnonzero(change) + 1))
+    counts = np.diff(np.append(starts, len(devices)))
+
+    temperature = _column_stats(
+        codes,
+        counts,
+        starts,
+        columns.temperature,
+        thresholds.temp_min,
+        thresholds.temp_max,
+    )
+    temperature.update(_rates(codes, counts, starts, columns.ts, columns.temperature))
+    humidity = _column_stats(
+        codes,
+        counts,
+        starts,
+        columns.humidity,
+        thresholds.hum_min,
+        thresholds.hum_max,
+    )
+    humidity.update(_rates(codes, counts, starts, columns.ts, columns.humidity))
+
+    first_ts = columns.ts[starts]
+    last_ts = columns.ts[starts + counts - 1]
+    return [
+        {
+            "deviceId": devices[start],
+            "count": int(counts[i]),
+            "firstTs": to_iso(int(first_ts[i])),
+            "lastTs": to_iso(int(last_ts[i])),
+            "temperature": {k: _scalar(v[i]) for k, v in temperature.items()},
+            "humidity": {k: _scalar(v[i]) for k, v in humidity.items()},
+        }
+        for i, start in enumerate(starts)
+    ]
+
+
+def _scalar(value: Any) -> float | int | None:
+    if isinstance(value, np.integer):
+        return int(value)
+    value = float(value)
+    return None if math.isnan(value) else round(value, 4)
+
+
+class SummaryCache:
+    """Computed summaries keyed by window, bucket and thresholds.
+
+    Entries expire ``ttl`` seconds after they were computed; the least
+    recently used entry is evicted beyond ``max_size``.
+    """
+
+    def __init__(self, max_size: int = 64, ttl: float = 30.0) -> None:
+        self._max_size = max(1, max_size)
+        self._ttl = ttl
+        self._entries: OrderedDict[Hashable, tuple[Any, float]] = OrderedDict()
+        self._lock = threading.Lock()
+
+    def get(self, key: Hashable) -> Any | None:
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is None:
+                return None
+            if time.monotonic() - entry[1] > self._ttl:
+                del self._entries[key]
+                return None
+            self._entries.move_to_end(key)
+            return entry[0]
+
+    def put(self, key: Hashable, value: Any) -> None:
+        now = time.monotonic()
+        with self._lock:
+            self._entries[key] = (value, now)
+            self._entries.move_to_end(key)
+            expired = [
+                k for k, (_, at) in self._entries.items() if now - at > self._ttl
+            ]
+            for k in expired:
+                del self._entries[k]
+            while len(self._entries) > self._max_size:
+                self._entries.popitem(last=False)
+
+    def invalidate(self) -> None:
+        with self._lock:
+            self._entries.clear()
+
+
+summary_cache = SummaryCache(
+    settings.ANALYTICS_CACHE_SIZE, settings.ANALYTICS_CACHE_TTL_SECONDS
+)
+
+
+def fleet_summary(
+    db: Session, window: int, bucket: int, thresholds: Thresholds
+) -> dict[str, Any]:
+    start, end = window_bounds(window, bucket)
+    key = (start, end, bucket, thresholds)
+    cached = summary_cache.get(key)
+    if cached is not None:
+        return cached
+
+    devices = summarize(load_columns(db, start, end), thresholds)
+    payload = {
+        "from": to_iso(start),
+        "to": to_iso(end),
+        "window": window,
+        "bucket": bucket,
+        "devices": devices,
+    }
+    summary_cache.put(key, payload)
+    return payload
@@ -0,0 +1,187 @@
+"""Async versions of the read endpoints, enabled with ``DB_ASYNC_ENABLED``.
+
+They run on the event loop with an ``AsyncSession`` instead of holding a
+threadpool worker for each database round trip.
+"""
+
+from __future__ import annotations
+
+from typing import Any, AsyncIterator, Literal, Optional
+
+from fastapi import APIRouter, Depends, HTTPException, Query, Request, Response
+from fastapi.responses import StreamingResponse
+from sqlalchemy import Select
+from sqlalchemy.ext.asyncio import AsyncSession
+
+from .db import get_async_read_db
+from .downsample import alttb, raw_statement
+from .latest import latest_cache
+from .queries import (
+    ajson_array,
+    bucket_point,
+    bucketed_statement,
+    error_payload,
+    errors_statement,
+    errors_validators,
+    errors_version_statement,
+    fleet_payload,
+    latest_payload,
+    latest_validators,
+    metric_point,
+    metrics_range,
+    newer_than,
+    parse_device_ids,
+    parse_since,
+    range_count_statement,
+    recent_metrics_statement,
+    resolve_device,
+    status_payload,
+    wants_range,
+)
+
+router = APIRouter()
+
+
+@router.get("/latest")
+async def latest(
+    request: Request,
+    response: Response,
+    deviceId: Optional[str] = None,
+    deviceIds: Optional[str] = None,
+    since: Optional[str] = None,
+    db: AsyncSession = Depends(get_async_read_db),
+):
+    """Latest reading for ``deviceId``, or a list for comma-separated ``deviceIds``.
+
+    The list variant omits devices without data instead of returning 404.
+    ``since`` and the ``ETag`` behave as in the sync route.
+    """
+
+    cursor = parse_since(since)
+    if deviceIds is not None:
+        rows = await latest_cache.aget_many(db, parse_device_ids(deviceIds))
+        validators = latest_validators(rows, rows.values(), cursor)
+        if not_modified := validators.apply(request.headers, response):
+            return not_modified
+        return [
+            latest_payload(d, row) for d, row in rows.items() if newer_than(row, cursor)
+        ]
+    device_id = resolve_device(deviceId)
+    row = await latest_cache.aget(db, device_id)
+    if not row:
+        raise HTTPException(status_code=404, detail="no data")
+    validators = latest_validators([device_id], [row], cursor)
+    if not_modified := validators.apply(request.headers, response):
+        return not_modified
+    if not newer_than(row, cursor):
+        return Response(status_code=204, headers=validators.headers())
+    return latest_payload(device_id, row)
+
+
+@router.get("/fleet/status")
+async def fleet_status(
+    deviceIds: Optional[str] = None,
+    online: Optional[bool] = None,
+    db: AsyncSession = Depends(get_async_read_db),
+):
+    """Last reading and online flag for every device (or ``deviceIds``).
+
+    ``online=true``/``false`` keeps only online or offline devices.
+    """
+
+    rows = await latest_cache.aget_many(db, parse_device_ids(deviceIds))
+    return fleet_payload(rows, online)
+
+
+@router.get("/metrics")
+async def metrics(
+    request: Request,
+    response: Response,
+    deviceId: Optional[str] = None,
+    limit: int = 300,
+    since: Optional[str] = None,
+    from_: Optional[int] = Query(None, alias="from"),
+    to: Optional[int] = None,
+    bucket: Optional[int] = None,
+    maxPoints: Optional[int] = None,
+    mode: Literal["avg", "lttb"] = "avg",
+    db: AsyncSession = Depends(get_async_read_db),
+):
+    device_id = resolve_device(deviceId)
+    newest = await latest_cache.aget(db, device_id)
+    if not wants_range(from_, to, bucket, maxPoints):
+        cursor = parse_since(since)
+        validators = latest_validators([device_id], [newest], limit, cursor)
+        if not_modified := validators.apply(request.headers, response):
+            return not_modified
+        if not newer_than(newest, cursor):
+            return []
+        stmt = recent_metrics_statement(device_id, limit, cursor)
+        rows = (await db.execute(stmt)).all()
+        return [metric_point(row) for row in reversed(rows)]
+
+    start, end, max_points = metrics_range(from_, to, maxPoints)
+    validators = latest_validators(
+        [device_id], [newest], mode, start, end, max_points, bucket
+    )
+    if validators.matches(request.headers):
+        return validators.not_modified()
+    if mode == "lttb":
+        points = _lttb_points(db, device_id, start, end, max_points)
+    else:
+        points = _bucket_points(
+            db, bucketed_statement(device_id, start, end, max_points, bucket)
+        )
+    return StreamingResponse(
+        ajson_array(points),
+        media_type="application/json",
+        headers=validators.headers(),
+    )
+
+
+async def _bucket_points(
+    db: AsyncSession, stmt: Select
+) -> AsyncIterator[dict[str, Any]]:
+    result = await db.stream(stmt.execution_options(yield_per=500))
+    async for row in result:
+        yield bucket_point(row)
+
+
+async def _lttb_points(
+    db: AsyncSession, device_id: str, start: int, end: int, max_points: int
+) -> AsyncIterator[dict[str, Any]]:
+    total = (
+        await db.execute(range_count_statement(device_id, start, end))
+    ).scalar_one()
+    result = await db.stream(
+        raw_statement(device_id, start, end).execution_options(yield_per=1000)
+    )
+    async for row in alttb(result, total, max_points):
+        yield metric_point(row)
+
+
+@router.get("/status")
+async def status(
+    deviceId: Optional[str] = None, db: AsyncSession = Depends(get_async_read_db)
+):
+    device_id = resolve_device(deviceId)
+    return status_payload(device_id, await latest_cache.aget(db, device_id))
+
+
+@router.get("/errors")
+async def errors(
+    request: Request,
+    response: Response,
+    deviceId: Optional[str] = None,
+    limit: int = 20,
+    since: Optional[str] = None,
+    db: AsyncSession = Depends(get_async_read_db),
+):
+    cursor = parse_since(since)
+    top = (await db.execute(errors_version_statement(deviceId))).one_or_none()
+    validators = errors_validators(top, limit, cursor)
+    if not_modified := validators.apply(request.headers, response):
+        return not_modified
+    stmt = errors_statement(deviceId, limit, cursor)
+    rows = (await db.execute(stmt)).scalars().all()
+    return [error_payload(row) for row in rows]
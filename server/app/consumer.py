@@ -0,0 +1,107 @@
+"""Standalone MQTT ingest consumer.
+
+Runs :class:`app.mqtt.MQTTIngestService` without the HTTP API so ingest can
+scale separately from it. Set ``MQTT_ENABLED=0`` for the API workers and
+start one or more consumers::
+
+    MQTT_SHARED_GROUP=ingest MQTT_TOPICS='devices/+/telemetry' \\
+        python -m app.consumer --processes 4
+
+Every process joins the same shared subscription, so the broker delivers
+each message to one of them; consumers on other hosts can join too.
+"""
+
+from __future__ import annotations
+
+import argparse
+import logging
+import multiprocessing
+import os
+import signal
+import threading
+from typing import Sequence
+
+from .settings import settings
+
+logger = logging.getLogger(__name__)
+
+
+def serve(index: int = 0) -> None:
+    """Consume until SIGINT/SIGTERM, then flush queued readings and exit."""
+
+    from .db import SessionLocal
+    from .errorsink import error_sink
+    from .mqtt import build_service
+    from .registry import device_registry
+
+    logging.basicConfig(
+        level=logging.INFO,
+        format=f"%(asctime)s consumer-{index} %(levelname)s %(name)s: %(message)s",
+    )
+    stop = threading.Event()
+    for signum in (signal.SIGINT, signal.SIGTERM):
+        signal.signal(signum, lambda *_: stop.set())
+
+    with SessionLocal() as db:
+        device_registry.warm(db)
+    error_sink.start()
+    spool_dir = settings.MQTT_SPOOL_DIR
+    service = build_service(
+        enabled=True,
+        # Each process drains its own spool.
+        spool_dir=os.path.join(spool_dir, f"consumer-{index}") if spool_dir else None,
+    )
+    service.start()
+    try:
+        stop.wait()
+    finally:
+        service.stop()
+        error_sink.stop()
+
+
+def main(argv: Sequence[str] | None = None) -> None:
+    parser = argparse.ArgumentParser(prog="python -m app.consumer")
+    parser.add_argument(
+        "--processes",
+        type=int,
+        default=1,
+        help="consumer processes on this host (needs MQTT_SHARED_GROUP if > 1)",
+    )
+    args = parser.parse_args(argv)
+
+    if args.processes > 1 and not settings.MQTT_SHARED_GROUP:
+        parser.error("--processes > 1 requires MQTT_SHARED_GROUP")
+
+    from . import models  # noqa: F401 - registers the tables for init_db
+    from .db import init_db
+
+    # Once, before any consumer starts, as the API does on startup.
+    init_db()
+    if args.processes <= 1:
+        serve()
+        return
+
+    ctx = multiprocessing.get_context("spawn")
+    workers = [
+        ctx.Process(target=serve, args=(idx,), name=f"mqtt-consumer-{idx}")
+        for idx in range(args.processes)
+    ]
+    for worker in workers:
+        worker.start()
+
+    def forward_sigterm(*_: object) -> None:
+        # Children get the terminal's SIGINT themselves; relay SIGTERM.
+        for worker in workers:
+            worker.terminate()
+
+    signal.signal(signal.SIGTERM, forward_sigterm)
+    try:
+        for worker in workers:
+            worker.join()
+    except KeyboardInterrupt:
+        for worker in workers:
+            worker.join()
+
+
+if __name__ == "__main__":
+    main()
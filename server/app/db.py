@@ -1,13 +1,70 @@
 from __future__ import annotations
 
-from sqlalchemy import create_engine
-from sqlalchemy.orm import declarative_base, sessionmaker
+import logging
+import threading
+import time
+from pathlib import Path
+from typing import TYPE_CHECKING, Any, AsyncIterator, Iterator, Literal, Sequence
 
+from fastapi import Header
+from sqlalchemy import Table, create_engine
+from sqlalchemy.engine import Connection, Engine, make_url
+from sqlalchemy.exc import DBAPIError, InterfaceError, OperationalError
+from sqlalchemy.orm import Session, declarative_base, sessionmaker
+from sqlalchemy.pool import Pool
+
+from .prometheus import db_pool_wait_seconds
 from .settings import settings
 
+if TYPE_CHECKING:
+    from sqlalchemy.ext.asyncio import AsyncEngine, AsyncSession, async_sessionmaker
+
+logger = logging.getLogger(__name__)
+
+
+def timed_pool_class(url: str, *, is_async: bool = False) -> type[Pool]:
+    """Wrap the dialect's default pool so checkout waits feed a histogram."""
+
+    parsed = make_url(url)
+    base = parsed.get_dialect(_is_async=is_async).get_pool_class(parsed)
+
+    def connect(self: Pool) -> Any:
+        started = time.perf_counter()
+        try:
+            return base.connect(self)
+        finally:
+            db_pool_wait_seconds.observe(time.perf_counter() - started)
+
+    return type(f"Timed{base.__name__}", (base,), {"connect": connect})
+
+
+def pool_options(
+    url: str, *, is_async: bool = False, role: Literal["write", "read"] = "write"
+) -> dict[str, Any]:
+    """Explicit pool sizing from settings; SQLite keeps SQLAlchemy's defaults.
+
+    Writer and reader engines are sized independently, so dashboard queries
+    cannot exhaust the pool the ingest paths commit through.
+    """
+
+    options: dict[str, Any] = {"poolclass": timed_pool_class(url, is_async=is_async)}
+    if make_url(url).get_backend_name() == "sqlite":
+        return options
+    read = role == "read"
+    return options | {
+        "pool_size": settings.DB_READ_POOL_SIZE if read else settings.DB_POOL_SIZE,
+        "max_overflow": (
+            settings.DB_READ_MAX_OVERFLOW if read else settings.DB_MAX_OVERFLOW
+        ),
+        "pool_timeout": settings.DB_POOL_TIMEOUT,
+        "pool_recycle": settings.DB_POOL_RECYCLE,
+    }
+
+
 engine = create_engine(
     settings.DATABASE_URL,
     pool_pre_ping=True,
+    **pool_options(settings.DATABASE_URL),
 )
 SessionLocal = sessionmaker(bind=engine, autoflush=False, autocommit=False)
 Base = declarative_base()
@@ -21,6 +78,238 @@ def get_db():
         db.close()
 
 
-def init_db() -> None:
-    """Create database tables if they do not already exist."""
+class ReplicaSet:
+    """Round-robin order over read URLs, skipping ones that recently failed.
+
+    A replica that fails to connect is skipped for ``retry_after`` seconds
+    and then tried again by the next read; when none is available reads fall
+    back to the primary.
+    """
+
+    def __init__(self, urls: Sequence[str], retry_after: float) -> None:
+        self.urls = list(dict.fromkeys(urls))
+        self._retry_after = retry_after
+        self._next = 0
+        self._down: dict[str, float] = {}
+        self._lock = threading.Lock()
+
+    def candidates(self) -> list[str]:
+        now = time.monotonic()
+        with self._lock:
+            start = self._next
+            self._next = (start + 1) % len(self.urls)
+            order = self.urls[start:] + self.urls[:start]
+            return [url for url in order if self._down.get(url, 0.0) <= now]
+
+    def mark_down(self, url: str) -> None:
+        logger.warning(
+            "Read database %s unavailable; skipping it for %.0fs",
+            make_url(url).render_as_string(hide_password=True),
+            self._retry_after,
+        )
+        with self._lock:
+            self._down[url] = time.monotonic() + self._retry_after
+
+
+replicas = ReplicaSet(settings.read_urls, settings.DB_REPLICA_RETRY_SECONDS)
+_read_sessions = {
+    url: sessionmaker(
+        bind=create_engine(url, pool_pre_ping=True, **pool_options(url, role="read")),
+        autoflush=False,
+        autocommit=False,
+    )
+    for url in replicas.urls
+}
+
+
+def read_session(*, primary: bool = False) -> Session:
+    """Open a session on the next healthy read database.
+
+    The connection is checked out up front so an unreachable replica fails
+    over to the next one. ``primary=True`` reads from the writer instead, for
+    callers that must see their own writes.
+    """
+
+    if not primary:
+        for url in replicas.candidates():
+            db = _read_sessions[url]()
+            try:
+                db.connection()
+            except OperationalError:
+                db.close()
+                replicas.mark_down(url)
+                continue
+            return db
+    return SessionLocal()
+
+
+def get_read_db(
+    x_read_your_writes: bool = Header(False),
+) -> Iterator[Session]:
+    """Dependency for read-only endpoints.
+
+    Clients that just wrote and must see it send ``X-Read-Your-Writes: true``
+    to be served by the primary.
+    """
+
+    db = read_session(primary=x_read_your_writes)
+    try:
+        yield db
+    finally:
+        db.close()
+
+
+def async_url(url: str) -> str:
+    """Map a sync database URL onto its async driver.
+
+    ``postgresql+psycopg`` serves both modes; SQLite switches to aiosqlite.
+    """
+
+    parsed = make_url(url)
+    backend = parsed.get_backend_name()
+    if backend == "sqlite":
+        parsed = parsed.set(drivername="sqlite+aiosqlite")
+    elif backend == "postgresql" and parsed.get_driver_name() != "asyncpg":
+        parsed = parsed.set(drivername="postgresql+psycopg")
+    return parsed.render_as_string(hide_password=False)
+
+
+_async_engine: AsyncEngine | None = None
+_async_sessionmaker: async_sessionmaker[AsyncSession] | None = None
+
+
+def get_async_sessionmaker() -> async_sessionmaker[AsyncSession]:
+    """Create the async engine on first use so the sync-only path never loads it."""
+
+    global _async_engine, _async_sessionmaker
+    if _async_sessionmaker is None:
+        from sqlalchemy.ext.asyncio import async_sessionmaker, create_async_engine
+
+        url = async_url(settings.DATABASE_URL)
+        _async_engine = create_async_engine(
+            url, pool_pre_ping=True, **pool_options(url, is_async=True)
+        )
+        _async_sessionmaker = async_sessionmaker(
+            _async_engine, autoflush=False, expire_on_commit=False
+        )
+    return _async_sessionmaker
+
+
+async def get_async_db() -> AsyncIterator[AsyncSession]:
+    async with get_async_sessionmaker()() as db:
+        yield db
+
+
+_async_read_engines: dict[str, AsyncEngine] = {}
+_async_read_sessions: dict[str, async_sessionmaker[AsyncSession]] = {}
+
+
+def _async_read_sessionmaker(url: str) -> async_sessionmaker[AsyncSession]:
+    if url not in _async_read_sessions:
+        from sqlalchemy.ext.asyncio import async_sessionmaker, create_async_engine
+
+        aurl = async_url(url)
+        _async_read_engines[url] = create_async_engine(
+            aurl, pool_pre_ping=True, **pool_options(aurl, is_async=True, role="read")
+        )
+        _async_read_sessions[url] = async_sessionmaker(
+            _async_read_engines[url], autoflush=False, expire_on_commit=False
+        )
+    return _async_read_sessions[url]
+
+
+async def get_async_read_db(
+    x_read_your_writes: bool = Header(False),
+) -> AsyncIterator[AsyncSession]:
+    """Async counterpart of :func:`get_read_db`."""
+
+    if not x_read_your_writes:
+        for url in replicas.candidates():
+            db = _async_read_sessionmaker(url)()
+            try:
+                await db.connection()
+            except OperationalError:
+                await db.close()
+                replicas.mark_down(url)
+                continue
+            try:
+                yield db
+            finally:
+                await db.close()
+            return
+    async with get_async_sessionmaker()() as db:
+        yield db
+
+
+async def dispose_async_engine() -> None:
+    global _async_engine, _async_sessionmaker
+    if _async_engine is not None:
+        await _async_engine.dispose()
+    for read_engine in _async_read_engines.values():
+        await read_engine.dispose()
+    _async_read_engines.clear()
+    _async_read_sessions.clear()
+    _async_engine = _async_sessionmaker = None
+
+
+ALEMBIC_INI = Path(__file__).resolve().parent.parent / "alembic.ini"
+
+
+def schema_at_head(bind: Engine) -> bool:
+    """Whether Alembic reports the database at the newest migration.
+
+    ``False`` when the migrations are not shipped alongside the app.
+    """
+
+    if not ALEMBIC_INI.exists():
+        return False
+    from alembic.config import Config
+    from alembic.runtime.migration import MigrationContext
+    from alembic.script import ScriptDirectory
+
+    heads = set(ScriptDirectory.from_config(Config(str(ALEMBIC_INI))).get_heads())
+    with bind.connect() as conn:
+        current = set(MigrationContext.configure(conn).get_current_heads())
+    return bool(heads) and current == heads
+
+
+def init_db() -> bool:
+    """Create missing tables unless the schema is already migrated to head.
+
+    Returns whether ``create_all`` ran.
+    """
+
+    if schema_at_head(engine):
+        return False
     Base.metadata.create_all(bind=engine)
+    return True
+
+
+def is_transient(exc: BaseException) -> bool:
+    """Whether ``exc`` says the database is unreachable rather than the data bad.
+
+    Transient failures are worth retrying with the same rows; anything else
+    (constraint violations, out-of-range values, driver conversion errors)
+    will fail again.
+    """
+
+    if isinstance(exc, (OperationalError, InterfaceError)):
+        return True
+    return isinstance(exc, DBAPIError) and exc.connection_invalidated
+
+
+def dialect_insert(bind: Engine | Connection, table: Table) -> Any:
+    """Return a dialect ``insert`` supporting ``ON CONFLICT`` when available.
+
+    PostgreSQL and SQLite expose ``on_conflict_do_nothing``/``do_update``;
+    other backends get ``None`` and must fall back to plain inserts.
+    """
+
+    name = bind.dialect.name
+    if name == "postgresql":
+        from sqlalchemy.dialects.postgresql import insert
+    elif name == "sqlite":
+        from sqlalchemy.dialects.sqlite import insert
+    else:
+        return None
+    return insert(table)
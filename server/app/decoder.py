@@ -0,0 +1,197 @@
+"""Decode MQTT telemetry payloads straight from ``bytes``.
+
+JSON is parsed with orjson or msgspec when installed and the stdlib ``json``
+module otherwise; all three accept ``bytes`` so the payload is never copied
+into an intermediate ``str``.
+
+The compact binary format (:data:`BINARY_CONTENT_TYPE`) is little-endian::
+
+    u8  version (1)
+    u8  device id length N (1..64)
+    N   device id, UTF-8
+    u16 sample count M (>= 1)
+    M * (u32 epoch seconds, i16 centi-degrees C, i16 centi-percent RH)
+"""
+
+from __future__ import annotations
+
+import struct
+from dataclasses import dataclass
+from datetime import datetime, timezone
+from typing import Any, Callable
+
+try:  # pragma: no cover - depends on the installed extras
+    import orjson
+
+    _loads: Callable[[bytes], Any] = orjson.loads
+    JSON_BACKEND = "orjson"
+except ImportError:  # pragma: no cover
+    try:
+        import msgspec
+
+        _loads = msgspec.json.decode
+        JSON_BACKEND = "msgspec"
+    except ImportError:
+        import json
+
+        _loads = json.loads
+        JSON_BACKEND = "json"
+
+_MS_THRESHOLD = 1_000_000_000_000
+
+# Bounds of the ``device_id`` (VARCHAR(100)) and ``ts`` (BIGINT) columns.
+MAX_DEVICE_ID_LENGTH = 100
+MIN_TS = -(2**63)
+MAX_TS = 2**63 - 1
+
+BINARY_CONTENT_TYPE = "application/vnd.iot.telemetry.v1"
+BINARY_VERSION = 1
+_MAX_DEVICE_ID = 64
+_BINARY_COUNT = struct.Struct("<H")
+_BINARY_SAMPLE = struct.Struct("<Ihh")
+
+
+@dataclass(slots=True, frozen=True)
+class Reading:
+    device_id: str
+    ts: int
+    temperature: float
+    humidity: float
+
+    def as_row(self) -> dict[str, Any]:
+        return {
+            "device_id": self.device_id,
+            "ts": self.ts,
+            "temperature": self.temperature,
+            "humidity": self.humidity,
+        }
+
+
+class PayloadError(ValueError):
+    """A payload that cannot be ingested; ``reason`` is stored in ``errors``."""
+
+    def __init__(self, reason: str, device_id: str | None = None) -> None:
+        super().__init__(reason)
+        self.reason = reason
+        self.device_id = device_id
+
+
+def parse_timestamp(value: Any) -> int:
+    """Convert multiple timestamp formats into epoch seconds."""
+
+    # Integers are by far the most common case; check them first.
+    if type(value) is int:
+        return value // 1000 if value > _MS_THRESHOLD else value
+
+    if value is None:
+        return int(datetime.now(tz=timezone.utc).timestamp())
+
+    if isinstance(value, (int, float)):
+        # Accept milliseconds inputs as well
+        if value > _MS_THRESHOLD:
+            return int(value / 1000)
+        return int(value)
+
+    if isinstance(value, str):
+        value = value.strip()
+        if not value:
+            return int(datetime.now(tz=timezone.utc).timestamp())
+        # Numeric string
+        if value.isdigit():
+            return int(value)
+        try:
+            dt = datetime.fromisoformat(value.replace("Z", "+00:00"))
+        except ValueError as exc:
+            raise ValueError(f"invalid timestamp format: {value}") from exc
+        return int(dt.timestamp())
+
+    raise ValueError(f"unsupported timestamp type: {type(value)!r}")
+
+
+def check_reading(device_id: str, ts: int) -> None:
+    """Raise :class:`PayloadError` for values the telemetry table cannot store."""
+
+    if len(device_id) > MAX_DEVICE_ID_LENGTH:
+        raise PayloadError("deviceId too long", device_id[:MAX_DEVICE_ID_LENGTH])
+    if not MIN_TS <= ts <= MAX_TS:
+        raise PayloadError("timestamp out of range", device_id)
+
+
+def decode_json(payload: bytes, device_id: str | None = None) -> Reading:
+    """Parse and validate one JSON telemetry message.
+
+    ``device_id`` (e.g. taken from the topic) is used when the payload has
+    none. Raises :class:`PayloadError` with the same reasons the MQTT ingest path
+    has always recorded.
+    """
+
+    try:
+        data = _loads(payload)
+    except Exception as exc:
+        # Decoders disagree on how they report bad UTF-8; only re-check on
+        # the error path.
+        try:
+            bytes(payload).decode("utf-8")
+        except UnicodeDecodeError:
+            raise PayloadError("non-utf8 payload") from exc
+        raise PayloadError("invalid JSON payload") from exc
+
+    if not isinstance(data, dict):
+        raise PayloadError("invalid JSON payload")
+    device_id = data.get("deviceId") or data.get("device_id") or device_id
+    if not isinstance(device_id, str) or not device_id:
+        raise PayloadError("missing or invalid deviceId")
+
+    try:
+        reading = Reading(
+            device_id,
+            parse_timestamp(data.get("ts")),
+            float(data.get("temperature")),  # type: ignore[arg-type]
+            float(data.get("humidity")),  # type: ignore[arg-type]
+        )
+    except (TypeError, ValueError, OverflowError) as exc:
+        raise PayloadError(str(exc), device_id[:MAX_DEVICE_ID_LENGTH]) from exc
+    check_reading(reading.device_id, reading.ts)
+    return reading
+
+
+def decode_binary(payload: bytes) -> list[Reading]:
+    """Parse a binary telemetry message carrying one or more samples."""
+
+    view = memoryview(payload)
+    if len(view) < 2 or view[0] != BINARY_VERSION:
+        raise PayloadError("unsupported binary payload version")
+    id_end = 2 + view[1]
+    samples_start = id_end + _BINARY_COUNT.size
+    if not 0 < view[1] <= _MAX_DEVICE_ID or len(view) < samples_start:
+        raise PayloadError("truncated binary payload")
+    try:
+        device_id = str(view[2:id_end], "utf-8")
+    except UnicodeDecodeError as exc:
+        raise PayloadError("non-utf8 payload") from exc
+
+    (count,) = _BINARY_COUNT.unpack_from(view, id_end)
+    if count == 0 or len(view) != samples_start + count * _BINARY_SAMPLE.size:
+        raise PayloadError("binary payload length does not match", device_id)
+    return [
+        Reading(device_id, ts, temp / 100, hum / 100)
+        for ts, temp, hum in _BINARY_SAMPLE.iter_unpack(view[samples_start:])
+    ]
+
+
+def encode_binary(device_id: str, samples: list[tuple[int, float, float]]) -> bytes:
+    """Build a binary message from ``(ts, temperature, humidity)`` samples."""
+
+    raw_id = device_id.encode("utf-8")
+    if not 0 < len(raw_id) <= _MAX_DEVICE_ID:
+        raise ValueError("device id must be 1..64 bytes")
+    parts = [
+        bytes((BINARY_VERSION, len(raw_id))),
+        raw_id,
+        _BINARY_COUNT.pack(len(samples)),
+    ]
+    parts.extend(
+        _BINARY_SAMPLE.pack(ts, round(temp * 100), round(hum * 100))
+        for ts, temp, hum in samples
+    )
+    return b"".join(parts)
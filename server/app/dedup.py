@@ -0,0 +1,220 @@
+"""Opt-in ``(device_id, ts)`` deduplication.
+
+With ``INGEST_DEDUP`` set, ``telemetry`` carries a unique ``(device_id, ts)``
+key that ingest targets with ``ON CONFLICT``, and :class:`RecentKeys` drops
+recent repeats in memory before they reach the database. On a database
+migrated with dedup off, add the key with::
+
+    INGEST_DEDUP=ignore python -m app.dedup enable
+"""
+
+from __future__ import annotations
+
+import argparse
+import logging
+import threading
+from collections import OrderedDict
+from typing import Any, Iterable, Mapping, Sequence
+
+from sqlalchemy import inspect, text
+from sqlalchemy.engine import Connection
+
+from .settings import settings
+
+logger = logging.getLogger(__name__)
+
+UNIQUE_INDEX = "uq_telemetry_device_ts"
+PLAIN_INDEX = "ix_telemetry_device_ts"
+_COLUMNS = "id, device_id, ts, temperature, humidity"
+
+
+def enable_unique_key(conn: Connection) -> None:
+    """Move rows sharing a key aside, then add :data:`UNIQUE_INDEX`.
+
+    All but the lowest ``id`` per key go to ``telemetry_duplicates`` so they
+    can be inspected or restored. On PostgreSQL ``conn`` must be in
+    autocommit mode: the index is built ``CONCURRENTLY`` so ingest keeps
+    running. If duplicates arrive during the build it fails and leaves an
+    invalid index; running this again drops it, moves the new duplicates and
+    retries.
+    """
+
+    conn.execute(
+        text(
+            "CREATE TABLE IF NOT EXISTS telemetry_duplicates ("
+            "id BIGINT PRIMARY KEY, device_id VARCHAR(100) NOT NULL, "
+            "ts BIGINT NOT NULL, temperature FLOAT NOT NULL, humidity FLOAT NOT NULL)"
+        )
+    )
+    if conn.dialect.name == "postgresql":
+        conn.execute(text(f"DROP INDEX CONCURRENTLY IF EXISTS {UNIQUE_INDEX}"))
+        # One statement, so nothing is deleted without being copied.
+        conn.execute(
+            text(
+                "WITH moved AS ("
+                "DELETE FROM telemetry a USING telemetry b "
+                "WHERE a.device_id = b.device_id AND a.ts = b.ts AND a.id > b.id "
+                f"RETURNING a.id, a.device_id, a.ts, a.temperature, a.humidity) "
+                f"INSERT INTO telemetry_duplicates ({_COLUMNS}) "
+                f"SELECT {_COLUMNS} FROM moved ON CONFLICT (id) DO NOTHING"
+            )
+        )
+        conn.execute(
+            text(
+                f"CREATE UNIQUE INDEX CONCURRENTLY {UNIQUE_INDEX} "
+                "ON telemetry (device_id, ts)"
+            )
+        )
+        # The unique index serves every lookup the plain one did.
+        conn.execute(text(f"DROP INDEX CONCURRENTLY IF EXISTS {PLAIN_INDEX}"))
+        return
+
+    losers = "id NOT IN (SELECT min(id) FROM telemetry GROUP BY device_id, ts)"
+    for statement in (
+        f"INSERT INTO telemetry_duplicates ({_COLUMNS}) "
+        f"SELECT {_COLUMNS} FROM telemetry WHERE {losers}",
+        f"DELETE FROM telemetry WHERE {losers}",
+        f"CREATE UNIQUE INDEX {UNIQUE_INDEX} ON telemetry (device_id, ts)",
+        f"DROP INDEX IF EXISTS {PLAIN_INDEX}",
+    ):
+        conn.execute(text(statement))
+
+
+def disable_unique_key(conn: Connection) -> None:
+    """Swap :data:`UNIQUE_INDEX` for a plain index and restore moved rows."""
+
+    for statement in (
+        f"CREATE INDEX IF NOT EXISTS {PLAIN_INDEX} ON telemetry (device_id, ts)",
+        f"DROP INDEX IF EXISTS {UNIQUE_INDEX}",
+    ):
+        conn.execute(text(statement))
+    if inspect(conn).has_table("telemetry_duplicates"):
+        conn.execute(
+            text(
+                f"INSERT INTO telemetry ({_COLUMNS}) "
+                f"SELECT {_COLUMNS} FROM telemetry_duplicates"
+            )
+        )
+        conn.execute(text("DROP TABLE telemetry_duplicates"))
+
+
+class RecentKeys:
+    """The last ``per_device`` timestamps written for up to ``max_devices`` devices.
+
+    QoS 1 redeliveries and reconnect resends usually repeat a reading within
+    seconds, so :meth:`filter` drops them before they reach the database,
+    where the unique ``(device_id, ts)`` key remains the real guard. With
+    ``match_values`` a repeat must also carry identical values to be dropped,
+    so corrected resends still reach an ``ON CONFLICT DO UPDATE``. Keys are
+    only added by :meth:`remember` once their transaction has committed.
+    ``per_device <= 0`` disables the filter.
+    """
+
+    def __init__(
+        self, per_device: int = 0, max_devices: int = 50000, match_values: bool = False
+    ) -> None:
+        self._per_device = per_device
+        self._max_devices = max(1, max_devices)
+        self._match_values = match_values
+        self._devices: OrderedDict[str, OrderedDict[int, tuple[float, float]]] = (
+            OrderedDict()
+        )
+        self._lock = threading.Lock()
+
+    @property
+    def enabled(self) -> bool:
+        return self._per_device > 0
+
+    def filter(self, rows: Sequence[Mapping[str, Any]]) -> list[Mapping[str, Any]]:
+        """Return ``rows`` minus recent repeats and repeats within ``rows``.
+
+        Within ``rows`` the first occurrence of a key wins, or the last one
+        with ``match_values``.
+        """
+
+        fresh: list[Mapping[str, Any]] = []
+        batch: dict[tuple[str, int], int] = {}
+        with self._lock:
+            for row in rows:
+                key = (row["device_id"], row["ts"])
+                index = batch.get(key)
+                if index is not None:
+                    if self._match_values:
+                        fresh[index] = row
+                    continue
+                if self._is_repeat(row):
+                    continue
+                batch[key] = len(fresh)
+                fresh.append(row)
+        return fresh
+
+    def remember(self, rows: Iterable[Mapping[str, Any]]) -> None:
+        if not self.enabled:
+            return
+        with self._lock:
+            for row in rows:
+                device_id = row["device_id"]
+                keys = self._devices.get(device_id)
+                if keys is None:
+                    keys = self._devices[device_id] = OrderedDict()
+                else:
+                    self._devices.move_to_end(device_id)
+                keys[row["ts"]] = (row["temperature"], row["humidity"])
+                keys.move_to_end(row["ts"])
+                while len(keys) > self._per_device:
+                    keys.popitem(last=False)
+            while len(self._devices) > self._max_devices:
+                self._devices.popitem(last=False)
+
+    def invalidate(self, device_id: str | None = None) -> None:
+        with self._lock:
+            if device_id is None:
+                self._devices.clear()
+            else:
+                self._devices.pop(device_id, None)
+
+    def _is_repeat(self, row: Mapping[str, Any]) -> bool:
+        keys = self._devices.get(row["device_id"])
+        if keys is None:
+            return False
+        values = keys.get(row["ts"])
+        if values is None:
+            return False
+        return not self._match_values or values == (
+            row["temperature"],
+            row["humidity"],
+        )
+
+
+recent_keys = RecentKeys(
+    settings.DEDUP_RECENT_KEYS if settings.INGEST_DEDUP != "off" else 0,
+    settings.DEVICE_CACHE_SIZE,
+    match_values=settings.INGEST_DEDUP == "update",
+)
+
+
+def main(argv: Sequence[str] | None = None) -> None:
+    parser = argparse.ArgumentParser(prog="python -m app.dedup")
+    parser.add_argument(
+        "command",
+        choices=("enable", "disable"),
+        help="add or remove the unique (device_id, ts) key",
+    )
+    args = parser.parse_args(argv)
+
+    from .db import engine
+
+    logging.basicConfig(level=logging.INFO)
+    change = enable_unique_key if args.command == "enable" else disable_unique_key
+    if engine.dialect.name == "postgresql":
+        with engine.connect() as conn:
+            conn.execution_options(isolation_level="AUTOCOMMIT")
+            change(conn)
+    else:
+        with engine.begin() as conn:
+            change(conn)
+    logger.info("Unique telemetry key %sd", args.command)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,162 @@
+"""Server-side downsampling of telemetry for long chart ranges."""
+
+from __future__ import annotations
+
+import math
+from itertools import islice
+from typing import AsyncIterable, AsyncIterator, Iterable, Iterator, Sequence
+
+from sqlalchemy import Select, func, select
+
+from .models import Telemetry
+
+Point = Sequence[float]  # (ts, temperature, humidity)
+
+
+def bucket_size(start: int, end: int, max_points: int) -> int:
+    """Smallest bucket width (seconds) yielding at most ``max_points`` buckets."""
+
+    return max(1, math.ceil((end - start + 1) / max(1, max_points)))
+
+
+def bucket_statement(device_id: str, start: int, end: int, bucket: int) -> Select:
+    """Aggregate ``telemetry`` into ``bucket``-second buckets in SQL.
+
+    The ``device_id``/``ts`` range predicate is served by
+    ``uq_telemetry_device_ts``; rows come back ordered by bucket start.
+    """
+
+    bucket_ts = ((Telemetry.ts // bucket) * bucket).label("bucket")
+    return (
+        select(
+            bucket_ts,
+            func.count().label("count"),
+            func.avg(Telemetry.temperature).label("temp_avg"),
+            func.min(Telemetry.temperature).label("temp_min"),
+            func.max(Telemetry.temperature).label("temp_max"),
+            func.avg(Telemetry.humidity).label("hum_avg"),
+            func.min(Telemetry.humidity).label("hum_min"),
+            func.max(Telemetry.humidity).label("hum_max"),
+        )
+        .where(
+            Telemetry.device_id == device_id,
+            Telemetry.ts >= start,
+            Telemetry.ts <= end,
+        )
+        .group_by(bucket_ts)
+        .order_by(bucket_ts)
+    )
+
+
+def raw_statement(device_id: str, start: int, end: int) -> Select:
+    return (
+        select(Telemetry.ts, Telemetry.temperature, Telemetry.humidity)
+        .where(
+            Telemetry.device_id == device_id,
+            Telemetry.ts >= start,
+            Telemetry.ts <= end,
+        )
+        .order_by(Telemetry.ts)
+    )
+
+
+def lttb_sizes(total: int, threshold: int) -> Iterator[int]:
+    """Group sizes for LTTB: the first point, ``threshold - 2`` buckets, the last."""
+
+    def bounds(i: int) -> int:
+        # Index (into the full series) where bucket ``i`` starts.
+        return i * (total - 2) // (threshold - 2) + 1
+
+    yield 1
+    for i in range(threshold - 2):
+        yield bounds(i + 1) - bounds(i)
+    yield total - bounds(threshold - 2)
+
+
+class LTTBReducer:
+    """Largest-Triangle-Three-Buckets fed one group at a time.
+
+    Groups come from :func:`lttb_sizes`; only the pending bucket is held, so
+    the input can be a (sync or async) server-side cursor. ``value_index``
+    selects the series whose visual shape is preserved; whole points are
+    emitted.
+    """
+
+    def __init__(self, value_index: int = 1) -> None:
+        self._value_index = value_index
+        self._selected: Point | None = None
+        self._pending: list[Point] | None = None
+
+    def push(self, group: list[Point]) -> list[Point]:
+        if self._selected is None:
+            self._selected = group[0]
+            return [group[0]]
+        if self._pending is None:
+            self._pending = group
+            return []
+
+        vi = self._value_index
+        avg_x = sum(p[0] for p in group) / len(group)
+        avg_y = sum(p[vi] for p in group) / len(group)
+        ax, ay = self._selected[0], self._selected[vi]
+        best, best_area = self._pending[0], -1.0
+        for p in self._pending:
+            area = abs((ax - avg_x) * (p[vi] - ay) - (ax - p[0]) * (avg_y - ay))
+            if area > best_area:
+                best, best_area = p, area
+        self._selected, self._pending = best, group
+        return [best]
+
+    def finish(self) -> list[Point]:
+        return [self._pending[-1]] if self._pending else []
+
+
+def lttb(
+    points: Iterable[Point], total: int, threshold: int, value_index: int = 1
+) -> Iterator[Point]:
+    """Reduce ``total`` time-sorted points to ``threshold`` with LTTB.
+
+    LTTB always keeps both endpoints plus one point per bucket, so
+    ``threshold`` is raised to at least 3.
+    """
+
+    it = iter(points)
+    threshold = max(3, threshold)
+    if threshold >= total:
+        yield from it
+        return
+
+    reducer = LTTBReducer(value_index)
+    for size in lttb_sizes(total, threshold):
+        group = list(islice(it, size))
+        if not group:
+            break
+        yield from reducer.push(group)
+    yield from reducer.finish()
+
+
+async def alttb(
+    points: AsyncIterable[Point], total: int, threshold: int, value_index: int = 1
+) -> AsyncIterator[Point]:
+    """Async-iterator counterpart of :func:`lttb`."""
+
+    it = aiter(points)
+    threshold = max(3, threshold)
+    if threshold >= total:
+        async for point in it:
+            yield point
+        return
+
+    reducer = LTTBReducer(value_index)
+    for size in lttb_sizes(total, threshold):
+        group = []
+        async for point in it:
+            group.append(point)
+            if len(group) == size:
+                break
+        if not group:
+            break
+        for point in reducer.push(group):
+            yield point
+    for point in reducer.finish():
+        yield point
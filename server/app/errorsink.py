@@ -0,0 +1,232 @@
+"""Buffered, coalescing writer for the ``errors`` table.
+
+A device repeating the same malformed payload every few seconds, or a storm of
+bad messages, would otherwise cost one INSERT and COMMIT per message. The sink
+keeps one row per ``(device_id, reason)`` and coalescing window: the first
+occurrence is inserted, repeats only bump an in-memory counter that is
+written back as ``count``/``last_ts`` on the next flush. Each device may open
+at most ``per_device_limit`` rows per window; further distinct reasons are
+folded into a single :data:`RATE_LIMITED_REASON` row for that device, and once
+``max_entries`` rows are buffered new ones fold into one :data:`BUFFER_FULL_REASON`
+row. A flush that fails because the database is unreachable is retried later;
+one the database refuses is logged and dropped.
+"""
+
+from __future__ import annotations
+
+import logging
+import threading
+import time
+from dataclasses import dataclass
+from typing import Callable, Iterable
+
+from sqlalchemy import bindparam, insert, update
+from sqlalchemy.exc import SQLAlchemyError
+from sqlalchemy.orm import Session
+
+from .db import SessionLocal, is_transient
+from .decoder import MAX_DEVICE_ID_LENGTH
+from .hub import stream_hub
+from .models import IngestError
+from .prometheus import count_ingest, ingest_error
+from .settings import settings
+
+logger = logging.getLogger(__name__)
+
+RATE_LIMITED_REASON = "further errors rate limited"
+BUFFER_FULL_REASON = "error buffer full"
+
+_errors = IngestError.__table__
+_bump = (
+    update(_errors)
+    .where(_errors.c.id == bindparam("_id"))
+    .values(count=_errors.c.count + bindparam("_n"), last_ts=bindparam("_last"))
+)
+
+
+@dataclass(slots=True)
+class _Entry:
+    device_id: str | None
+    reason: str
+    opened: float
+    first_ts: int
+    last_ts: int
+    pending: int = 1
+    row_id: int | None = None
+
+
+class ErrorSink:
+    """Coalesce ingest errors in memory and flush them in batches.
+
+    :meth:`record` never touches the database. A background thread flushes
+    every ``flush_interval`` seconds, and sooner when a new row is opened so
+    the first occurrence of an error shows up promptly.
+    """
+
+    def __init__(
+        self,
+        session_factory: Callable[[], Session] = SessionLocal,
+        window: float = 60.0,
+        flush_interval: float = 1.0,
+        per_device_limit: int = 10,
+        max_entries: int = 10000,
+    ) -> None:
+        self._session_factory = session_factory
+        self._window = window
+        self._flush_interval = flush_interval
+        self._per_device_limit = max(1, per_device_limit)
+        self._max_entries = max(1, max_entries)
+        self._entries: dict[tuple[str | None, str], _Entry] = {}
+        self._budgets: dict[str | None, tuple[float, int]] = {}
+        self._lock = threading.Lock()
+        self._flush_lock = threading.Lock()
+        self._wake = threading.Event()
+        self._stop = threading.Event()
+        self._thread: threading.Thread | None = None
+
+    def record(
+        self, errors: Iterable[tuple[str, str | None]], source: str = "http"
+    ) -> int:
+        """Buffer ``(reason, device_id)`` errors; returns how many were taken."""
+
+        errors = list(errors)
+        if not errors:
+            return 0
+        count_ingest(ingest_error, source, [device_id for _, device_id in errors])
+        now = time.monotonic()
+        ts = int(time.time())
+        opened = False
+        with self._lock:
+            for reason, device_id in errors:
+                if device_id is not None:
+                    device_id = device_id[:MAX_DEVICE_ID_LENGTH]
+                opened |= self._add(device_id, reason[:500], now, ts)
+        if opened:
+            self._wake.set()
+        return len(errors)
+
+    def _add(self, device_id: str | None, reason: str, now: float, ts: int) -> bool:
+        entry = self._entries.get((device_id, reason))
+        if entry is not None and now - entry.opened < self._window:
+            entry.pending += 1
+            entry.last_ts = ts
+            return False
+
+        if len(self._entries) >= self._max_entries and reason != BUFFER_FULL_REASON:
+            return self._add(None, BUFFER_FULL_REASON, now, ts)
+        started, used = self._budgets.get(device_id, (now, 0))
+        if now - started >= self._window:
+            started, used = now, 0
+        if used >= self._per_device_limit and reason != RATE_LIMITED_REASON:
+            return self._add(device_id, RATE_LIMITED_REASON, now, ts)
+        self._budgets[device_id] = (started, used + 1)
+        self._entries[(device_id, reason)] = _Entry(device_id, reason, now, ts, ts)
+        return True
+
+    def flush(self) -> int:
+        """Write buffered errors; returns the number of occurrences written."""
+
+        with self._flush_lock:
+            batch = self._take()
+            if not batch:
+                return 0
+            new = [(entry, n, last) for entry, n, last in batch if entry.row_id is None]
+            seen = [(entry, n, last) for entry, n, last in batch if entry.row_id]
+            try:
+                with self._session_factory() as db:
+                    if new:
+                        ids = db.execute(
+                            insert(IngestError).returning(
+                                IngestError.id, sort_by_parameter_order=True
+                            ),
+                            [
+                                {
+                                    "device_id": entry.device_id,
+                                    "reason": entry.reason,
+                                    "ts": entry.first_ts,
+                                    "last_ts": last,
+                                    "count": n,
+                                }
+                                for entry, n, last in new
+                            ],
+                        ).scalars()
+                        for (entry, _, _), row_id in zip(new, ids):
+                            entry.row_id = row_id
+                    if seen:
+                        db.execute(
+                            _bump,
+                            [
+                                {"_id": entry.row_id, "_n": n, "_last": last}
+                                for entry, n, last in seen
+                            ],
+                        )
+                    db.commit()
+            except SQLAlchemyError as exc:
+                logger.exception("Failed to record %d ingest error(s)", len(batch))
+                if is_transient(exc):
+                    self._restore(batch)
+                return 0
+
+        for entry, _, last in new:
+            stream_hub.publish_error(entry.device_id, entry.reason, last, entry.row_id)
+        return sum(n for _, n, _ in batch)
+
+    def _take(self) -> list[tuple[_Entry, int, int]]:
+        """Detach pending counts and forget rows whose window has closed."""
+
+        now = time.monotonic()
+        batch = []
+        with self._lock:
+            for key, entry in list(self._entries.items()):
+                if entry.pending:
+                    batch.append((entry, entry.pending, entry.last_ts))
+                    entry.pending = 0
+                elif now - entry.opened >= self._window:
+                    del self._entries[key]
+            for device_id, (started, _) in list(self._budgets.items()):
+                if now - started >= self._window:
+                    del self._budgets[device_id]
+        return batch
+
+    def _restore(self, batch: list[tuple[_Entry, int, int]]) -> None:
+        with self._lock:
+            for entry, n, _ in batch:
+                entry.pending += n
+
+    def pending(self) -> int:
+        with self._lock:
+            return sum(entry.pending for entry in self._entries.values())
+
+    def start(self) -> None:
+        if self._thread is not None:
+            return
+        self._stop.clear()
+        self._thread = threading.Thread(
+            target=self._run, name="error-sink", daemon=True
+        )
+        self._thread.start()
+
+    def stop(self) -> None:
+        self._stop.set()
+        self._wake.set()
+        if self._thread is not None:
+            self._thread.join(timeout=5)
+            self._thread = None
+        self.flush()
+
+    def _run(self) -> None:
+        while not self._stop.is_set():
+            self._wake.wait(self._flush_interval)
+            self._wake.clear()
+            try:
+                self.flush()
+            except Exception:  # pragma: no cover - keep the loop alive
+                logger.exception("Error sink flush failed")
+
+
+error_sink = ErrorSink(
+    window=settings.ERROR_COALESCE_SECONDS,
+    flush_interval=settings.ERROR_FLUSH_INTERVAL_SECONDS,
+    per_device_limit=settings.ERROR_DEVICE_LIMIT,
+    max_entries=settings.ERROR_BUFFER_LIMIT,
+)
@@ -0,0 +1,132 @@
+"""Fan-out hub pushing ingested readings and errors to live subscribers."""
+
+from __future__ import annotations
+
+import asyncio
+import json
+import threading
+from dataclasses import dataclass
+from typing import Any, Iterable, Mapping
+
+from .settings import settings
+from .timeutil import to_iso
+
+ALL_DEVICES = "*"
+
+
+@dataclass(frozen=True)
+class StreamEvent:
+    """An event serialized once at publish time and shared by every subscriber."""
+
+    kind: str
+    data: str
+
+    @property
+    def sse(self) -> str:
+        return f"event: {self.kind}\ndata: {self.data}\n\n"
+
+
+class Subscription:
+    """Bounded per-client buffer; the oldest event is dropped when it is full."""
+
+    def __init__(
+        self, device_id: str, loop: asyncio.AbstractEventLoop, maxsize: int
+    ) -> None:
+        self.device_id = device_id
+        self.dropped = 0
+        self._loop = loop
+        self._queue: asyncio.Queue[StreamEvent] = asyncio.Queue(maxsize=maxsize)
+
+    async def get(self) -> StreamEvent:
+        return await self._queue.get()
+
+    def _offer(self, event: StreamEvent) -> None:
+        if self._queue.full():
+            self._queue.get_nowait()
+            self.dropped += 1
+        self._queue.put_nowait(event)
+
+
+class StreamHub:
+    """Route events to subscribers by device id.
+
+    :meth:`publish` may be called from any thread (ingest runs on writer
+    threads and the request threadpool); events are handed to each
+    subscriber's event loop with ``call_soon_threadsafe`` so a slow client
+    only ever fills its own buffer.
+    """
+
+    def __init__(self, buffer_size: int = 256) -> None:
+        self._buffer_size = max(1, buffer_size)
+        self._subscribers: dict[str, set[Subscription]] = {}
+        self._lock = threading.Lock()
+
+    def subscribe(self, device_id: str) -> Subscription:
+        """Register a subscriber; must be called from its event loop."""
+
+        sub = Subscription(device_id, asyncio.get_running_loop(), self._buffer_size)
+        with self._lock:
+            self._subscribers.setdefault(device_id, set()).add(sub)
+        return sub
+
+    def unsubscribe(self, sub: Subscription) -> None:
+        with self._lock:
+            subs = self._subscribers.get(sub.device_id)
+            if subs is None:
+                return
+            subs.discard(sub)
+            if not subs:
+                del self._subscribers[sub.device_id]
+
+    def subscriber_count(self) -> int:
+        with self._lock:
+            return sum(len(subs) for subs in self._subscribers.values())
+
+    def publish(self, device_id: str | None, kind: str, payload: Any) -> None:
+        with self._lock:
+            targets = list(self._subscribers.get(ALL_DEVICES, ()))
+            if device_id is not None:
+                targets.extend(self._subscribers.get(device_id, ()))
+        if not targets:
+            return
+
+        event = StreamEvent(kind, json.dumps(payload, separators=(",", ":")))
+        for sub in targets:
+            try:
+                sub._loop.call_soon_threadsafe(sub._offer, event)
+            except RuntimeError:  # pragma: no cover - loop already closed
+                self.unsubscribe(sub)
+
+    def publish_readings(self, rows: Iterable[Mapping[str, Any]]) -> None:
+        if not self._subscribers:
+            return
+        for row in rows:
+            self.publish(
+                row["device_id"],
+                "reading",
+                {
+                    "deviceId": row["device_id"],
+                    "ts": to_iso(row["ts"]),
+                    "temp": row["temperature"],
+                    "hum": row["humidity"],
+                },
+            )
+
+    def publish_error(
+        self, device_id: str | None, reason: str, ts: int, error_id: Any = None
+    ) -> None:
+        if not self._subscribers:
+            return
+        self.publish(
+            device_id,
+            "error",
+            {
+                "id": str(error_id) if error_id is not None else None,
+                "deviceId": device_id,
+                "ts": to_iso(ts),
+                "msg": reason,
+            },
+        )
+
+
+stream_hub = StreamHub(settings.STREAM_BUFFER_SIZE)
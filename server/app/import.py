@@ -0,0 +1,6 @@
+"""``python -m app.import``; see :mod:`app.importer` (``import`` is a keyword)."""
+
+from .importer import main
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,302 @@
+"""Bulk import of historical telemetry from CSV or NDJSON files.
+
+Run as ``python -m app.import``::
+
+    python -m app.import dump-2025.csv site-b.ndjson --chunk-size 50000
+
+Files are read line by line in chunks. On PostgreSQL each chunk is loaded
+with ``COPY FROM STDIN`` into a temporary staging table and merged into
+``telemetry`` (new devices registered in bulk), with ``ON CONFLICT`` on the
+``(device_id, ts)`` key when ``INGEST_DEDUP`` is enabled; other databases go
+through the regular batched ingest path. After each committed chunk the byte
+offset is written to a checkpoint file next to the input, so an interrupted
+import resumes where it stopped. Rows that fail to parse or validate, or that
+the database refuses, are counted and skipped, never written to ``errors``.
+"""
+
+from __future__ import annotations
+
+import argparse
+import csv
+import json
+import logging
+import os
+import sys
+import time
+from dataclasses import dataclass, field
+from pathlib import Path
+from typing import IO, Any, Iterator, Literal, Mapping, Sequence
+
+from sqlalchemy import text
+from sqlalchemy.orm import Session
+
+from .db import is_transient
+from .decoder import PayloadError, check_reading, decode_json, parse_timestamp
+
+logger = logging.getLogger(__name__)
+
+FileFormat = Literal["csv", "ndjson"]
+
+_STAGING = "telemetry_import"
+_DEVICE_KEYS = ("deviceId", "device_id")
+
+
+@dataclass
+class ImportStats:
+    read: int = 0
+    inserted: int = 0
+    rejected: int = 0
+    seconds: float = 0.0
+    min_ts: int | None = None
+    max_ts: int | None = None
+    errors: list[str] = field(default_factory=list)
+
+    @property
+    def rate(self) -> float:
+        return self.read / self.seconds if self.seconds else 0.0
+
+    def add_range(self, rows: Sequence[dict[str, Any]]) -> None:
+        low = min(row["ts"] for row in rows)
+        high = max(row["ts"] for row in rows)
+        self.min_ts = low if self.min_ts is None else min(self.min_ts, low)
+        self.max_ts = high if self.max_ts is None else max(self.max_ts, high)
+
+
+def detect_format(path: Path) -> FileFormat:
+    return "csv" if path.suffix.lower() == ".csv" else "ndjson"
+
+
+def _csv_row(header: list[str], line: bytes) -> dict[str, Any]:
+    values = next(csv.reader([line.decode("utf-8")]))
+    record = dict(zip(header, values))
+    device_id = next((record[k] for k in _DEVICE_KEYS if record.get(k)), None)
+    if not device_id:
+        raise ValueError("missing deviceId")
+    row = {
+        "device_id": device_id,
+        "ts": parse_timestamp(record.get("ts")),
+        "temperature": float(record["temperature"]),
+        "humidity": float(record["humidity"]),
+    }
+    check_reading(device_id, row["ts"])
+    return row
+
+
+def iter_chunks(
+    fh: IO[bytes], fmt: FileFormat, chunk_size: int, stats: ImportStats
+) -> Iterator[tuple[list[dict[str, Any]], int]]:
+    """Yield ``(rows, offset after the chunk)`` starting at ``fh``'s position.
+
+    For CSV the header is always read from the start of the file.
+    """
+
+    header: list[str] = []
+    if fmt == "csv":
+        position = fh.tell()
+        fh.seek(0)
+        header = next(csv.reader([fh.readline().decode("utf-8-sig")]))
+        fh.seek(max(position, fh.tell()))
+
+    rows: list[dict[str, Any]] = []
+    for line in iter(fh.readline, b""):
+        if not line.strip():
+            continue
+        stats.read += 1
+        try:
+            if fmt == "csv":
+                rows.append(_csv_row(header, line))
+            else:
+                rows.append(decode_json(line).as_row())
+        except (PayloadError, ValueError, KeyError, TypeError, OverflowError) as exc:
+            stats.rejected += 1
+            if len(stats.errors) < 20:
+                stats.errors.append(f"offset {fh.tell() - len(line)}: {exc}")
+            continue
+        if len(rows) >= chunk_size:
+            yield rows, fh.tell()
+            rows = []
+    yield rows, fh.tell()
+
+
+def copy_chunk(db: Session, rows: Sequence[dict[str, Any]], dedup: str) -> int:
+    """Load ``rows`` with ``COPY`` into staging, then merge; PostgreSQL only."""
+
+    db.execute(
+        text(
+            f"CREATE TEMP TABLE IF NOT EXISTS {_STAGING} "
+            "(device_id varchar(100), ts bigint, temperature float8, humidity float8) "
+            "ON COMMIT DELETE ROWS"
+        )
+    )
+    raw = db.connection().connection.driver_connection
+    with raw.cursor() as cur:
+        with cur.copy(
+            f"COPY {_STAGING} (device_id, ts, temperature, humidity) FROM STDIN"
+        ) as copy:
+            for row in rows:
+                copy.write_row(
+                    (row["device_id"], row["ts"], row["temperature"], row["humidity"])
+                )
+
+    db.execute(
+        text(
+            "INSERT INTO devices (device_id) "
+            f"SELECT DISTINCT device_id FROM {_STAGING} "
+            "ON CONFLICT (device_id) DO NOTHING"
+        )
+    )
+    columns = "device_id, ts, temperature, humidity"
+    if dedup == "off":
+        merge = f"SELECT {columns} FROM {_STAGING}"
+    else:
+        conflict = (
+            "DO UPDATE SET temperature = EXCLUDED.temperature, "
+            "humidity = EXCLUDED.humidity"
+            if dedup == "update"
+            else "DO NOTHING"
+        )
+        # DISTINCT ON keeps one row per key: ON CONFLICT cannot touch a row twice.
+        merge = (
+            f"SELECT DISTINCT ON (device_id, ts) {columns} "
+            f"FROM {_STAGING} ORDER BY device_id, ts "
+            f"ON CONFLICT (device_id, ts) {conflict}"
+        )
+    result = db.execute(text(f"INSERT INTO telemetry ({columns}) {merge}"))
+    db.commit()
+    return result.rowcount
+
+
+def load_chunk(
+    db: Session, rows: Sequence[dict[str, Any]]
+) -> tuple[int, list[Mapping[str, Any]]]:
+    """Write ``rows``; returns the number inserted and the rows refused.
+
+    A ``COPY`` that fails for anything but a lost connection is retried
+    through the regular ingest path, which isolates the offending rows.
+    """
+
+    from .services import persist_telemetry_rows
+    from .settings import settings
+
+    if db.get_bind().dialect.name == "postgresql":
+        try:
+            return copy_chunk(db, rows, settings.INGEST_DEDUP), []
+        except Exception as exc:
+            db.rollback()
+            if is_transient(exc):
+                raise
+            logger.warning("COPY of %d rows failed (%s); retrying", len(rows), exc)
+    return persist_telemetry_rows(db, rows, source="import")
+
+
+def _checkpoint_path(path: Path) -> Path:
+    return path.with_name(path.name + ".import-checkpoint")
+
+
+def _read_checkpoint(path: Path) -> int:
+    try:
+        return int(json.loads(path.read_text())["offset"])
+    except (OSError, ValueError, KeyError):
+        return 0
+
+
+def _write_checkpoint(path: Path, offset: int, stats: ImportStats, done: bool) -> None:
+    tmp = path.with_name(path.name + ".tmp")
+    state = {
+        "offset": offset,
+        "read": stats.read,
+        "inserted": stats.inserted,
+        "done": done,
+    }
+    tmp.write_text(json.dumps(state))
+    os.replace(tmp, path)
+
+
+def import_file(
+    db: Session,
+    path: Path,
+    *,
+    fmt: FileFormat | None = None,
+    chunk_size: int = 50000,
+    resume: bool = True,
+) -> ImportStats:
+    """Import one file, resuming from its checkpoint unless ``resume`` is off."""
+
+    fmt = fmt or detect_format(path)
+    checkpoint = _checkpoint_path(path)
+    offset = _read_checkpoint(checkpoint) if resume else 0
+    stats = ImportStats()
+    started = time.perf_counter()
+    with open(path, "rb") as fh:
+        fh.seek(offset)
+        if offset:
+            logger.info("%s: resuming at byte %d", path, offset)
+        for rows, offset in iter_chunks(fh, fmt, max(1, chunk_size), stats):
+            if rows:
+                inserted, rejected = load_chunk(db, rows)
+                stats.inserted += inserted
+                stats.rejected += len(rejected)
+                for row in rejected[: max(0, 20 - len(stats.errors))]:
+                    stats.errors.append(
+                        f"{row['device_id']} at ts {row['ts']}: rejected by database"
+                    )
+                stats.add_range(rows)
+            _write_checkpoint(checkpoint, offset, stats, done=False)
+            stats.seconds = time.perf_counter() - started
+            logger.info(
+                "%s: %d rows read, %d inserted, %.0f rows/s",
+                path,
+                stats.read,
+                stats.inserted,
+                stats.rate,
+            )
+    _write_checkpoint(checkpoint, offset, stats, done=True)
+    stats.seconds = time.perf_counter() - started
+    return stats
+
+
+def main(argv: Sequence[str] | None = None) -> None:
+    parser = argparse.ArgumentParser(prog="python -m app.import")
+    parser.add_argument("files", nargs="+", type=Path)
+    parser.add_argument("--format", choices=("csv", "ndjson"), help="default: suffix")
+    parser.add_argument("--chunk-size", type=int, default=50000)
+    parser.add_argument(
+        "--restart", action="store_true", help="ignore existing checkpoints"
+    )
+    parser.add_argument("--database-url", help="overrides DATABASE_URL")
+    args = parser.parse_args(argv)
+
+    # Settings and engines are built at import time, so configure first.
+    if args.database_url:
+        os.environ["DATABASE_URL"] = args.database_url
+
+    from . import models  # noqa: F401 - registers the tables for init_db
+    from .db import SessionLocal, init_db
+    from .rollups import backfill
+    from .settings import settings
+
+    logging.basicConfig(level=logging.INFO)
+    init_db()
+    for path in args.files:
+        with SessionLocal() as db:
+            stats = import_file(
+                db,
+                path,
+                fmt=args.format,
+                chunk_size=args.chunk_size,
+                resume=not args.restart,
+            )
+            copied = db.get_bind().dialect.name == "postgresql"
+            if copied and settings.ROLLUPS_ENABLED and stats.min_ts is not None:
+                backfill(db, start=stats.min_ts, end=stats.max_ts)
+        for error in stats.errors:
+            logger.warning("%s: rejected %s", path, error)
+        sys.stdout.write(
+            f"{path}: {stats.read} rows read, {stats.inserted} inserted, "
+            f"{stats.rejected} rejected in {stats.seconds:.2f}s "
+            f"({stats.rate:.0f} rows/s)\n"
+        )
+
+
+if __name__ == "__main__":
+    main()
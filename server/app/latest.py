@@ -0,0 +1,270 @@
+"""In-memory table of the most recent reading per device."""
+
+from __future__ import annotations
+
+import threading
+import time
+from collections import OrderedDict
+from typing import TYPE_CHECKING, Any, Iterable, Mapping, NamedTuple, Sequence
+
+from sqlalchemy import Select, and_, desc, func, select
+from sqlalchemy.orm import Session
+
+if TYPE_CHECKING:
+    from sqlalchemy.ext.asyncio import AsyncSession
+
+from .models import Device, Telemetry
+from .settings import settings
+
+
+class LatestReading(NamedTuple):
+    ts: int
+    temperature: float
+    humidity: float
+
+
+class LatestCache:
+    """Last reading per device, updated by the ingest paths on write.
+
+    A miss (or an entry older than ``ttl`` seconds, which bounds staleness when
+    another process is ingesting) is seeded with one ``uq_telemetry_device_ts``
+    lookup. Devices without data are cached as ``None`` for the same ``ttl``
+    so unknown ids do not hit the database on every poll. ``ttl <= 0`` keeps
+    entries until they are evicted.
+    """
+
+    def __init__(self, max_size: int = 50000, ttl: float = 5.0) -> None:
+        self._max_size = max(1, max_size)
+        self._ttl = ttl
+        self._entries: OrderedDict[str, tuple[LatestReading | None, float]] = (
+            OrderedDict()
+        )
+        # Wall-clock ns of the last change seen per device; see :meth:`version`.
+        self._versions: OrderedDict[str, int] = OrderedDict()
+        self._lock = threading.Lock()
+
+    def update(
+        self, device_id: str, ts: int, temperature: float, humidity: float
+    ) -> None:
+        self._store(device_id, LatestReading(ts, temperature, humidity))
+
+    def update_many(self, rows: Iterable[Mapping[str, Any]]) -> None:
+        """Record written rows; only the newest ``ts`` per device is kept."""
+
+        newest: dict[str, LatestReading] = {}
+        for row in rows:
+            current = newest.get(row["device_id"])
+            if current is None or row["ts"] >= current.ts:
+                newest[row["device_id"]] = LatestReading(
+                    row["ts"], row["temperature"], row["humidity"]
+                )
+        for device_id, reading in newest.items():
+            self._store(device_id, reading)
+
+    def touch(self, device_ids: Iterable[str]) -> None:
+        """Bump the write version of devices that just had rows committed.
+
+        Called for every inserted or overwritten row, including late ones
+        older than the device's latest reading.
+        """
+
+        now = time.time_ns()
+        with self._lock:
+            for device_id in device_ids:
+                self._bump(device_id, now)
+
+    def version(self, device_id: str) -> int:
+        """Write version of ``device_id`` for HTTP validators.
+
+        It changes whenever this process commits rows for the device or a
+        re-seed finds a different latest reading. Writes by other processes
+        that do not move the latest reading go unnoticed.
+        """
+
+        with self._lock:
+            version = self._versions.get(device_id)
+            if version is None:
+                version = self._bump(device_id, time.time_ns())
+            return version
+
+    def _bump(self, device_id: str, now: int) -> int:
+        # Strictly increasing, even for two bumps within the clock resolution.
+        version = max(now, self._versions.get(device_id, 0) + 1)
+        self._versions[device_id] = version
+        self._versions.move_to_end(device_id)
+        while len(self._versions) > self._max_size:
+            self._versions.popitem(last=False)
+        return version
+
+    def peek(self, device_id: str) -> tuple[bool, LatestReading | None]:
+        """Return ``(hit, reading)`` without touching the database."""
+
+        with self._lock:
+            entry = self._entries.get(device_id)
+            if entry is None:
+                return False, None
+            reading, stored_at = entry
+            if self._ttl > 0 and time.monotonic() - stored_at > self._ttl:
+                return False, reading
+            self._entries.move_to_end(device_id)
+            return True, reading
+
+    def get(self, db: Session, device_id: str) -> LatestReading | None:
+        hit, reading = self.peek(device_id)
+        if hit:
+            return reading
+
+        row = db.execute(_seed_statement(device_id)).one_or_none()
+        return self._store(device_id, LatestReading(*row) if row else None)
+
+    async def aget(self, db: AsyncSession, device_id: str) -> LatestReading | None:
+        """Async counterpart of :meth:`get`."""
+
+        hit, reading = self.peek(device_id)
+        if hit:
+            return reading
+
+        row = (await db.execute(_seed_statement(device_id))).one_or_none()
+        return self._store(device_id, LatestReading(*row) if row else None)
+
+    def get_many(
+        self, db: Session, device_ids: Sequence[str] | None = None
+    ) -> dict[str, LatestReading | None]:
+        """Latest reading for each of ``device_ids``, or every known device.
+
+        Cache hits are answered from memory; all misses (or the whole fleet
+        when ``device_ids`` is ``None``) are seeded with a single query.
+        """
+
+        found, missing = self._peek_many(device_ids)
+        for chunk in _chunks(device_ids, missing):
+            found.update(self._store_many(db.execute(_bulk_statement(chunk)), chunk))
+        return self._ordered(found, device_ids)
+
+    async def aget_many(
+        self, db: AsyncSession, device_ids: Sequence[str] | None = None
+    ) -> dict[str, LatestReading | None]:
+        """Async counterpart of :meth:`get_many`."""
+
+        found, missing = self._peek_many(device_ids)
+        for chunk in _chunks(device_ids, missing):
+            rows = await db.execute(_bulk_statement(chunk))
+            found.update(self._store_many(rows, chunk))
+        return self._ordered(found, device_ids)
+
+    def invalidate(self, device_id: str | None = None) -> None:
+        with self._lock:
+            if device_id is None:
+                self._entries.clear()
+                self._versions.clear()
+            else:
+                self._entries.pop(device_id, None)
+                self._versions.pop(device_id, None)
+
+    def _peek_many(
+        self, device_ids: Sequence[str] | None
+    ) -> tuple[dict[str, LatestReading | None], list[str]]:
+        found: dict[str, LatestReading | None] = {}
+        missing: list[str] = []
+        for device_id in dict.fromkeys(device_ids or ()):
+            hit, reading = self.peek(device_id)
+            if hit:
+                found[device_id] = reading
+            else:
+                missing.append(device_id)
+        return found, missing
+
+    def _store_many(
+        self, rows: Iterable[Any], requested: Sequence[str] | None
+    ) -> dict[str, LatestReading | None]:
+        found: dict[str, LatestReading | None] = {}
+        for device_id, ts, temperature, humidity in rows:
+            reading = None if ts is None else LatestReading(ts, temperature, humidity)
+            found[device_id] = self._store(device_id, reading)
+        for device_id in requested or ():
+            if device_id not in found:
+                # Not in ``devices`` at all; cache the miss like :meth:`get`.
+                found[device_id] = self._store(device_id, None)
+        return found
+
+    @staticmethod
+    def _ordered(
+        found: dict[str, LatestReading | None], device_ids: Sequence[str] | None
+    ) -> dict[str, LatestReading | None]:
+        if device_ids is None:
+            return dict(sorted(found.items()))
+        return {device_id: found[device_id] for device_id in dict.fromkeys(device_ids)}
+
+    def _store(
+        self, device_id: str, reading: LatestReading | None
+    ) -> LatestReading | None:
+        now = time.monotonic()
+        with self._lock:
+            current = self._entries.get(device_id)
+            if (
+                reading is not None
+                and current is not None
+                and current[0] is not None
+                and current[0].ts > reading.ts
+            ):
+                # Late or replayed data never moves "latest" backwards.
+                reading = current[0]
+            if current is not None and current[0] != reading:
+                self._bump(device_id, time.time_ns())
+            self._entries[device_id] = (reading, now)
+            self._entries.move_to_end(device_id)
+            while len(self._entries) > self._max_size:
+                self._entries.popitem(last=False)
+        return reading
+
+
+def _seed_statement(device_id: str) -> Select:
+    return (
+        select(Telemetry.ts, Telemetry.temperature, Telemetry.humidity)
+        .where(Telemetry.device_id == device_id)
+        .order_by(desc(Telemetry.ts))
+        .limit(1)
+    )
+
+
+_BULK_CHUNK = 1000
+
+
+def _chunks(
+    device_ids: Sequence[str] | None, missing: list[str]
+) -> Iterable[list[str] | None]:
+    if device_ids is None:
+        yield None
+        return
+    for i in range(0, len(missing), _BULK_CHUNK):
+        yield missing[i : i + _BULK_CHUNK]
+
+
+def _bulk_statement(device_ids: Sequence[str] | None) -> Select:
+    """Last reading per device (``NULL`` columns for devices without data).
+
+    The correlated ``max(ts)`` and the join back on ``(device_id, ts)`` are
+    both single lookups in ``uq_telemetry_device_ts`` per device, on every
+    backend.
+    """
+
+    last_ts = (
+        select(func.max(Telemetry.ts))
+        .where(Telemetry.device_id == Device.device_id)
+        .correlate(Device)
+        .scalar_subquery()
+    )
+    stmt = select(
+        Device.device_id, Telemetry.ts, Telemetry.temperature, Telemetry.humidity
+    ).outerjoin(
+        Telemetry,
+        and_(Telemetry.device_id == Device.device_id, Telemetry.ts == last_ts),
+    )
+    if device_ids is not None:
+        stmt = stmt.where(Device.device_id.in_(device_ids))
+    return stmt
+
+
+latest_cache = LatestCache(
+    settings.LATEST_CACHE_SIZE, settings.LATEST_CACHE_TTL_SECONDS
+)
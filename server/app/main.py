@@ -2,26 +2,104 @@
 
 from __future__ import annotations
 
+import asyncio
+import json
 import logging
-from datetime import datetime, timedelta, timezone
-from typing import Optional
-
-from fastapi import Depends, FastAPI, HTTPException
+import time
+from typing import TYPE_CHECKING, Any, AsyncIterator, Iterator, Literal, Optional
+
+from fastapi import (
+    Depends,
+    FastAPI,
+    HTTPException,
+    Query,
+    Request,
+    Response,
+    WebSocket,
+    WebSocketDisconnect,
+)
+from fastapi.concurrency import run_in_threadpool
 from fastapi.middleware.cors import CORSMiddleware
-from pydantic import BaseModel
-from sqlalchemy import desc, func, select
+from fastapi.responses import JSONResponse, PlainTextResponse, StreamingResponse
+from pydantic import BaseModel, Field, ValidationError
+from sqlalchemy import Select, text
+from sqlalchemy.exc import SQLAlchemyError
 from sqlalchemy.orm import Session
 
-from .db import get_db, init_db
-from .models import IngestError, Telemetry
-from .mqtt import mqtt_service
-from .services import persist_telemetry
+from .db import (
+    SessionLocal,
+    dispose_async_engine,
+    get_db,
+    get_read_db,
+    init_db,
+    read_session,
+)
+from .decoder import MAX_DEVICE_ID_LENGTH, MAX_TS, MIN_TS
+from .downsample import lttb, raw_statement
+from .errorsink import error_sink
+from .export import (
+    MEDIA_TYPES,
+    ExportFormat,
+    TimestampFormat,
+    csv_chunks,
+    iter_pages,
+    ndjson_chunks,
+    parquet_available,
+    parquet_chunks,
+)
+from .hub import StreamEvent, Subscription, stream_hub
+from .latest import latest_cache
+from .presence import event_payload, events_statement, presence_watchdog
+from .prometheus import (
+    CONTENT_TYPE,
+    RequestTimer,
+    ingest_parse_seconds,
+    ingest_seconds,
+    metrics_registry,
+)
+from .queries import (
+    bucket_point,
+    bucketed_statement,
+    error_payload,
+    errors_statement,
+    errors_validators,
+    errors_version_statement,
+    fleet_payload,
+    json_array,
+    latest_payload,
+    latest_validators,
+    metric_point,
+    metrics_range,
+    newer_than,
+    parse_device_ids,
+    parse_since,
+    range_count_statement,
+    recent_metrics_statement,
+    resolve_device,
+    status_payload,
+    wants_range,
+)
+from .registry import device_registry
+from .retention import retention_service
+from .services import (
+    DB_REJECTED_REASON,
+    persist_telemetry,
+    persist_telemetry_rows,
+    record_ingest_errors,
+)
 from .settings import settings
+from .startup import Warmup, startup_timer
+from .timeutil import to_iso
+
+if TYPE_CHECKING:
+    from .mqtt import MQTTIngestService
 
 logger = logging.getLogger(__name__)
+startup_timer.mark("imports")
 
 app = FastAPI(title="IoT Telemetry Server")
 
+app.add_middleware(RequestTimer)
 app.add_middleware(
     CORSMiddleware,
     allow_origins=["*"],
@@ -31,39 +109,115 @@ app.add_middleware(
 )
 
 
+if settings.DB_ASYNC_ENABLED:
+    from .api_async import router as async_read_router
+
+    # Registered before the sync routes below so it takes precedence for
+    # /latest, /metrics, /status and /errors.
+    app.include_router(async_read_router)
+
+
 class TelemetryIn(BaseModel):
-    deviceId: str
-    ts: int
+    deviceId: str = Field(max_length=MAX_DEVICE_ID_LENGTH)
+    ts: int = Field(ge=MIN_TS, le=MAX_TS)
     temperature: float
     humidity: float
 
 
-ONLINE_DELTA = timedelta(seconds=settings.ONLINE_GRACE_SECONDS)
+_mqtt_service: MQTTIngestService | None = None
 
 
-def _to_iso(ts: int) -> str:
-    return (
-        datetime.fromtimestamp(ts, tz=timezone.utc).isoformat().replace("+00:00", "Z")
-    )
+def _start_mqtt() -> None:
+    """Import the MQTT stack only when ingest is enabled."""
+
+    global _mqtt_service
+    if settings.MQTT_ENABLED:
+        from .mqtt import mqtt_service
+
+        mqtt_service.start()
+        _mqtt_service = mqtt_service
+
+
+def _warm_devices() -> None:
+    with SessionLocal() as db:
+        logger.info("Device registry warmed with %d ids", device_registry.warm(db))
 
 
-def _resolve_device(device_id: Optional[str]) -> str:
-    return device_id or settings.DEFAULT_DEVICE_ID
+def _warm_latest() -> None:
+    with read_session() as db:
+        latest_cache.get_many(db)
+
+
+warmup = Warmup(
+    [
+        ("schema", init_db),
+        ("mqtt", _start_mqtt),
+        ("devices", _warm_devices),
+        ("latest", _warm_latest),
+        ("presence", presence_watchdog.start),
+    ],
+    startup_timer,
+    retry_interval=settings.STARTUP_RETRY_SECONDS,
+)
 
 
 @app.on_event("startup")
 def _startup() -> None:
-    init_db()
-    mqtt_service.start()
+    startup_timer.mark("setup")
+    error_sink.start()
+    retention_service.start()
+    warmup.start()
+    startup_timer.mark("services")
+    startup_timer.log("Serving")
 
 
 @app.on_event("shutdown")
-def _shutdown() -> None:
-    mqtt_service.stop()
+async def _shutdown() -> None:
+    await run_in_threadpool(warmup.stop)
+    await run_in_threadpool(retention_service.stop)
+    if _mqtt_service is not None:
+        await run_in_threadpool(_mqtt_service.stop)
+    await run_in_threadpool(presence_watchdog.stop)
+    await run_in_threadpool(error_sink.stop)
+    await dispose_async_engine()
+
+
+@app.get("/healthz")
+def healthz():
+    """Liveness: the process is serving requests. No dependency is checked."""
+
+    return {"ok": True}
+
+
+@app.get("/readyz")
+def readyz():
+    """Readiness: warm-up finished, the database answers and MQTT is connected.
+
+    Answers 503 with the failing checks until all pass; MQTT is only checked
+    when ingest is enabled.
+    """
+
+    checks = {"warm": warmup.done.is_set(), "db": _database_ok()}
+    if settings.MQTT_ENABLED:
+        checks["mqtt"] = _mqtt_service is not None and _mqtt_service.connected
+    ready = all(checks.values())
+    return JSONResponse(
+        {"ready": ready, "checks": checks}, status_code=200 if ready else 503
+    )
+
+
+def _database_ok() -> bool:
+    try:
+        with SessionLocal() as db:
+            db.execute(text("SELECT 1"))
+    except SQLAlchemyError:
+        return False
+    return True
 
 
 @app.post("/ingest")
 def ingest(t: TelemetryIn, db: Session = Depends(get_db)):
+    started = time.perf_counter()
     persist_telemetry(
         db,
         device_id=t.deviceId,
@@ -71,106 +225,475 @@ def ingest(t: TelemetryIn, db: Session = Depends(get_db)):
         temperature=t.temperature,
         humidity=t.humidity,
     )
+    ingest_seconds.observe(time.perf_counter() - started, "http")
     return {"ok": True}
 
 
+async def _iter_ndjson(request: Request) -> AsyncIterator[bytes]:
+    buffer = b""
+    async for chunk in request.stream():
+        buffer += chunk
+        *lines, buffer = buffer.split(b"\n")
+        for line in lines:
+            if line.strip():
+                yield line
+    if buffer.strip():
+        yield buffer
+
+
+async def _iter_batch_items(request: Request) -> AsyncIterator[Any]:
+    if "ndjson" in request.headers.get("content-type", ""):
+        async for line in _iter_ndjson(request):
+            yield line
+        return
+
+    try:
+        items = json.loads(await request.body())
+    except json.JSONDecodeError as exc:
+        raise HTTPException(status_code=400, detail=f"invalid JSON: {exc}") from exc
+    if not isinstance(items, list):
+        raise HTTPException(status_code=400, detail="expected a JSON array")
+    for item in items:
+        yield item
+
+
+def _reject_reason(exc: ValidationError) -> str:
+    err = exc.errors()[0]
+    loc = ".".join(str(part) for part in err.get("loc", ())) or "row"
+    return f"{loc}: {err['msg']}"
+
+
+@app.post("/ingest/batch")
+async def ingest_batch(request: Request, db: Session = Depends(get_db)):
+    """Ingest a JSON array or ``application/x-ndjson`` stream of readings.
+
+    Rows are validated one at a time and written in chunks of
+    ``INGEST_BATCH_CHUNK_SIZE``, each in its own transaction; a chunk the
+    database refuses is retried in halves down to single rows. Rejected rows are
+    reported in the response and recorded in the ``errors`` table; readings
+    already stored for the same ``(deviceId, ts)`` are counted as duplicates.
+    """
+
+    started = time.perf_counter()
+    chunk_size = max(1, settings.INGEST_BATCH_CHUNK_SIZE)
+    accepted = 0
+    duplicates = 0
+    rejects: list[dict[str, Any]] = []
+    chunk: list[tuple[int, dict[str, Any]]] = []
+
+    async def flush() -> None:
+        nonlocal accepted, duplicates
+        rows = [row for _, row in chunk]
+        try:
+            written, rejected = await run_in_threadpool(
+                persist_telemetry_rows, db, rows
+            )
+        except SQLAlchemyError as exc:
+            await run_in_threadpool(db.rollback)
+            logger.exception("Failed to persist telemetry chunk: %s", exc)
+            rejects.extend(
+                {
+                    "index": index,
+                    "deviceId": row["device_id"],
+                    "error": "database error",
+                }
+                for index, row in chunk
+            )
+        else:
+            accepted += written
+            duplicates += len(rows) - written - len(rejected)
+            if rejected:
+                indexes = {id(row): index for index, row in chunk}
+                rejects.extend(
+                    {
+                        "index": indexes[id(row)],
+                        "deviceId": row["device_id"],
+                        "error": DB_REJECTED_REASON,
+                    }
+                    for row in rejected
+                )
+        chunk.clear()
+
+    index = 0
+    async for item in _iter_batch_items(request):
+        parse_started = time.perf_counter()
+        try:
+            if isinstance(item, bytes):
+                t = TelemetryIn.model_validate_json(item)
+            else:
+                t = TelemetryIn.model_validate(item)
+            ingest_parse_seconds.observe(time.perf_counter() - parse_started, "http")
+        except ValidationError as exc:
+            device_id = item.get("deviceId") if isinstance(item, dict) else None
+            rejects.append(
+                {
+                    "index": index,
+                    "deviceId": device_id if isinstance(device_id, str) else None,
+                    "error": _reject_reason(exc),
+                }
+            )
+        else:
+            chunk.append(
+                (
+                    index,
+                    {
+                        "device_id": t.deviceId,
+                        "ts": t.ts,
+                        "temperature": t.temperature,
+                        "humidity": t.humidity,
+                    },
+                )
+            )
+            if len(chunk) >= chunk_size:
+                await flush()
+        index += 1
+
+    if chunk:
+        await flush()
+    if accepted:
+        ingest_seconds.observe(time.perf_counter() - started, "http")
+    if rejects:
+        record_ingest_errors(
+            (f"batch row {r['index']}: {r['error']}"[:500], r["deviceId"])
+            for r in rejects
+        )
+
+    return {
+        "ok": not rejects,
+        "accepted": accepted,
+        "duplicates": duplicates,
+        "rejected": rejects,
+    }
+
+
 @app.get("/latest")
-def latest(deviceId: Optional[str] = None, db: Session = Depends(get_db)):
-    device_id = _resolve_device(deviceId)
-    row = db.execute(
-        select(Telemetry)
-        .where(Telemetry.device_id == device_id)
-        .order_by(desc(Telemetry.ts))
-        .limit(1)
-    ).scalar_one_or_none()
+def latest(
+    request: Request,
+    response: Response,
+    deviceId: Optional[str] = None,
+    deviceIds: Optional[str] = None,
+    since: Optional[str] = None,
+    db: Session = Depends(get_read_db),
+):
+    """Latest reading for ``deviceId``, or a list for comma-separated ``deviceIds``.
+
+    The list variant omits devices without data instead of returning 404.
+    ``since`` (epoch seconds or a payload ``ts``) drops readings that are not
+    newer; a single device with nothing newer answers 204. The ``ETag`` is
+    derived from the device's in-memory write version, so a matching
+    ``If-None-Match`` gets a 304 without touching the database.
+    """
+
+    cursor = parse_since(since)
+    if deviceIds is not None:
+        rows = latest_cache.get_many(db, parse_device_ids(deviceIds))
+        validators = latest_validators(rows, rows.values(), cursor)
+        if not_modified := validators.apply(request.headers, response):
+            return not_modified
+        return [
+            latest_payload(d, row) for d, row in rows.items() if newer_than(row, cursor)
+        ]
+    device_id = resolve_device(deviceId)
+    row = latest_cache.get(db, device_id)
     if not row:
         raise HTTPException(status_code=404, detail="no data")
+    validators = latest_validators([device_id], [row], cursor)
+    if not_modified := validators.apply(request.headers, response):
+        return not_modified
+    if not newer_than(row, cursor):
+        return Response(status_code=204, headers=validators.headers())
+    return latest_payload(device_id, row)
+
+
+@app.get("/fleet/status")
+def fleet_status(
+    deviceIds: Optional[str] = None,
+    online: Optional[bool] = None,
+    db: Session = Depends(get_read_db),
+):
+    """Last reading and online flag for every device (or ``deviceIds``).
 
-    ts_iso = _to_iso(row.ts)
-    now = datetime.now(tz=timezone.utc)
-    is_online = now - datetime.fromtimestamp(row.ts, tz=timezone.utc) <= ONLINE_DELTA
+    ``online=true``/``false`` keeps only online or offline devices.
+    """
 
-    return {
-        "id": device_id,
-        "deviceId": device_id,
-        "ts": ts_iso,
-        "temp": row.temperature,
-        "hum": row.humidity,
-        "temperature": row.temperature,
-        "humidity": row.humidity,
-        "online": is_online,
-    }
+    rows = latest_cache.get_many(db, parse_device_ids(deviceIds))
+    return fleet_payload(rows, online)
 
 
 @app.get("/metrics")
 def metrics(
+    request: Request,
+    response: Response,
     deviceId: Optional[str] = None,
     limit: int = 300,
-    db: Session = Depends(get_db),
+    since: Optional[str] = None,
+    from_: Optional[int] = Query(None, alias="from"),
+    to: Optional[int] = None,
+    bucket: Optional[int] = None,
+    maxPoints: Optional[int] = None,
+    mode: Literal["avg", "lttb"] = "avg",
+    db: Session = Depends(get_read_db),
 ):
-    device_id = _resolve_device(deviceId)
-    limit = max(1, min(limit, 1000))
-
-    rows = (
-        db.execute(
-            select(Telemetry)
-            .where(Telemetry.device_id == device_id)
-            .order_by(desc(Telemetry.ts))
-            .limit(limit)
+    """Return recent raw readings, or a downsampled series for a time range.
+
+    Without ``from``/``to``/``bucket``/``maxPoints`` the last ``limit`` raw
+    rows are returned, only those after ``since`` (epoch seconds or the
+    ``ts`` of the last point held) when given. Otherwise the ``[from, to]``
+    range (epoch seconds) is either aggregated per ``bucket`` seconds in SQL
+    (``mode=avg``, with min/max/avg/count per bucket) or reduced to
+    ``maxPoints`` raw points with LTTB (``mode=lttb``), and streamed as a
+    JSON array.
+
+    Both carry an ``ETag`` derived from the device's write version, which
+    every committed row bumps (late ones too); a matching ``If-None-Match``
+    gets a 304 without a query.
+    """
+
+    device_id = resolve_device(deviceId)
+    newest = latest_cache.get(db, device_id)
+    if not wants_range(from_, to, bucket, maxPoints):
+        cursor = parse_since(since)
+        validators = latest_validators([device_id], [newest], limit, cursor)
+        if not_modified := validators.apply(request.headers, response):
+            return not_modified
+        if not newer_than(newest, cursor):
+            return []
+        rows = db.execute(recent_metrics_statement(device_id, limit, cursor)).all()
+        return [metric_point(row) for row in reversed(rows)]
+
+    start, end, max_points = metrics_range(from_, to, maxPoints)
+    validators = latest_validators(
+        [device_id], [newest], mode, start, end, max_points, bucket
+    )
+    if validators.matches(request.headers):
+        return validators.not_modified()
+    if mode == "lttb":
+        points = _lttb_points(db, device_id, start, end, max_points)
+    else:
+        points = _bucket_points(
+            db, bucketed_statement(device_id, start, end, max_points, bucket)
         )
-        .scalars()
-        .all()
+    return StreamingResponse(
+        json_array(points),
+        media_type="application/json",
+        headers=validators.headers(),
     )
 
-    return [
-        {"ts": _to_iso(row.ts), "temp": row.temperature, "hum": row.humidity}
-        for row in reversed(rows)
-    ]
 
+def _bucket_points(db: Session, stmt: Select) -> Iterator[dict[str, Any]]:
+    for row in db.execute(stmt.execution_options(yield_per=500)):
+        yield bucket_point(row)
 
-@app.get("/status")
-def status(deviceId: Optional[str] = None, db: Session = Depends(get_db)):
-    device_id = _resolve_device(deviceId)
-    row = db.execute(
-        select(Telemetry.ts)
-        .where(Telemetry.device_id == device_id)
-        .order_by(desc(Telemetry.ts))
-        .limit(1)
-    ).scalar_one_or_none()
 
-    if row is None:
-        return {"id": device_id, "online": False, "updatedAt": None}
+def _lttb_points(
+    db: Session, device_id: str, start: int, end: int, max_points: int
+) -> Iterator[dict[str, Any]]:
+    total = db.execute(range_count_statement(device_id, start, end)).scalar_one()
+    rows = db.execute(
+        raw_statement(device_id, start, end).execution_options(yield_per=1000)
+    )
+    for row in lttb(rows, total, max_points):
+        yield metric_point(row)
+
 
-    ts_iso = _to_iso(row)
-    now = datetime.now(tz=timezone.utc)
-    is_online = now - datetime.fromtimestamp(row, tz=timezone.utc) <= ONLINE_DELTA
-    return {"id": device_id, "online": is_online, "updatedAt": ts_iso}
+@app.get("/export")
+def export(
+    deviceId: Optional[str] = None,
+    from_: Optional[int] = Query(None, alias="from"),
+    to: Optional[int] = None,
+    format: ExportFormat = "csv",
+    tsFormat: TimestampFormat = "iso",
+    db: Session = Depends(get_read_db),
+):
+    """Stream raw readings in ``[from, to]`` as CSV, NDJSON or Parquet.
+
+    Without ``deviceId`` every device is exported, ordered by device and
+    time. Rows are fetched in keyset-paginated pages, so memory use does not
+    grow with the range; ``tsFormat=epoch`` skips ISO formatting.
+    """
+
+    if format == "parquet" and not parquet_available():
+        raise HTTPException(status_code=400, detail="parquet export requires pyarrow")
+    pages = iter_pages(
+        db,
+        device_id=deviceId,
+        start=from_,
+        end=to,
+        page_size=settings.EXPORT_PAGE_SIZE,
+    )
+    writers = {"csv": csv_chunks, "ndjson": ndjson_chunks, "parquet": parquet_chunks}
+    filename = f"{deviceId or 'telemetry'}.{format}"
+    return StreamingResponse(
+        writers[format](pages, tsFormat),
+        media_type=MEDIA_TYPES[format],
+        headers={"Content-Disposition": f'attachment; filename="{filename}"'},
+    )
+
+
+@app.get("/analytics/summary")
+def analytics_summary(
+    window: int = Query(None, gt=0),
+    bucket: int = Query(60, gt=0),
+    tempMin: float = -20.0,
+    tempMax: float = 60.0,
+    humMin: float = 0.0,
+    humMax: float = 100.0,
+    db: Session = Depends(get_read_db),
+):
+    """Per-device statistics over the last ``window`` seconds for the fleet.
+
+    The window ends at the last ``bucket`` boundary, so requests within one
+    bucket are served from the cache. Readings outside the ``*Min``/``*Max``
+    bounds are counted as out of range. Windows longer than
+    ``ANALYTICS_MAX_WINDOW_SECONDS`` are rejected: the whole window is loaded
+    into memory.
+    """
+
+    window = window or settings.ANALYTICS_DEFAULT_WINDOW_SECONDS
+    if window > settings.ANALYTICS_MAX_WINDOW_SECONDS:
+        raise HTTPException(
+            status_code=400,
+            detail=f"window exceeds {settings.ANALYTICS_MAX_WINDOW_SECONDS}s",
+        )
+
+    # Imported on first use: numpy is the slowest import of the API.
+    from .analytics import Thresholds, fleet_summary
+
+    return fleet_summary(
+        db,
+        window,
+        bucket,
+        Thresholds(tempMin, tempMax, humMin, humMax),
+    )
+
+
+@app.get("/status")
+def status(deviceId: Optional[str] = None, db: Session = Depends(get_read_db)):
+    device_id = resolve_device(deviceId)
+    return status_payload(device_id, latest_cache.get(db, device_id))
 
 
 @app.get("/errors")
 def errors(
+    request: Request,
+    response: Response,
     deviceId: Optional[str] = None,
     limit: int = 20,
-    db: Session = Depends(get_db),
+    since: Optional[str] = None,
+    db: Session = Depends(get_read_db),
+):
+    """Most recently seen errors; ``since`` keeps those seen after it.
+
+    The ``ETag`` comes from the newest error row, so a 304 costs one
+    single-row lookup instead of the list.
+    """
+
+    cursor = parse_since(since)
+    top = db.execute(errors_version_statement(deviceId)).one_or_none()
+    validators = errors_validators(top, limit, cursor)
+    if not_modified := validators.apply(request.headers, response):
+        return not_modified
+    rows = db.execute(errors_statement(deviceId, limit, cursor)).scalars().all()
+    return [error_payload(row) for row in rows]
+
+
+@app.get("/presence")
+def presence(
+    deviceId: Optional[str] = None,
+    limit: int = 50,
+    db: Session = Depends(get_read_db),
 ):
-    limit = max(1, min(limit, 200))
-    stmt = select(IngestError).order_by(desc(IngestError.ts)).limit(limit)
-    if deviceId:
-        stmt = stmt.where(IngestError.device_id == deviceId)
-
-    rows = db.execute(stmt).scalars().all()
-    return [
-        {
-            "id": str(row.id),
-            "deviceId": row.device_id,
-            "ts": _to_iso(row.ts),
-            "msg": row.reason,
-        }
-        for row in rows
-    ]
+    """Recent online/offline transitions, newest first."""
+
+    rows = db.execute(events_statement(deviceId, limit)).scalars().all()
+    return [event_payload(row) for row in rows]
 
 
 @app.get("/metrics/prometheus")
-def metrics_prometheus(db: Session = Depends(get_db)):
-    total = db.execute(select(func.count()).select_from(Telemetry)).scalar_one()
-    return f"ingest_ok_total {total}\n"
+def metrics_prometheus():
+    """Prometheus text exposition of the in-process ingest and request metrics."""
+
+    return PlainTextResponse(metrics_registry.render(), media_type=CONTENT_TYPE)
+
+
+def _snapshot_event(device_id: str) -> StreamEvent | None:
+    hit, row = latest_cache.peek(device_id)
+    if not hit or row is None:
+        return None
+    payload = {
+        "deviceId": device_id,
+        "ts": to_iso(row.ts),
+        "temp": row.temperature,
+        "hum": row.humidity,
+    }
+    return StreamEvent("reading", json.dumps(payload, separators=(",", ":")))
+
+
+async def _sse_events(request: Request, sub: Subscription):
+    try:
+        snapshot = _snapshot_event(sub.device_id)
+        if snapshot is not None:
+            yield snapshot.sse
+        while not await request.is_disconnected():
+            try:
+                event = await asyncio.wait_for(
+                    sub.get(), timeout=settings.STREAM_KEEPALIVE_SECONDS
+                )
+            except asyncio.TimeoutError:
+                yield ": keepalive\n\n"
+                continue
+            yield event.sse
+    finally:
+        stream_hub.unsubscribe(sub)
+
+
+@app.get("/stream")
+async def stream(request: Request, deviceId: Optional[str] = None):
+    """Server-Sent Events feed of ``reading`` and ``error`` events.
+
+    ``deviceId=*`` subscribes to every device.
+    """
+
+    sub = stream_hub.subscribe(resolve_device(deviceId))
+    return StreamingResponse(
+        _sse_events(request, sub),
+        media_type="text/event-stream",
+        headers={"Cache-Control": "no-cache", "X-Accel-Buffering": "no"},
+    )
+
+
+async def _wait_for_disconnect(websocket: WebSocket) -> None:
+    try:
+        while True:
+            await websocket.receive_text()
+    except WebSocketDisconnect:
+        return
+
+
+def _ws_frame(event: StreamEvent) -> str:
+    return f'{{"event":"{event.kind}","data":{event.data}}}'
+
+
+@app.websocket("/stream/ws")
+async def stream_ws(websocket: WebSocket, deviceId: Optional[str] = None):
+    """WebSocket variant of ``/stream`` sending ``{"event", "data"}`` frames."""
+
+    await websocket.accept()
+    sub = stream_hub.subscribe(resolve_device(deviceId))
+    disconnected = asyncio.ensure_future(_wait_for_disconnect(websocket))
+    try:
+        snapshot = _snapshot_event(sub.device_id)
+        if snapshot is not None:
+            await websocket.send_text(_ws_frame(snapshot))
+        while True:
+            getter = asyncio.ensure_future(sub.get())
+            done, _ = await asyncio.wait(
+                {getter, disconnected}, return_when=asyncio.FIRST_COMPLETED
+            )
+            if disconnected in done:
+                getter.cancel()
+                break
+            await websocket.send_text(_ws_frame(getter.result()))
+    finally:
+        disconnected.cancel()
+        stream_hub.unsubscribe(sub)
@@ -1,7 +1,19 @@
 from datetime import datetime, timezone
 
-from sqlalchemy import BigInteger, Column, Float, ForeignKey, Index, Integer, String
+from sqlalchemy import (
+    BigInteger,
+    Boolean,
+    Column,
+    Float,
+    ForeignKey,
+    Index,
+    Integer,
+    String,
+)
+from sqlalchemy.orm import declared_attr
+
 from .db import Base
+from .settings import settings
 
 
 class Device(Base):
@@ -21,11 +33,49 @@ class Telemetry(Base):
     temperature = Column(Float, nullable=False)
     humidity = Column(Float, nullable=False)
 
+    # The unique key only exists with INGEST_DEDUP enabled (see app.dedup).
     __table_args__ = (
-        Index("ix_telemetry_device_ts", "device_id", "ts", postgresql_using="btree"),
+        (
+            Index("uq_telemetry_device_ts", "device_id", "ts", unique=True)
+            if settings.INGEST_DEDUP != "off"
+            else Index("ix_telemetry_device_ts", "device_id", "ts")
+        ),
     )
 
 
+class _TelemetryRollup:
+    """Per-device count/sum/min/max of readings in fixed ``bucket`` windows."""
+
+    resolution: int
+
+    @declared_attr
+    def device_id(cls):
+        return Column(
+            String(100),
+            ForeignKey("devices.device_id", ondelete="CASCADE"),
+            primary_key=True,
+        )
+
+    bucket = Column(BigInteger, primary_key=True)
+    count = Column(BigInteger, nullable=False)
+    temp_sum = Column(Float, nullable=False)
+    temp_min = Column(Float, nullable=False)
+    temp_max = Column(Float, nullable=False)
+    hum_sum = Column(Float, nullable=False)
+    hum_min = Column(Float, nullable=False)
+    hum_max = Column(Float, nullable=False)
+
+
+class Telemetry1m(_TelemetryRollup, Base):
+    __tablename__ = "telemetry_1m"
+    resolution = 60
+
+
+class Telemetry1h(_TelemetryRollup, Base):
+    __tablename__ = "telemetry_1h"
+    resolution = 3600
+
+
 class IngestError(Base):
     __tablename__ = "errors"
     id = Column(Integer, primary_key=True, autoincrement=True)
@@ -36,3 +86,25 @@ class IngestError(Base):
         default=lambda: int(datetime.now(tz=timezone.utc).timestamp()),
     )
     reason = Column(String(500), nullable=False)
+    # ``ts`` is when the error was first seen; repeats within the coalescing
+    # window bump ``count`` and ``last_ts`` (see ``app.errorsink``).
+    last_ts = Column(
+        BigInteger,
+        nullable=False,
+        default=lambda: int(datetime.now(tz=timezone.utc).timestamp()),
+    )
+    count = Column(Integer, nullable=False, default=1, server_default="1")
+
+
+class PresenceEvent(Base):
+    """An online/offline transition emitted by the presence watchdog."""
+
+    __tablename__ = "presence_events"
+    id = Column(Integer, primary_key=True, autoincrement=True)
+    device_id = Column(
+        String(100), ForeignKey("devices.device_id", ondelete="CASCADE"), nullable=False
+    )
+    ts = Column(BigInteger, nullable=False)
+    online = Column(Boolean, nullable=False)
+
+    __table_args__ = (Index("ix_presence_events_device_id", "device_id", "id"),)
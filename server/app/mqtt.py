@@ -2,75 +2,134 @@
 
 from __future__ import annotations
 
-import json
+import itertools
 import logging
 import threading
-from datetime import datetime, timezone
-from typing import Any
+import time
+from typing import Any, Callable, Literal, Sequence
 
 import paho.mqtt.client as mqtt
-from sqlalchemy.exc import SQLAlchemyError
+from sqlalchemy.orm import Session
 
 from .db import SessionLocal
-from .services import persist_telemetry, record_ingest_error
+from .decoder import BINARY_CONTENT_TYPE, PayloadError, decode_binary, decode_json
+from .prometheus import ingest_parse_seconds, metrics_registry
+from .services import record_ingest_error
 from .settings import settings
+from .spool import Spool
+from .writer import Backpressure, TelemetryWriter
 
 logger = logging.getLogger(__name__)
 
+Protocol = Literal["3.1.1", "5"]
 
-def _parse_timestamp(value: Any) -> int:
-    """Convert multiple timestamp formats into epoch seconds."""
+_SHARE_PREFIX = "$share/"
 
-    if value is None:
-        return int(datetime.now(tz=timezone.utc).timestamp())
 
-    if isinstance(value, (int, float)):
-        # Accept milliseconds inputs as well
-        if value > 1_000_000_000_000:
-            return int(value / 1000)
-        return int(value)
+def shared_filter(topic_filter: str, group: str | None) -> str:
+    """Wrap a filter in an MQTT v5 shared subscription for ``group``."""
 
-    if isinstance(value, str):
-        value = value.strip()
-        if not value:
-            return int(datetime.now(tz=timezone.utc).timestamp())
-        # Numeric string
-        if value.isdigit():
-            return int(value)
-        try:
-            dt = datetime.fromisoformat(value.replace("Z", "+00:00"))
-        except ValueError as exc:  # pragma: no cover - fallback branch
-            raise ValueError(f"invalid timestamp format: {value}") from exc
-        return int(dt.timestamp())
+    if not group or topic_filter.startswith(_SHARE_PREFIX):
+        return topic_filter
+    return f"{_SHARE_PREFIX}{group}/{topic_filter}"
+
+
+def plain_filter(topic_filter: str) -> str:
+    """Strip a ``$share/<group>/`` prefix so the filter can match topics."""
+
+    if topic_filter.startswith(_SHARE_PREFIX):
+        return topic_filter.split("/", 2)[2]
+    return topic_filter
 
-    raise ValueError(f"unsupported timestamp type: {type(value)!r}")
+
+def device_from_topic(topic_filter: str, topic: str) -> str | None:
+    """Return the topic level matched by the filter's first ``+`` wildcard."""
+
+    levels = plain_filter(topic_filter).split("/")
+    if "+" not in levels or not mqtt.topic_matches_sub(
+        plain_filter(topic_filter), topic
+    ):
+        return None
+    return topic.split("/")[levels.index("+")] or None
 
 
 class MQTTIngestService:
-    """Subscribe to MQTT messages and persist telemetry readings."""
+    """Subscribe to MQTT messages and persist telemetry readings.
+
+    The paho network thread only parses payloads and hands readings to a
+    :class:`TelemetryWriter`, whose threads perform the database writes.
+
+    ``topic`` may be one filter or several. For filters with a ``+`` level,
+    e.g. ``devices/+/telemetry``, that level is the deviceId of payloads that
+    do not carry one. With ``shared_group`` every filter is subscribed as
+    ``$share/<group>/<filter>``. The broker then hands each message to exactly
+    one member of the group, so several processes (see ``app.consumer``) or
+    uvicorn workers can ingest in parallel without duplicate inserts.
+
+    ``spool_dir`` enables the on-disk :class:`~app.spool.Spool` that keeps
+    readings while the database is unavailable; each process needs its own.
+    """
 
     def __init__(
         self,
         *,
         broker: str,
         port: int,
-        topic: str,
+        topic: str | Sequence[str],
         default_device_id: str,
+        binary_topic: str | None = None,
+        shared_group: str | None = None,
+        protocol: Protocol = "3.1.1",
+        enabled: bool = True,
         username: str | None = None,
         password: str | None = None,
+        session_factory: Callable[[], Session] = SessionLocal,
+        queue_size: int = 10000,
+        flush_size: int = 500,
+        flush_interval: float = 0.2,
+        writer_threads: int = 1,
+        backpressure: Backpressure = "block",
+        spool_dir: str | None = None,
     ) -> None:
         self._broker = broker
         self._port = port
-        self._topic = topic
+        topics = [topic] if isinstance(topic, str) else list(topic)
+        self._filters = [plain_filter(t) for t in topics if t]
+        self._binary_topic = plain_filter(binary_topic) if binary_topic else None
+        self._shared_group = shared_group or None
+        self._device_filters = [
+            f for f in self._filters + [self._binary_topic or ""] if "+" in f.split("/")
+        ]
+        # Shared subscriptions are an MQTT v5 feature.
+        self._protocol = "5" if self._shared_group else protocol
+        self._enabled = enabled
         self._default_device_id = default_device_id
         self._username = username
         self._password = password
+        self._session_factory = session_factory
+        self.writer = TelemetryWriter(
+            session_factory=session_factory,
+            queue_size=queue_size,
+            flush_size=flush_size,
+            flush_interval=flush_interval,
+            threads=writer_threads,
+            backpressure=backpressure,
+            spool=_build_spool(spool_dir, session_factory) if spool_dir else None,
+        )
+        self._payload_log_every = max(0, settings.MQTT_PAYLOAD_LOG_EVERY)
+        self._message_seq = itertools.count(1)
         self._client: mqtt.Client | None = None
         self._lock = threading.Lock()
         self._running = False
+        self.connected = False
+
+    @property
+    def subscriptions(self) -> list[str]:
+        filters = self._filters + ([self._binary_topic] if self._binary_topic else [])
+        return [shared_filter(f, self._shared_group) for f in filters]
 
     def start(self) -> None:
-        if not settings.MQTT_ENABLED:
+        if not self._enabled:
             logger.info("MQTT ingestion disabled via settings")
             return
 
@@ -82,7 +141,10 @@ class MQTTIngestService:
             if self._running:
                 return
 
-            client = mqtt.Client()
+            client = mqtt.Client(
+                mqtt.CallbackAPIVersion.VERSION2,
+                protocol=mqtt.MQTTv5 if self._protocol == "5" else mqtt.MQTTv311,
+            )
             client.enable_logger(logger)
             client.on_connect = self._on_connect
             client.on_message = self._on_message
@@ -97,19 +159,21 @@ class MQTTIngestService:
             except OSError as exc:
                 logger.error("MQTT connect failed: %s", exc)
             else:
+                self.writer.start()
                 client.loop_start()
                 self._client = client
                 self._running = True
                 logger.info(
-                    "MQTT ingest connecting to %s:%s topic=%s",
+                    "MQTT ingest connecting to %s:%s topics=%s",
                     self._broker,
                     self._port,
-                    self._topic,
+                    ", ".join(self.subscriptions),
                 )
 
     def stop(self) -> None:
         with self._lock:
             self._running = False
+            self.connected = False
             if self._client is None:
                 return
             try:
@@ -117,78 +181,136 @@ class MQTTIngestService:
                 self._client.loop_stop()
             finally:
                 self._client = None
+                self.writer.stop()
+
+    def stats(self) -> dict[str, Any]:
+        """Return writer queue and flush statistics."""
+
+        return self.writer.stats()
 
     # MQTT callbacks -----------------------------------------------------
     def _on_connect(self, client: mqtt.Client, _userdata, _flags, reason_code, *_args):
-        if reason_code != 0:
+        if reason_code.is_failure:
             logger.error("MQTT connection refused rc=%s", reason_code)
             return
-        logger.info("MQTT connected, subscribing to %s", self._topic)
-        client.subscribe(self._topic)
+        topics = self.subscriptions
+        logger.info("MQTT connected, subscribing to %s", ", ".join(topics))
+        client.subscribe([(topic, 0) for topic in topics])
+        self.connected = True
 
-    def _on_disconnect(self, _client: mqtt.Client, _userdata, rc):
-        if rc != 0:
-            logger.warning("MQTT unexpected disconnect rc=%s", rc)
+    def _on_disconnect(
+        self, _client: mqtt.Client, _userdata, _flags, reason_code, *_args
+    ):
+        self.connected = False
+        if reason_code.is_failure:
+            logger.warning("MQTT unexpected disconnect rc=%s", reason_code)
         else:
             logger.info("MQTT disconnected")
 
     def _on_message(self, _client: mqtt.Client, _userdata, message: mqtt.MQTTMessage):
+        received_at = time.perf_counter()
         raw = message.payload
+        if logger.isEnabledFor(logging.DEBUG):
+            logger.debug("[MQTT] topic=%s payload=%r", message.topic, raw)
+        elif (
+            self._payload_log_every
+            and next(self._message_seq) % self._payload_log_every == 0
+        ):
+            logger.info("[MQTT] sampled topic=%s payload=%r", message.topic, raw)
+
         try:
-            payload = raw.decode("utf-8", errors="strict")
-        except UnicodeDecodeError as e:
-            logger.error("[MQTT] UTF-8 decode error: %s; HEX=%s", e, raw.hex())
-            self._persist_error("non-utf8 payload", None)
+            if self._is_binary(message):
+                readings = decode_binary(raw)
+            else:
+                readings = [decode_json(raw, self._topic_device(message.topic))]
+        except PayloadError as exc:
+            logger.error("[MQTT] %s; HEX=%s", exc.reason, raw[:256].hex())
+            self._persist_error(exc.reason, exc.device_id)
             return
 
-        logger.warning("[MQTT] topic=%s payload=%s", message.topic, payload)
+        ingest_parse_seconds.observe(time.perf_counter() - received_at, "mqtt")
+        for reading in readings:
+            self.writer.submit(reading.as_row(), received_at)
 
-        try:
-            data = json.loads(payload)
-        except json.JSONDecodeError as e:
-            logger.error("[MQTT] JSON decode error: %s; HEX=%s", e, raw.hex())
-            self._persist_error("invalid JSON payload", None)
-            return
-        device_id = data.get("deviceId") or data.get("device_id")
-        if not isinstance(device_id, str) or not device_id:
-            self._persist_error("missing or invalid deviceId", None)
-            return
+    def _topic_device(self, topic: str) -> str | None:
+        for topic_filter in self._device_filters:
+            device_id = device_from_topic(topic_filter, topic)
+            if device_id is not None:
+                return device_id
+        return None
 
-        try:
-            ts = _parse_timestamp(data.get("ts"))
-            temperature = float(data.get("temperature"))
-            humidity = float(data.get("humidity"))
-        except (TypeError, ValueError) as exc:
-            self._persist_error(str(exc), device_id)
-            return
+    def _is_binary(self, message: mqtt.MQTTMessage) -> bool:
+        """Binary payloads arrive on ``binary_topic`` or carry the v5 content type."""
 
-        with SessionLocal() as db:
-            try:
-                persist_telemetry(
-                    db,
-                    device_id=device_id,
-                    ts=ts,
-                    temperature=temperature,
-                    humidity=humidity,
-                )
-            except SQLAlchemyError as exc:  # pragma: no cover - defensive logging
-                db.rollback()
-                logger.exception("Failed to persist telemetry: %s", exc)
-                record_ingest_error(
-                    db, reason="database error during MQTT ingest", device_id=device_id
-                )
+        if self._binary_topic is not None and mqtt.topic_matches_sub(
+            self._binary_topic, message.topic
+        ):
+            return True
+        props = getattr(message, "properties", None)
+        return getattr(props, "ContentType", None) == BINARY_CONTENT_TYPE
 
     def _persist_error(self, reason: str, device_id: str | None) -> None:
-        with SessionLocal() as db:
-            record_ingest_error(db, reason=reason, device_id=device_id)
+        record_ingest_error(reason=reason, device_id=device_id, source="mqtt")
         logger.warning("MQTT ingest error for %s: %s", device_id or "<unknown>", reason)
 
 
-mqtt_service = MQTTIngestService(
-    broker=settings.MQTT_BROKER,
-    port=settings.MQTT_PORT,
-    topic=settings.MQTT_TOPIC,
-    default_device_id=settings.DEFAULT_DEVICE_ID,
-    username=settings.MQTT_USERNAME,
-    password=settings.MQTT_PASSWORD,
-)
+def _build_spool(directory: str, session_factory: Callable[[], Session]) -> Spool:
+    mb = 1024 * 1024
+    return Spool(
+        directory,
+        session_factory=session_factory,
+        segment_bytes=settings.MQTT_SPOOL_SEGMENT_MB * mb,
+        max_bytes=settings.MQTT_SPOOL_MAX_MB * mb,
+        fsync_interval=settings.MQTT_SPOOL_FSYNC_MS / 1000,
+        replay_rate=settings.MQTT_SPOOL_REPLAY_RATE,
+        retry_interval=settings.MQTT_SPOOL_RETRY_SECONDS,
+    )
+
+
+def build_service(**overrides: Any) -> MQTTIngestService:
+    """Build an ingest service from settings; ``overrides`` win."""
+
+    options: dict[str, Any] = {
+        "broker": settings.MQTT_BROKER,
+        "port": settings.MQTT_PORT,
+        "topic": settings.mqtt_topics,
+        "default_device_id": settings.DEFAULT_DEVICE_ID,
+        "binary_topic": settings.MQTT_BINARY_TOPIC,
+        "shared_group": settings.MQTT_SHARED_GROUP,
+        "protocol": settings.MQTT_PROTOCOL,
+        "enabled": settings.MQTT_ENABLED,
+        "username": settings.MQTT_USERNAME,
+        "password": settings.MQTT_PASSWORD,
+        "queue_size": settings.MQTT_QUEUE_SIZE,
+        "flush_size": settings.MQTT_FLUSH_SIZE,
+        "flush_interval": settings.MQTT_FLUSH_INTERVAL_MS / 1000,
+        "writer_threads": settings.MQTT_WRITER_THREADS,
+        "backpressure": settings.MQTT_BACKPRESSURE,
+        "spool_dir": settings.MQTT_SPOOL_DIR,
+    }
+    return MQTTIngestService(**(options | overrides))
+
+
+mqtt_service = build_service()
+
+for _stat, _kind, _help in (
+    ("queue_depth", "gauge", "Readings waiting for the MQTT writer."),
+    ("queue_capacity", "gauge", "Size of the MQTT writer queue."),
+    ("dropped_total", "counter", "Readings dropped because the queue was full."),
+    ("flush_errors_total", "counter", "MQTT writer flushes that failed."),
+    ("last_flush_size", "gauge", "Rows in the most recent MQTT writer flush."),
+    ("last_flush_seconds", "gauge", "Duration of the most recent flush."),
+    ("max_flush_seconds", "gauge", "Slowest MQTT writer flush so far."),
+    ("spool_bytes", "gauge", "Bytes of readings waiting in the on-disk spool."),
+    ("spool_segments", "gauge", "Spool segment files on disk."),
+    ("spool_oldest_age_seconds", "gauge", "Age of the oldest spool segment."),
+    ("spool_appended_total", "counter", "Readings written to the spool."),
+    ("spool_replayed_total", "counter", "Spooled readings replayed to the DB."),
+    ("spool_dropped_total", "counter", "Readings dropped because the spool was full."),
+):
+    metrics_registry.gauge_callback(
+        f"mqtt_ingest_{_stat}",
+        _help,
+        lambda stat=_stat: mqtt_service.stats().get(stat, 0),
+        kind=_kind,
+    )
@@ -0,0 +1,242 @@
+"""Online/offline tracking with pushed transition events.
+
+The ingest path reports the newest reading per device with :meth:`seen`,
+which is a dict update; expiry is driven by a min-heap of deadlines holding at
+most one entry per online device. When an entry comes due and the device has
+been seen since, it is pushed back with the new deadline instead of being
+updated on every reading, so the watchdog's work is proportional to
+transitions and expiries, never to the number of devices or readings.
+
+Transitions are appended to ``presence_events`` and published to stream
+subscribers as ``presence`` events from the watchdog thread, off the ingest
+path. The watchdog only knows about readings written by its own process; run
+it in the process that handles all ingest.
+"""
+
+from __future__ import annotations
+
+import heapq
+import logging
+import threading
+import time
+from typing import Any, Callable, Iterable, Mapping
+
+from sqlalchemy import Select, func, insert, select
+from sqlalchemy.exc import SQLAlchemyError
+from sqlalchemy.orm import Session
+
+from .db import SessionLocal, is_transient
+from .hub import stream_hub
+from .models import PresenceEvent
+from .prometheus import metrics_registry
+from .settings import settings
+from .timeutil import to_iso
+
+logger = logging.getLogger(__name__)
+
+
+class PresenceWatchdog:
+    """Track last-seen times and emit ``online``/``offline`` transitions.
+
+    A device is online while its newest reading is at most ``grace`` seconds
+    old, the same rule ``/status`` applies at query time.
+    """
+
+    def __init__(
+        self,
+        grace: int,
+        session_factory: Callable[[], Session] = SessionLocal,
+        enabled: bool = True,
+        max_wait: float = 1.0,
+    ) -> None:
+        self._grace = grace
+        self._session_factory = session_factory
+        self.enabled = enabled
+        self._max_wait = max_wait
+        self._last_seen: dict[str, int] = {}
+        self._online: set[str] = set()
+        self._deadlines: list[tuple[int, str]] = []
+        self._pending: list[dict[str, Any]] = []
+        self._lock = threading.Lock()
+        self._wake = threading.Event()
+        self._stop = threading.Event()
+        self._thread: threading.Thread | None = None
+
+    def warm(self, db: Session) -> int:
+        """Resume from each device's last stored transition.
+
+        Devices last recorded online get a deadline one grace period from now,
+        so a device that went quiet while the server was down is reported
+        offline shortly after startup.
+        """
+
+        now = int(time.time())
+        with self._lock:
+            for device_id, online in db.execute(_last_state_statement()):
+                if online and device_id not in self._online:
+                    # No reading seen yet: offline at the deadline unless one
+                    # arrives before it.
+                    self._last_seen.setdefault(device_id, 0)
+                    self._online.add(device_id)
+                    heapq.heappush(self._deadlines, (now + self._grace, device_id))
+            return len(self._online)
+
+    def seen(self, rows: Iterable[Mapping[str, Any]], now: float | None = None) -> None:
+        """Record committed readings; called from the ingest path."""
+
+        if not self.enabled:
+            return
+        now = int(time.time() if now is None else now)
+        newest: dict[str, int] = {}
+        for row in rows:
+            if row["ts"] > newest.get(row["device_id"], -1):
+                newest[row["device_id"]] = row["ts"]
+
+        came_online = False
+        with self._lock:
+            for device_id, ts in newest.items():
+                if ts <= self._last_seen.get(device_id, -1):
+                    continue
+                self._last_seen[device_id] = ts
+                deadline = ts + self._grace
+                if device_id in self._online or deadline < now:
+                    continue
+                self._online.add(device_id)
+                heapq.heappush(self._deadlines, (deadline, device_id))
+                self._pending.append(_event(device_id, True, now))
+                came_online = True
+        if came_online:
+            self._wake.set()
+
+    def is_online(self, device_id: str) -> bool:
+        with self._lock:
+            return device_id in self._online
+
+    def online_count(self) -> int:
+        with self._lock:
+            return len(self._online)
+
+    def expire(self, now: float | None = None) -> list[dict[str, Any]]:
+        """Move devices past their deadline offline; return pending events."""
+
+        now = int(time.time() if now is None else now)
+        with self._lock:
+            while self._deadlines and self._deadlines[0][0] < now:
+                _, device_id = heapq.heappop(self._deadlines)
+                deadline = self._last_seen[device_id] + self._grace
+                if deadline >= now:
+                    heapq.heappush(self._deadlines, (deadline, device_id))
+                    continue
+                self._online.discard(device_id)
+                self._pending.append(_event(device_id, False, now))
+            events, self._pending = self._pending, []
+        return events
+
+    def flush(self, now: float | None = None) -> int:
+        """Store and publish due transitions; returns how many were emitted."""
+
+        events = self.expire(now)
+        if not events:
+            return 0
+        try:
+            with self._session_factory() as db:
+                db.execute(insert(PresenceEvent), events)
+                db.commit()
+        except SQLAlchemyError as exc:
+            logger.exception("Failed to store %d presence event(s)", len(events))
+            # Retrying cannot fix rows the database refuses (e.g. a deleted
+            # device); only keep the events when it was unreachable.
+            if is_transient(exc):
+                self._restore(events)
+            return 0
+        for event in events:
+            stream_hub.publish(
+                event["device_id"],
+                "presence",
+                {
+                    "deviceId": event["device_id"],
+                    "online": event["online"],
+                    "ts": to_iso(event["ts"]),
+                },
+            )
+        return len(events)
+
+    def _restore(self, events: list[dict[str, Any]]) -> None:
+        """Queue unsaved transitions again, ahead of any emitted since."""
+
+        with self._lock:
+            self._pending[:0] = events
+
+    def start(self) -> None:
+        if not self.enabled or self._thread is not None:
+            return
+        with self._session_factory() as db:
+            self.warm(db)
+        self._stop.clear()
+        self._thread = threading.Thread(
+            target=self._run, name="presence-watchdog", daemon=True
+        )
+        self._thread.start()
+
+    def stop(self) -> None:
+        self._stop.set()
+        self._wake.set()
+        if self._thread is not None:
+            self._thread.join(timeout=5)
+            self._thread = None
+        self.flush()
+
+    def _next_wait(self) -> float:
+        with self._lock:
+            if not self._deadlines:
+                return self._max_wait
+            due = self._deadlines[0][0] + 1 - time.time()
+        return min(self._max_wait, max(0.0, due))
+
+    def _run(self) -> None:
+        while not self._stop.is_set():
+            self._wake.wait(self._next_wait())
+            self._wake.clear()
+            try:
+                self.flush()
+            except Exception:  # pragma: no cover - keep the loop alive
+                logger.exception("Presence flush failed")
+
+
+def _event(device_id: str, online: bool, ts: int) -> dict[str, Any]:
+    return {"device_id": device_id, "online": online, "ts": ts}
+
+
+def _last_state_statement() -> Select:
+    last_id = select(func.max(PresenceEvent.id)).group_by(PresenceEvent.device_id)
+    return select(PresenceEvent.device_id, PresenceEvent.online).where(
+        PresenceEvent.id.in_(last_id)
+    )
+
+
+def events_statement(device_id: str | None, limit: int) -> Select:
+    limit = max(1, min(limit, 200))
+    stmt = select(PresenceEvent).order_by(PresenceEvent.id.desc()).limit(limit)
+    if device_id is not None:
+        stmt = stmt.where(PresenceEvent.device_id == device_id)
+    return stmt
+
+
+def event_payload(row: PresenceEvent) -> dict[str, Any]:
+    return {
+        "id": str(row.id),
+        "deviceId": row.device_id,
+        "online": row.online,
+        "ts": to_iso(row.ts),
+    }
+
+
+presence_watchdog = PresenceWatchdog(
+    settings.ONLINE_GRACE_SECONDS, enabled=settings.PRESENCE_ENABLED
+)
+
+metrics_registry.gauge_callback(
+    "presence_online_devices",
+    "Devices the presence watchdog currently considers online.",
+    presence_watchdog.online_count,
+)
@@ -0,0 +1,324 @@
+"""In-process Prometheus metrics rendered in the text exposition format.
+
+Counters and histograms are updated on the ingest and request paths, so a
+scrape of ``/metrics/prometheus`` only formats what is already in memory and
+never touches the database.
+"""
+
+from __future__ import annotations
+
+import math
+import threading
+import time
+from contextlib import contextmanager
+from typing import Any, Callable, Iterator, Sequence, TypeVar
+
+from .settings import settings
+
+DEFAULT_BUCKETS = (
+    0.0005,
+    0.001,
+    0.0025,
+    0.005,
+    0.01,
+    0.025,
+    0.05,
+    0.1,
+    0.25,
+    0.5,
+    1.0,
+    2.5,
+    5.0,
+    10.0,
+)
+
+OTHER_DEVICES = "_other"
+
+CONTENT_TYPE = "text/plain; version=0.0.4; charset=utf-8"
+
+
+def _escape(value: str) -> str:
+    return value.replace("\\", "\\\\").replace("\n", "\\n").replace('"', '\\"')
+
+
+def _format_value(value: float) -> str:
+    if math.isinf(value):
+        return "+Inf" if value > 0 else "-Inf"
+    if float(value).is_integer():
+        return str(int(value))
+    return repr(float(value))
+
+
+def _labels(names: Sequence[str], values: Sequence[str]) -> str:
+    if not names:
+        return ""
+    pairs = ",".join(f'{n}="{_escape(v)}"' for n, v in zip(names, values))
+    return "{" + pairs + "}"
+
+
+class _Metric:
+    kind = "untyped"
+
+    def __init__(self, name: str, help: str, labelnames: Sequence[str] = ()) -> None:
+        self.name = name
+        self.help = help
+        self.labelnames = tuple(labelnames)
+        self._lock = threading.Lock()
+
+    def _key(self, values: Sequence[str]) -> tuple[str, ...]:
+        if len(values) != len(self.labelnames):
+            raise ValueError(
+                f"{self.name} expects labels {self.labelnames}, got {tuple(values)}"
+            )
+        return tuple(str(v) for v in values)
+
+    def header(self) -> list[str]:
+        return [f"# HELP {self.name} {self.help}", f"# TYPE {self.name} {self.kind}"]
+
+    def samples(self) -> list[str]:  # pragma: no cover - abstract
+        raise NotImplementedError
+
+
+class Counter(_Metric):
+    """Monotonic counter, optionally split by label values."""
+
+    kind = "counter"
+
+    def __init__(self, name: str, help: str, labelnames: Sequence[str] = ()) -> None:
+        super().__init__(name, help, labelnames)
+        self._values: dict[tuple[str, ...], float] = {}
+
+    def inc(self, amount: float = 1.0, *labels: str) -> None:
+        key = self._key(labels)
+        with self._lock:
+            self._values[key] = self._values.get(key, 0.0) + amount
+
+    def value(self, *labels: str) -> float:
+        with self._lock:
+            return self._values.get(self._key(labels), 0.0)
+
+    def samples(self) -> list[str]:
+        with self._lock:
+            items = sorted(self._values.items())
+        return [
+            f"{self.name}{_labels(self.labelnames, key)} {_format_value(value)}"
+            for key, value in items
+        ]
+
+
+class Histogram(_Metric):
+    """Cumulative-bucket histogram of observed durations in seconds."""
+
+    kind = "histogram"
+
+    def __init__(
+        self,
+        name: str,
+        help: str,
+        labelnames: Sequence[str] = (),
+        buckets: Sequence[float] = DEFAULT_BUCKETS,
+    ) -> None:
+        super().__init__(name, help, labelnames)
+        self._bounds = tuple(sorted(buckets))
+        # Per label set: [count per bucket..., +Inf count], sum.
+        self._series: dict[tuple[str, ...], tuple[list[int], list[float]]] = {}
+
+    def observe(self, value: float, *labels: str) -> None:
+        key = self._key(labels)
+        with self._lock:
+            series = self._series.get(key)
+            if series is None:
+                series = self._series[key] = ([0] * (len(self._bounds) + 1), [0.0])
+            counts, total = series
+            for idx, bound in enumerate(self._bounds):
+                if value <= bound:
+                    counts[idx] += 1
+                    break
+            else:
+                counts[-1] += 1
+            total[0] += value
+
+    @contextmanager
+    def time(self, *labels: str) -> Iterator[None]:
+        started = time.perf_counter()
+        try:
+            yield
+        finally:
+            self.observe(time.perf_counter() - started, *labels)
+
+    def count(self, *labels: str) -> int:
+        with self._lock:
+            series = self._series.get(self._key(labels))
+            return sum(series[0]) if series else 0
+
+    def samples(self) -> list[str]:
+        with self._lock:
+            items = sorted(
+                (key, (list(counts), total[0]))
+                for key, (counts, total) in self._series.items()
+            )
+        lines = []
+        names = self.labelnames + ("le",)
+        for key, (counts, total) in items:
+            cumulative = 0
+            for bound, count in zip(self._bounds + (math.inf,), counts):
+                cumulative += count
+                labels = _labels(names, key + (_format_value(bound),))
+                lines.append(f"{self.name}_bucket{labels} {cumulative}")
+            labels = _labels(self.labelnames, key)
+            lines.append(f"{self.name}_sum{labels} {_format_value(total)}")
+            lines.append(f"{self.name}_count{labels} {cumulative}")
+        return lines
+
+
+class CallbackGauge(_Metric):
+    """Gauge (or counter) whose value is read from ``fn`` at scrape time."""
+
+    def __init__(
+        self, name: str, help: str, fn: Callable[[], float], kind: str = "gauge"
+    ) -> None:
+        super().__init__(name, help)
+        self.kind = kind
+        self._fn = fn
+
+    def samples(self) -> list[str]:
+        return [f"{self.name} {_format_value(self._fn())}"]
+
+
+_M = TypeVar("_M", bound=_Metric)
+
+
+class MetricsRegistry:
+    """Named metrics plus the bounded set of device ids used as label values."""
+
+    def __init__(self, max_devices: int = 1000) -> None:
+        self._metrics: dict[str, _Metric] = {}
+        self._devices: set[str] = set()
+        self._max_devices = max(0, max_devices)
+        self._lock = threading.Lock()
+
+    def register(self, metric: _M) -> _M:
+        with self._lock:
+            # Re-registering by name replaces the previous metric, which keeps
+            # callback gauges pointed at the most recently built service.
+            self._metrics[metric.name] = metric
+        return metric
+
+    def counter(self, name: str, help: str, labelnames: Sequence[str] = ()) -> Counter:
+        return self.register(Counter(name, help, labelnames))
+
+    def histogram(
+        self,
+        name: str,
+        help: str,
+        labelnames: Sequence[str] = (),
+        buckets: Sequence[float] = DEFAULT_BUCKETS,
+    ) -> Histogram:
+        return self.register(Histogram(name, help, labelnames, buckets))
+
+    def gauge_callback(
+        self, name: str, help: str, fn: Callable[[], float], kind: str = "gauge"
+    ) -> None:
+        self.register(CallbackGauge(name, help, fn, kind))
+
+    def device_label(self, device_id: str | None) -> str:
+        """Bound per-device series: devices beyond ``max_devices`` share one."""
+
+        if device_id is None:
+            return ""
+        with self._lock:
+            if device_id in self._devices:
+                return device_id
+            if len(self._devices) < self._max_devices:
+                self._devices.add(device_id)
+                return device_id
+        return OTHER_DEVICES
+
+    def render(self) -> str:
+        with self._lock:
+            metrics = list(self._metrics.values())
+        lines: list[str] = []
+        for metric in metrics:
+            lines.extend(metric.header())
+            lines.extend(metric.samples())
+        return "\n".join(lines) + "\n"
+
+
+metrics_registry = MetricsRegistry(settings.PROMETHEUS_MAX_DEVICES)
+
+ingest_ok = metrics_registry.counter(
+    "ingest_ok_total", "Telemetry readings written.", ("source", "device")
+)
+ingest_error = metrics_registry.counter(
+    "ingest_error_total", "Ingest errors recorded.", ("source", "device")
+)
+ingest_duplicates = metrics_registry.counter(
+    "ingest_duplicates_total",
+    "Duplicate (device_id, ts) readings skipped, by where they were caught.",
+    ("source", "stage"),
+)
+ingest_parse_seconds = metrics_registry.histogram(
+    "ingest_parse_seconds", "Time to decode and validate one reading.", ("source",)
+)
+ingest_commit_seconds = metrics_registry.histogram(
+    "ingest_db_commit_seconds", "Time spent in the ingest COMMIT.", ("source",)
+)
+ingest_seconds = metrics_registry.histogram(
+    "ingest_end_to_end_seconds",
+    "Time from receiving a reading (or batch) to its commit.",
+    ("source",),
+)
+db_pool_wait_seconds = metrics_registry.histogram(
+    "db_pool_checkout_wait_seconds", "Time waiting for a pooled connection."
+)
+http_request_seconds = metrics_registry.histogram(
+    "http_request_duration_seconds",
+    "HTTP request latency by route template.",
+    ("method", "route", "status"),
+)
+
+
+def count_ingest(
+    counter: Counter, source: str, device_ids: Sequence[str | None]
+) -> None:
+    """Increment ``counter`` once per entry in ``device_ids``."""
+
+    per_device: dict[str, int] = {}
+    for device_id in device_ids:
+        label = metrics_registry.device_label(device_id)
+        per_device[label] = per_device.get(label, 0) + 1
+    for label, amount in per_device.items():
+        counter.inc(amount, source, label)
+
+
+class RequestTimer:
+    """ASGI middleware observing request latency per route template.
+
+    For streaming responses the observation covers the whole stream.
+    """
+
+    def __init__(self, app: Any) -> None:
+        self.app = app
+
+    async def __call__(self, scope: dict[str, Any], receive: Any, send: Any) -> None:
+        if scope["type"] != "http":
+            await self.app(scope, receive, send)
+            return
+
+        started = time.perf_counter()
+        status = 500
+
+        async def send_with_status(message: dict[str, Any]) -> None:
+            nonlocal status
+            if message["type"] == "http.response.start":
+                status = message["status"]
+            await send(message)
+
+        try:
+            await self.app(scope, receive, send_with_status)
+        finally:
+            # The router records the matched route on the shared scope.
+            route = getattr(scope.get("route"), "path", "unmatched")
+            http_request_seconds.observe(
+                time.perf_counter() - started, scope["method"], route, str(status)
+            )
@@ -0,0 +1,304 @@
+"""Statements and payload shaping shared by the sync and async read APIs."""
+
+from __future__ import annotations
+
+import hashlib
+import json
+from datetime import datetime, timedelta, timezone
+from email.utils import formatdate, parsedate_to_datetime
+from typing import (
+    Any,
+    AsyncIterable,
+    AsyncIterator,
+    Iterable,
+    Iterator,
+    Mapping,
+    NamedTuple,
+    Optional,
+)
+
+from fastapi import HTTPException, Response
+from sqlalchemy import Select, desc, func, select
+
+from .decoder import parse_timestamp
+from .downsample import bucket_size, bucket_statement, raw_statement
+from .latest import LatestReading, latest_cache
+from .models import IngestError, Telemetry
+from .rollups import align_width, pick_rollup, rollup_statement
+from .settings import settings
+from .timeutil import to_iso
+
+ONLINE_DELTA = timedelta(seconds=settings.ONLINE_GRACE_SECONDS)
+
+
+def resolve_device(device_id: Optional[str]) -> str:
+    return device_id or settings.DEFAULT_DEVICE_ID
+
+
+def is_online(ts: int) -> bool:
+    now = datetime.now(tz=timezone.utc)
+    return now - datetime.fromtimestamp(ts, tz=timezone.utc) <= ONLINE_DELTA
+
+
+def latest_payload(device_id: str, row: LatestReading) -> dict[str, Any]:
+    return {
+        "id": device_id,
+        "deviceId": device_id,
+        "ts": to_iso(row.ts),
+        "temp": row.temperature,
+        "hum": row.humidity,
+        "temperature": row.temperature,
+        "humidity": row.humidity,
+        "online": is_online(row.ts),
+    }
+
+
+def status_payload(device_id: str, row: LatestReading | None) -> dict[str, Any]:
+    if row is None:
+        return {"id": device_id, "online": False, "updatedAt": None}
+    return {"id": device_id, "online": is_online(row.ts), "updatedAt": to_iso(row.ts)}
+
+
+def parse_device_ids(value: Optional[str]) -> Optional[list[str]]:
+    """Split a comma-separated ``deviceIds`` parameter; ``None`` means all."""
+
+    if value is None:
+        return None
+    return [d.strip() for d in value.split(",") if d.strip()]
+
+
+def fleet_payload(
+    rows: dict[str, LatestReading | None], online: Optional[bool]
+) -> list[dict[str, Any]]:
+    entries = []
+    for device_id, row in rows.items():
+        entry = status_payload(device_id, row)
+        if online is not None and entry["online"] != online:
+            continue
+        entry["deviceId"] = device_id
+        entry["temperature"] = row.temperature if row else None
+        entry["humidity"] = row.humidity if row else None
+        entries.append(entry)
+    return entries
+
+
+# Incremental and conditional reads -----------------------------------------
+def parse_since(value: Optional[str]) -> Optional[int]:
+    """Parse a ``since`` cursor: epoch seconds or the ISO ``ts`` of a payload."""
+
+    if value is None or not value.strip():
+        return None
+    try:
+        return parse_timestamp(value)
+    except ValueError:
+        raise HTTPException(status_code=400, detail="invalid 'since'") from None
+
+
+def newer_than(row: LatestReading | None, since: Optional[int]) -> bool:
+    return row is not None and (since is None or row.ts > since)
+
+
+class Validators(NamedTuple):
+    """``ETag``/``Last-Modified`` pair for a read response."""
+
+    etag: str
+    last_modified: Optional[int]
+
+    @classmethod
+    def of(cls, last_modified: Optional[int], *parts: Any) -> Validators:
+        digest = hashlib.blake2b(repr(parts).encode(), digest_size=8).hexdigest()
+        return cls(f'W/"{digest}"', last_modified)
+
+    def headers(self) -> dict[str, str]:
+        headers = {"ETag": self.etag, "Cache-Control": "no-cache"}
+        if self.last_modified is not None:
+            headers["Last-Modified"] = formatdate(self.last_modified, usegmt=True)
+        return headers
+
+    def matches(self, request_headers: Mapping[str, str]) -> bool:
+        """Evaluate ``If-None-Match`` (weakly), else ``If-Modified-Since``."""
+
+        if_none_match = request_headers.get("if-none-match")
+        if if_none_match is not None:
+            tags = [tag.strip().removeprefix("W/") for tag in if_none_match.split(",")]
+            return "*" in tags or self.etag.removeprefix("W/") in tags
+        if_modified_since = request_headers.get("if-modified-since")
+        if if_modified_since and self.last_modified is not None:
+            try:
+                cutoff = parsedate_to_datetime(if_modified_since).timestamp()
+            except (TypeError, ValueError):
+                return False
+            return self.last_modified <= cutoff
+        return False
+
+    def apply(
+        self, request_headers: Mapping[str, str], response: Response
+    ) -> Optional[Response]:
+        """Return a bodiless ``304`` if the client is current, else tag ``response``."""
+
+        if self.matches(request_headers):
+            return self.not_modified()
+        response.headers.update(self.headers())
+        return None
+
+    def not_modified(self) -> Response:
+        return Response(status_code=304, headers=self.headers())
+
+
+def latest_validators(
+    device_ids: Iterable[str], rows: Iterable[LatestReading | None], *parts: Any
+) -> Validators:
+    """Validators derived from each device's write version.
+
+    The version changes with every committed row, late ones included, so a
+    backfilled reading invalidates the tag even though the latest reading
+    stays the same. ``parts`` carries whatever else shapes the body (range,
+    mode, ...).
+    """
+
+    device_ids = tuple(device_ids)
+    versions = [latest_cache.version(device_id) for device_id in device_ids]
+    # ``online`` flips with the clock alone, so it is part of the tag.
+    online = [is_online(row.ts) if row else None for row in rows]
+    return Validators.of(
+        max(versions) // 1_000_000_000 if versions else None,
+        device_ids,
+        tuple(versions),
+        tuple(online),
+        *parts,
+    )
+
+
+# /metrics ------------------------------------------------------------------
+def recent_metrics_statement(
+    device_id: str, limit: int, since: Optional[int] = None
+) -> Select:
+    limit = max(1, min(limit, 1000))
+    stmt = (
+        select(Telemetry.ts, Telemetry.temperature, Telemetry.humidity)
+        .where(Telemetry.device_id == device_id)
+        .order_by(desc(Telemetry.ts))
+        .limit(limit)
+    )
+    if since is not None:
+        stmt = stmt.where(Telemetry.ts > since)
+    return stmt
+
+
+def metric_point(row: Any) -> dict[str, Any]:
+    ts, temp, hum = row
+    return {"ts": to_iso(ts), "temp": temp, "hum": hum}
+
+
+def wants_range(*params: Any) -> bool:
+    return any(param is not None for param in params)
+
+
+def metrics_range(
+    from_: Optional[int], to: Optional[int], max_points: Optional[int]
+) -> tuple[int, int, int]:
+    """Resolve ``(start, end, max_points)`` for a ranged ``/metrics`` query."""
+
+    end = to if to is not None else int(datetime.now(tz=timezone.utc).timestamp())
+    start = from_ if from_ is not None else end - settings.METRICS_DEFAULT_RANGE_SECONDS
+    if start > end:
+        raise HTTPException(status_code=400, detail="'from' must not exceed 'to'")
+    cap = settings.METRICS_MAX_POINTS
+    return start, end, max(1, min(max_points or cap, cap))
+
+
+def bucketed_statement(
+    device_id: str, start: int, end: int, max_points: int, bucket: Optional[int]
+) -> Select:
+    """Pick rollup or raw aggregation for ``mode=avg``."""
+
+    width = max(bucket or 1, bucket_size(start, end, max_points))
+    if settings.ROLLUPS_ENABLED and bucket is None:
+        width = align_width(width)
+    rollup = pick_rollup(width) if settings.ROLLUPS_ENABLED else None
+    if rollup is not None:
+        return rollup_statement(rollup, device_id, start, end, width)
+    return bucket_statement(device_id, start, end, width)
+
+
+def bucket_point(row: Any) -> dict[str, Any]:
+    return {
+        "ts": to_iso(row.bucket),
+        "temp": row.temp_avg,
+        "hum": row.hum_avg,
+        "count": row.count,
+        "tempMin": row.temp_min,
+        "tempMax": row.temp_max,
+        "humMin": row.hum_min,
+        "humMax": row.hum_max,
+    }
+
+
+def range_count_statement(device_id: str, start: int, end: int) -> Select:
+    return select(func.count()).select_from(
+        raw_statement(device_id, start, end).order_by(None).subquery()
+    )
+
+
+# /errors -------------------------------------------------------------------
+def errors_statement(
+    device_id: Optional[str], limit: int, since: Optional[int] = None
+) -> Select:
+    """Most recently seen errors; ``since`` keeps rows seen after it.
+
+    A coalesced row whose ``count`` was bumped after ``since`` is returned
+    again, so clients merge by ``id``.
+    """
+
+    limit = max(1, min(limit, 200))
+    stmt = select(IngestError).order_by(desc(IngestError.last_ts)).limit(limit)
+    if device_id:
+        stmt = stmt.where(IngestError.device_id == device_id)
+    if since is not None:
+        stmt = stmt.where(IngestError.last_ts > since)
+    return stmt
+
+
+def errors_version_statement(device_id: Optional[str]) -> Select:
+    """The most recently touched error row; its columns tag ``/errors``."""
+
+    stmt = (
+        select(IngestError.id, IngestError.last_ts, IngestError.count)
+        .order_by(desc(IngestError.last_ts), desc(IngestError.id))
+        .limit(1)
+    )
+    if device_id:
+        stmt = stmt.where(IngestError.device_id == device_id)
+    return stmt
+
+
+def errors_validators(top: Any, *parts: Any) -> Validators:
+    return Validators.of(top.last_ts if top else None, tuple(top or ()), *parts)
+
+
+def error_payload(row: IngestError) -> dict[str, Any]:
+    return {
+        "id": str(row.id),
+        "deviceId": row.device_id,
+        "ts": to_iso(row.last_ts),
+        "firstSeen": to_iso(row.ts),
+        "count": row.count,
+        "msg": row.reason,
+    }
+
+
+# Streaming -----------------------------------------------------------------
+def json_array(items: Iterable[dict[str, Any]]) -> Iterator[str]:
+    yield "["
+    for idx, item in enumerate(items):
+        yield ("," if idx else "") + json.dumps(item, separators=(",", ":"))
+    yield "]"
+
+
+async def ajson_array(items: AsyncIterable[dict[str, Any]]) -> AsyncIterator[str]:
+    yield "["
+    idx = 0
+    async for item in items:
+        yield ("," if idx else "") + json.dumps(item, separators=(",", ":"))
+        idx += 1
+    yield "]"
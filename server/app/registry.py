@@ -0,0 +1,94 @@
+"""Process-wide cache of known device ids."""
+
+from __future__ import annotations
+
+import threading
+from collections import OrderedDict
+from typing import Iterable
+
+from sqlalchemy import insert, select
+from sqlalchemy.orm import Session
+
+from .db import dialect_insert
+from .models import Device
+from .settings import settings
+
+
+class DeviceRegistry:
+    """Bounded LRU set of device ids known to exist in the ``devices`` table.
+
+    Lookups never touch the database; unknown ids are created with a race-safe
+    ``INSERT ... ON CONFLICT DO NOTHING`` by :meth:`ensure`. Callers add the
+    ids to the cache with :meth:`remember` only after their transaction
+    commits, so a rollback never leaves phantom devices behind.
+    """
+
+    def __init__(self, max_size: int = 50000) -> None:
+        self._max_size = max(1, max_size)
+        self._ids: OrderedDict[str, None] = OrderedDict()
+        self._lock = threading.Lock()
+
+    def __contains__(self, device_id: object) -> bool:
+        with self._lock:
+            if device_id not in self._ids:
+                return False
+            self._ids.move_to_end(device_id)  # type: ignore[arg-type]
+            return True
+
+    def __len__(self) -> int:
+        return len(self._ids)
+
+    def warm(self, db: Session) -> int:
+        """Load up to ``max_size`` device ids from the database."""
+
+        ids = db.execute(
+            select(Device.device_id).order_by(Device.id.desc()).limit(self._max_size)
+        ).scalars()
+        self.remember(reversed(list(ids)))
+        return len(self)
+
+    def ensure(self, db: Session, device_ids: Iterable[str]) -> list[str]:
+        """Create any device ids missing from the cache inside ``db``'s transaction.
+
+        Returns the ids that were not cached; pass them to :meth:`remember`
+        once the transaction has committed.
+        """
+
+        missing = sorted({d for d in device_ids if d not in self})
+        if not missing:
+            return []
+
+        rows = [{"device_id": d} for d in missing]
+        stmt = dialect_insert(db.get_bind(), Device.__table__)
+        if stmt is not None:
+            db.execute(stmt.on_conflict_do_nothing(index_elements=["device_id"]), rows)
+        else:
+            existing = set(
+                db.execute(
+                    select(Device.device_id).where(Device.device_id.in_(missing))
+                ).scalars()
+            )
+            new_rows = [row for row in rows if row["device_id"] not in existing]
+            if new_rows:
+                db.execute(insert(Device), new_rows)
+        return missing
+
+    def remember(self, device_ids: Iterable[str]) -> None:
+        with self._lock:
+            for device_id in device_ids:
+                self._ids[device_id] = None
+                self._ids.move_to_end(device_id)
+            while len(self._ids) > self._max_size:
+                self._ids.popitem(last=False)
+
+    def invalidate(self, device_id: str | None = None) -> None:
+        """Forget one device id, or every cached id when none is given."""
+
+        with self._lock:
+            if device_id is None:
+                self._ids.clear()
+            else:
+                self._ids.pop(device_id, None)
+
+
+device_registry = DeviceRegistry(settings.DEVICE_CACHE_SIZE)
@@ -0,0 +1,362 @@
+"""Time-based partitioning and retention for the ``telemetry`` table.
+
+On PostgreSQL, ``python -m app.retention partition`` converts ``telemetry``
+into a table range-partitioned by ``ts`` (one-off, opt-in). Afterwards the
+maintenance pass creates partitions ahead of time and expires old data by
+dropping (or detaching, to archive) whole partitions; only the default
+partition is trimmed with batched ``DELETE``s. Unpartitioned tables,
+including SQLite, are trimmed the same way.
+"""
+
+from __future__ import annotations
+
+import argparse
+import logging
+import re
+import threading
+from datetime import datetime, timezone
+from typing import Literal, Sequence
+
+from sqlalchemy import Delete, column, delete, select, table, text
+from sqlalchemy.engine import Connection, Engine
+from sqlalchemy.exc import DBAPIError
+
+from .db import engine as default_engine
+from .dedup import PLAIN_INDEX, UNIQUE_INDEX
+from .models import Telemetry
+from .settings import settings
+
+logger = logging.getLogger(__name__)
+
+Interval = Literal["daily", "monthly"]
+
+DEFAULT_PARTITION = "telemetry_default"
+_LOCK_KEY = 0x7E1E_0001  # pg advisory lock id shared by all workers
+_BOUND_RE = re.compile(r"FROM \('?(-?\d+)'?\) TO \('?(-?\d+)'?\)")
+
+
+def _period_start(moment: datetime, interval: Interval) -> datetime:
+    if interval == "daily":
+        return moment.replace(hour=0, minute=0, second=0, microsecond=0)
+    return moment.replace(day=1, hour=0, minute=0, second=0, microsecond=0)
+
+
+def _next_period(start: datetime, interval: Interval) -> datetime:
+    if interval == "daily":
+        return datetime.fromtimestamp(start.timestamp() + 86400, tz=timezone.utc)
+    if start.month == 12:
+        return start.replace(year=start.year + 1, month=1)
+    return start.replace(month=start.month + 1)
+
+
+def partition_name(start: datetime, interval: Interval) -> str:
+    fmt = "%Y%m%d" if interval == "daily" else "%Y%m"
+    return f"telemetry_p{start.strftime(fmt)}"
+
+
+def is_partitioned(conn: Connection) -> bool:
+    if conn.dialect.name != "postgresql":
+        return False
+    return (
+        conn.execute(
+            text(
+                "SELECT 1 FROM pg_partitioned_table p "
+                "JOIN pg_class c ON c.oid = p.partrelid "
+                "WHERE c.relname = 'telemetry' AND c.relkind = 'p'"
+            )
+        ).first()
+        is not None
+    )
+
+
+def list_partitions(conn: Connection) -> list[tuple[str, int | None, int | None]]:
+    """Return ``(name, lower, upper)`` for each partition; bounds are epoch seconds."""
+
+    rows = conn.execute(
+        text(
+            "SELECT c.relname, pg_get_expr(c.relpartbound, c.oid) "
+            "FROM pg_inherits i "
+            "JOIN pg_class c ON c.oid = i.inhrelid "
+            "JOIN pg_class p ON p.oid = i.inhparent "
+            "WHERE p.relname = 'telemetry' ORDER BY c.relname"
+        )
+    ).all()
+    parts = []
+    for name, bound in rows:
+        match = _BOUND_RE.search(bound or "")
+        if match is None:
+            parts.append((name, None, None))
+        else:
+            parts.append((name, int(match.group(1)), int(match.group(2))))
+    return parts
+
+
+def ensure_partitions(
+    conn: Connection,
+    interval: Interval,
+    ahead: int,
+    now: datetime | None = None,
+) -> list[str]:
+    """Create the current partition and ``ahead`` future ones if missing."""
+
+    start = _period_start(now or datetime.now(tz=timezone.utc), interval)
+    existing = {name for name, _, _ in list_partitions(conn)}
+    created = []
+    for _ in range(ahead + 1):
+        end = _next_period(start, interval)
+        name = partition_name(start, interval)
+        if name not in existing:
+            try:
+                with conn.begin_nested():
+                    conn.execute(
+                        text(
+                            f"CREATE TABLE {name} PARTITION OF telemetry "
+                            f"FOR VALUES FROM ({int(start.timestamp())}) "
+                            f"TO ({int(end.timestamp())})"
+                        )
+                    )
+            except DBAPIError as exc:
+                # Usually rows for this range already sit in the default
+                # partition; leave them there rather than failing the pass.
+                logger.warning("Could not create partition %s: %s", name, exc)
+            else:
+                created.append(name)
+        start = end
+    return created
+
+
+def expired_rows_statement(partitioned: bool, cutoff: int, batch_size: int) -> Delete:
+    """``DELETE`` for one batch of rows older than ``cutoff``.
+
+    On a partitioned table only :data:`DEFAULT_PARTITION` is targeted: the
+    range partitions expire by being dropped, and a ``DELETE`` on the parent
+    would scan every one of them for the ``id IN (...)`` lookup.
+    """
+
+    if partitioned:
+        target = table(DEFAULT_PARTITION, column("id"), column("ts"))
+    else:
+        target = Telemetry.__table__
+    victims = (
+        select(target.c.id)
+        .where(target.c.ts < cutoff)
+        .limit(batch_size)
+        .scalar_subquery()
+    )
+    return delete(target).where(target.c.ts < cutoff, target.c.id.in_(victims))
+
+
+def apply_retention(
+    conn: Connection,
+    retention_days: int,
+    *,
+    archive: bool = False,
+    now: datetime | None = None,
+    batch_size: int = 10000,
+    commit: bool = False,
+) -> int:
+    """Expire telemetry older than ``retention_days``.
+
+    Whole partitions below the cutoff are dropped, or detached when
+    ``archive`` is set so they can be dumped and dropped later. Rows in the
+    default partition, or in an unpartitioned table, are deleted in batches.
+    With ``commit`` every drop and batch is committed on its own so locks
+    are held briefly; ``conn`` must then not be inside ``begin()``.
+    Returns the number of partitions removed plus rows deleted.
+    """
+
+    if retention_days <= 0:
+        return 0
+    moment = now or datetime.now(tz=timezone.utc)
+    cutoff = int(moment.timestamp()) - retention_days * 86400
+
+    removed = 0
+    partitioned = is_partitioned(conn)
+    if partitioned:
+        partitions = list_partitions(conn)
+        for name, _lower, upper in partitions:
+            if upper is None or upper > cutoff:
+                continue
+            if archive:
+                conn.execute(text(f"ALTER TABLE telemetry DETACH PARTITION {name}"))
+                logger.info("Detached telemetry partition %s for archiving", name)
+            else:
+                conn.execute(text(f"DROP TABLE {name}"))
+                logger.info("Dropped telemetry partition %s", name)
+            if commit:
+                conn.commit()
+            removed += 1
+        if DEFAULT_PARTITION not in {name for name, _, _ in partitions}:
+            return removed
+
+    statement = expired_rows_statement(partitioned, cutoff, batch_size)
+    while True:
+        result = conn.execute(statement)
+        if commit:
+            conn.commit()
+        removed += result.rowcount
+        if result.rowcount < batch_size:
+            break
+    return removed
+
+
+def partition_telemetry(
+    conn: Connection, interval: Interval, ahead: int, now: datetime | None = None
+) -> None:
+    """Convert ``telemetry`` into a range-partitioned table (PostgreSQL only).
+
+    Partitions are created for the current period and ``ahead`` future ones;
+    older rows are copied into a ``DEFAULT`` partition, which also catches
+    readings outside the pre-created ranges and is trimmed with DELETE.
+    """
+
+    if conn.dialect.name != "postgresql":
+        raise RuntimeError("telemetry partitioning requires PostgreSQL")
+    if is_partitioned(conn):
+        logger.info("telemetry is already partitioned")
+        return
+
+    # Keep whichever (device_id, ts) index the table has; see app.dedup.
+    unique = (
+        conn.execute(text(f"SELECT to_regclass('{UNIQUE_INDEX}')")).scalar() is not None
+    )
+    index = UNIQUE_INDEX if unique else PLAIN_INDEX
+    for statement in (
+        "ALTER TABLE telemetry RENAME TO telemetry_legacy",
+        f"ALTER INDEX {index} RENAME TO {index}_legacy",
+        "ALTER SEQUENCE telemetry_id_seq OWNED BY NONE",
+        "CREATE TABLE telemetry (LIKE telemetry_legacy INCLUDING DEFAULTS) "
+        "PARTITION BY RANGE (ts)",
+        "ALTER TABLE telemetry ADD PRIMARY KEY (id, ts)",
+        "ALTER TABLE telemetry ADD FOREIGN KEY (device_id) "
+        "REFERENCES devices (device_id) ON DELETE CASCADE",
+        f"CREATE {'UNIQUE ' if unique else ''}INDEX {index} "
+        "ON telemetry (device_id, ts)",
+        f"CREATE TABLE {DEFAULT_PARTITION} PARTITION OF telemetry DEFAULT",
+    ):
+        conn.execute(text(statement))
+    # Create ranges before copying so recent rows land in their partitions.
+    ensure_partitions(conn, interval, ahead, now)
+    for statement in (
+        "INSERT INTO telemetry SELECT * FROM telemetry_legacy",
+        "DROP TABLE telemetry_legacy",
+        "ALTER SEQUENCE telemetry_id_seq OWNED BY telemetry.id",
+    ):
+        conn.execute(text(statement))
+
+
+def run_maintenance(bind: Engine | None = None) -> None:
+    """One maintenance pass; only one worker runs it at a time on PostgreSQL.
+
+    Each step commits separately, so the PostgreSQL lock is held at session
+    level and released explicitly.
+    """
+
+    bind = bind or default_engine
+    with bind.connect() as conn:
+        postgres = conn.dialect.name == "postgresql"
+        if postgres:
+            locked = conn.execute(
+                text("SELECT pg_try_advisory_lock(:key)"), {"key": _LOCK_KEY}
+            ).scalar_one()
+            conn.commit()
+            if not locked:
+                return
+        try:
+            if settings.TELEMETRY_PARTITIONING != "none" and is_partitioned(conn):
+                created = ensure_partitions(
+                    conn,
+                    settings.TELEMETRY_PARTITIONING,
+                    settings.TELEMETRY_PARTITIONS_AHEAD,
+                )
+                conn.commit()
+                if created:
+                    logger.info("Created telemetry partitions %s", ", ".join(created))
+            removed = apply_retention(
+                conn,
+                settings.TELEMETRY_RETENTION_DAYS,
+                archive=settings.TELEMETRY_RETENTION_ARCHIVE,
+                commit=True,
+            )
+            if removed:
+                logger.info("Retention removed %d partition(s)/row(s)", removed)
+        finally:
+            if postgres:
+                conn.rollback()
+                conn.execute(
+                    text("SELECT pg_advisory_unlock(:key)"), {"key": _LOCK_KEY}
+                )
+                conn.commit()
+
+
+class RetentionService:
+    """Run :func:`run_maintenance` periodically on a daemon thread."""
+
+    def __init__(self, interval: float) -> None:
+        self._interval = interval
+        self._stop = threading.Event()
+        self._thread: threading.Thread | None = None
+
+    @property
+    def enabled(self) -> bool:
+        return (
+            settings.TELEMETRY_PARTITIONING != "none"
+            or settings.TELEMETRY_RETENTION_DAYS > 0
+        )
+
+    def start(self) -> None:
+        if not self.enabled or self._thread is not None:
+            return
+        self._stop.clear()
+        self._thread = threading.Thread(
+            target=self._run, name="telemetry-retention", daemon=True
+        )
+        self._thread.start()
+
+    def stop(self) -> None:
+        self._stop.set()
+        if self._thread is not None:
+            self._thread.join(timeout=5)
+            self._thread = None
+
+    def _run(self) -> None:
+        while True:
+            try:
+                run_maintenance()
+            except Exception:  # pragma: no cover - keep the loop alive
+                logger.exception("Telemetry retention pass failed")
+            if self._stop.wait(self._interval):
+                return
+
+
+retention_service = RetentionService(settings.RETENTION_INTERVAL_SECONDS)
+
+
+def main(argv: Sequence[str] | None = None) -> None:
+    parser = argparse.ArgumentParser(prog="python -m app.retention")
+    sub = parser.add_subparsers(dest="command", required=True)
+    part = sub.add_parser("partition", help="convert telemetry to partitions")
+    part.add_argument(
+        "--interval",
+        choices=("daily", "monthly"),
+        default=(
+            settings.TELEMETRY_PARTITIONING
+            if settings.TELEMETRY_PARTITIONING != "none"
+            else "monthly"
+        ),
+    )
+    sub.add_parser("run", help="create partitions and apply retention once")
+    args = parser.parse_args(argv)
+
+    logging.basicConfig(level=logging.INFO)
+    if args.command == "partition":
+        with default_engine.begin() as conn:
+            partition_telemetry(
+                conn, args.interval, settings.TELEMETRY_PARTITIONS_AHEAD
+            )
+    else:
+        run_maintenance()
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,222 @@
+"""Incrementally maintained 1-minute / 1-hour telemetry rollups.
+
+Run ``python -m app.rollups backfill`` once after enabling ``ROLLUPS_ENABLED``
+to rebuild the rollup tables from existing ``telemetry`` rows.
+"""
+
+from __future__ import annotations
+
+import argparse
+import logging
+from typing import Any, Mapping, Sequence
+
+from sqlalchemy import BigInteger, Select, cast, func, select, true
+from sqlalchemy.orm import Session
+
+from .db import SessionLocal, dialect_insert
+from .models import Telemetry, Telemetry1h, Telemetry1m
+
+logger = logging.getLogger(__name__)
+
+# Coarsest first, so the first match is the cheapest table to read.
+ROLLUPS = (Telemetry1h, Telemetry1m)
+
+
+def pick_rollup(width: int) -> type[Telemetry1m] | type[Telemetry1h] | None:
+    """Return the coarsest rollup whose resolution evenly divides ``width``."""
+
+    for model in ROLLUPS:
+        if width >= model.resolution and width % model.resolution == 0:
+            return model
+    return None
+
+
+def align_width(width: int) -> int:
+    """Round a derived bucket width up so that a rollup table can serve it."""
+
+    for model in ROLLUPS:
+        if width >= model.resolution:
+            return -(-width // model.resolution) * model.resolution
+    return width
+
+
+def rollup_statement(
+    model: type[Telemetry1m] | type[Telemetry1h],
+    device_id: str,
+    start: int,
+    end: int,
+    width: int,
+) -> Select:
+    """Re-aggregate rollup rows into ``width`` buckets.
+
+    Columns match :func:`app.downsample.bucket_statement`. Rollup buckets are
+    selected by their start time, so range edges are aligned to the rollup's
+    resolution.
+    """
+
+    bucket_ts = ((model.bucket // width) * width).label("bucket")
+    count = cast(func.sum(model.count), BigInteger)
+    return (
+        select(
+            bucket_ts,
+            count.label("count"),
+            (func.sum(model.temp_sum) / count).label("temp_avg"),
+            func.min(model.temp_min).label("temp_min"),
+            func.max(model.temp_max).label("temp_max"),
+            (func.sum(model.hum_sum) / count).label("hum_avg"),
+            func.min(model.hum_min).label("hum_min"),
+            func.max(model.hum_max).label("hum_max"),
+        )
+        .where(
+            model.device_id == device_id,
+            model.bucket >= start - start % model.resolution,
+            model.bucket <= end,
+        )
+        .group_by(bucket_ts)
+        .order_by(bucket_ts)
+    )
+
+
+def apply_rollups(db: Session, rows: Sequence[Mapping[str, Any]]) -> None:
+    """Fold newly inserted telemetry rows into every rollup table.
+
+    Runs inside the caller's transaction; rows are pre-aggregated per
+    ``(device_id, bucket)`` so each bucket costs one upsert.
+    """
+
+    if not rows:
+        return
+    bind = db.get_bind()
+    sqlite = bind.dialect.name == "sqlite"
+    least = func.min if sqlite else func.least
+    greatest = func.max if sqlite else func.greatest
+
+    for model in ROLLUPS:
+        res = model.resolution
+        buckets: dict[tuple[str, int], dict[str, Any]] = {}
+        for row in rows:
+            key = (row["device_id"], row["ts"] - row["ts"] % res)
+            temp, hum = row["temperature"], row["humidity"]
+            agg = buckets.get(key)
+            if agg is None:
+                buckets[key] = {
+                    "device_id": key[0],
+                    "bucket": key[1],
+                    "count": 1,
+                    "temp_sum": temp,
+                    "temp_min": temp,
+                    "temp_max": temp,
+                    "hum_sum": hum,
+                    "hum_min": hum,
+                    "hum_max": hum,
+                }
+                continue
+            agg["count"] += 1
+            agg["temp_sum"] += temp
+            agg["temp_min"] = min(agg["temp_min"], temp)
+            agg["temp_max"] = max(agg["temp_max"], temp)
+            agg["hum_sum"] += hum
+            agg["hum_min"] = min(agg["hum_min"], hum)
+            agg["hum_max"] = max(agg["hum_max"], hum)
+
+        stmt = dialect_insert(bind, model.__table__)
+        if stmt is None:  # pragma: no cover - only PostgreSQL/SQLite supported
+            raise RuntimeError(f"rollups are not supported on {bind.dialect.name}")
+        excluded = stmt.excluded
+        table = model.__table__.c
+        stmt = stmt.on_conflict_do_update(
+            index_elements=["device_id", "bucket"],
+            set_={
+                "count": table["count"] + excluded["count"],
+                "temp_sum": table.temp_sum + excluded.temp_sum,
+                "temp_min": least(table.temp_min, excluded.temp_min),
+                "temp_max": greatest(table.temp_max, excluded.temp_max),
+                "hum_sum": table.hum_sum + excluded.hum_sum,
+                "hum_min": least(table.hum_min, excluded.hum_min),
+                "hum_max": greatest(table.hum_max, excluded.hum_max),
+            },
+        )
+        # Sorted keys keep lock order stable across concurrent writers.
+        db.execute(stmt, [buckets[key] for key in sorted(buckets)])
+
+
+def backfill(
+    db: Session,
+    *,
+    device_id: str | None = None,
+    start: int | None = None,
+    end: int | None = None,
+) -> None:
+    """Recompute rollup buckets from raw ``telemetry`` rows and commit.
+
+    Buckets overlapping ``[start, end]`` are rebuilt from scratch, replacing
+    whatever incremental state they held.
+    """
+
+    bind = db.get_bind()
+    for model in ROLLUPS:
+        res = model.resolution
+        bucket_ts = Telemetry.ts - Telemetry.ts % res
+        conditions = [true()]
+        if device_id is not None:
+            conditions.append(Telemetry.device_id == device_id)
+        if start is not None:
+            conditions.append(Telemetry.ts >= start - start % res)
+        if end is not None:
+            conditions.append(Telemetry.ts < end - end % res + res)
+
+        source = (
+            select(
+                Telemetry.device_id,
+                bucket_ts,
+                func.count(),
+                func.sum(Telemetry.temperature),
+                func.min(Telemetry.temperature),
+                func.max(Telemetry.temperature),
+                func.sum(Telemetry.humidity),
+                func.min(Telemetry.humidity),
+                func.max(Telemetry.humidity),
+            )
+            .where(*conditions)
+            .group_by(Telemetry.device_id, bucket_ts)
+        )
+        stmt = dialect_insert(bind, model.__table__)
+        if stmt is None:  # pragma: no cover - only PostgreSQL/SQLite supported
+            raise RuntimeError(f"rollups are not supported on {bind.dialect.name}")
+        columns = [
+            "device_id",
+            "bucket",
+            "count",
+            "temp_sum",
+            "temp_min",
+            "temp_max",
+            "hum_sum",
+            "hum_min",
+            "hum_max",
+        ]
+        stmt = stmt.from_select(columns, source)
+        stmt = stmt.on_conflict_do_update(
+            index_elements=["device_id", "bucket"],
+            set_={name: stmt.excluded[name] for name in columns[2:]},
+        )
+        result = db.execute(stmt)
+        logger.info("Backfilled %s: %s bucket(s)", model.__tablename__, result.rowcount)
+    db.commit()
+
+
+def main(argv: Sequence[str] | None = None) -> None:
+    parser = argparse.ArgumentParser(prog="python -m app.rollups")
+    sub = parser.add_subparsers(dest="command", required=True)
+    fill = sub.add_parser("backfill", help="rebuild rollups from raw telemetry")
+    fill.add_argument("--device", help="only this deviceId")
+    fill.add_argument("--from", dest="start", type=int, help="epoch seconds")
+    fill.add_argument("--to", dest="end", type=int, help="epoch seconds")
+    args = parser.parse_args(argv)
+
+    logging.basicConfig(level=logging.INFO)
+    with SessionLocal() as db:
+        backfill(db, device_id=args.device, start=args.start, end=args.end)
+
+
+if __name__ == "__main__":
+    main()
@@ -2,10 +2,34 @@
 
 from __future__ import annotations
 
-from sqlalchemy import select
+import logging
+import warnings
+from typing import Any, Iterable, Mapping, Sequence
+
+from sqlalchemy import insert
+from sqlalchemy.exc import IntegrityError
 from sqlalchemy.orm import Session
 
-from .models import Device, IngestError, Telemetry
+from .db import dialect_insert, is_transient
+from .dedup import recent_keys
+from .errorsink import error_sink
+from .hub import stream_hub
+from .latest import latest_cache
+from .models import Telemetry
+from .presence import presence_watchdog
+from .prometheus import (
+    count_ingest,
+    ingest_commit_seconds,
+    ingest_duplicates,
+    ingest_ok,
+)
+from .registry import device_registry
+from .rollups import apply_rollups
+from .settings import settings
+
+logger = logging.getLogger(__name__)
+
+DB_REJECTED_REASON = "reading rejected by database"
 
 
 def persist_telemetry(
@@ -15,35 +39,194 @@ def persist_telemetry(
     ts: int,
     temperature: float,
     humidity: float,
-) -> Telemetry:
-    """Insert a telemetry record and ensure the device exists."""
-
-    dev = db.execute(
-        select(Device).where(Device.device_id == device_id)
-    ).scalar_one_or_none()
-    if not dev:
-        dev = Device(device_id=device_id)
-        db.add(dev)
-
-    telemetry = Telemetry(
-        device_id=device_id,
-        ts=ts,
-        temperature=temperature,
-        humidity=humidity,
+    source: str = "http",
+) -> bool:
+    """Insert a telemetry record and ensure the device exists.
+
+    Returns ``False`` when the reading duplicates an existing ``(device_id, ts)``.
+    """
+
+    row = {
+        "device_id": device_id,
+        "ts": ts,
+        "temperature": temperature,
+        "humidity": humidity,
+    }
+    return persist_telemetry_batch(db, [row], source) == 1
+
+
+def persist_telemetry_batch(
+    db: Session, rows: Sequence[Mapping[str, Any]], source: str = "http"
+) -> int:
+    """Insert many telemetry rows with one multi-row INSERT and one commit.
+
+    Each row is a mapping with ``device_id``, ``ts``, ``temperature`` and
+    ``humidity`` keys; ``source`` labels the ingest metrics. With dedup
+    enabled, readings whose ``(device_id, ts)`` already exists are skipped
+    (``INGEST_DEDUP=ignore``) or overwrite the stored values (``update``)
+    and recent repeats are dropped in memory first; with ``off`` every row
+    is inserted. Returns the number of new rows written.
+    """
+
+    if settings.INGEST_DEDUP == "off":
+        fresh: Sequence[Mapping[str, Any]] = rows
+    else:
+        fresh = recent_keys.filter(rows)
+        if len(fresh) < len(rows):
+            ingest_duplicates.inc(len(rows) - len(fresh), source, "memory")
+    if not fresh:
+        return 0
+
+    device_ids = {row["device_id"] for row in fresh}
+    new_devices = device_registry.ensure(db, device_ids)
+    written = _insert_new(db, fresh)
+    updated = []
+    if len(written) < len(fresh) and settings.INGEST_DEDUP == "update":
+        updated = _update_existing(db, fresh, written)
+    if settings.ROLLUPS_ENABLED:
+        # Only new rows; overwritten values stay in the rollups until a backfill.
+        apply_rollups(db, written)
+    _commit(db, device_ids, source)
+    if len(written) < len(fresh):
+        ingest_duplicates.inc(len(fresh) - len(written), source, "db")
+    recent_keys.remember(fresh)
+    _after_write(new_devices, written, source)
+    if updated:
+        latest_cache.update_many(updated)
+        latest_cache.touch({row["device_id"] for row in updated})
+    return len(written)
+
+
+def persist_telemetry_rows(
+    db: Session, rows: Sequence[Mapping[str, Any]], source: str = "http"
+) -> tuple[int, list[Mapping[str, Any]]]:
+    """:func:`persist_telemetry_batch`, isolating rows the database rejects.
+
+    A failure that :func:`~app.db.is_transient` accepts propagates unchanged.
+    Any other error splits the batch in half and retries each half, so the
+    good rows are written and only the offending ones are returned, together
+    with the number of rows written.
+    """
+
+    try:
+        return persist_telemetry_batch(db, rows, source), []
+    except Exception as exc:
+        db.rollback()
+        if is_transient(exc):
+            raise
+        if len(rows) <= 1:
+            for row in rows:
+                logger.warning(
+                    "Rejected reading from %.100s: %s", row.get("device_id"), exc
+                )
+            return 0, list(rows)
+    mid = len(rows) // 2
+    head, head_rejected = persist_telemetry_rows(db, rows[:mid], source)
+    tail, tail_rejected = persist_telemetry_rows(db, rows[mid:], source)
+    return head + tail, head_rejected + tail_rejected
+
+
+_RETURNING = (
+    Telemetry.device_id,
+    Telemetry.ts,
+    Telemetry.temperature,
+    Telemetry.humidity,
+)
+
+
+def _insert_new(
+    db: Session, rows: Sequence[Mapping[str, Any]]
+) -> list[Mapping[str, Any]]:
+    """Insert ``rows``; returns the rows actually inserted.
+
+    With dedup enabled this is ``INSERT ... ON CONFLICT DO NOTHING``.
+    """
+
+    stmt = dialect_insert(db.get_bind(), Telemetry.__table__)
+    if stmt is None or settings.INGEST_DEDUP == "off":
+        db.execute(insert(Telemetry), [dict(row) for row in rows])
+        return list(rows)
+    stmt = stmt.on_conflict_do_nothing(index_elements=["device_id", "ts"])
+    result = db.execute(stmt.returning(*_RETURNING), [dict(row) for row in rows])
+    return [dict(row) for row in result.mappings()]
+
+
+def _update_existing(
+    db: Session,
+    rows: Sequence[Mapping[str, Any]],
+    inserted: Sequence[Mapping[str, Any]],
+) -> list[Mapping[str, Any]]:
+    """Overwrite stored values for the rows that hit an existing key."""
+
+    new_keys = {(row["device_id"], row["ts"]) for row in inserted}
+    # One row per key: PostgreSQL rejects touching a row twice in a statement.
+    pending = {
+        (row["device_id"], row["ts"]): dict(row)
+        for row in rows
+        if (row["device_id"], row["ts"]) not in new_keys
+    }
+    stmt = dialect_insert(db.get_bind(), Telemetry.__table__)
+    stmt = stmt.on_conflict_do_update(
+        index_elements=["device_id", "ts"],
+        set_={
+            "temperature": stmt.excluded.temperature,
+            "humidity": stmt.excluded.humidity,
+        },
     )
-    db.add(telemetry)
-    db.commit()
-    db.refresh(telemetry)
-    return telemetry
+    db.execute(stmt, list(pending.values()))
+    return list(pending.values())
+
+
+def _commit(db: Session, device_ids: set[str], source: str) -> None:
+    try:
+        with ingest_commit_seconds.time(source):
+            db.commit()
+    except IntegrityError:
+        # A cached device may have been deleted behind our back; forget the
+        # ids so the next attempt re-creates them.
+        for device_id in device_ids:
+            device_registry.invalidate(device_id)
+        raise
+
+
+def _after_write(
+    new_devices: list[str], rows: Sequence[Mapping[str, Any]], source: str
+) -> None:
+    """Propagate committed rows to metrics, in-process caches and subscribers."""
+
+    count_ingest(ingest_ok, source, [row["device_id"] for row in rows])
+    device_registry.remember(new_devices)
+    latest_cache.update_many(rows)
+    latest_cache.touch({row["device_id"] for row in rows})
+    presence_watchdog.seen(rows)
+    stream_hub.publish_readings(rows)
 
 
 def record_ingest_error(
-    db: Session, *, reason: str, device_id: str | None = None
-) -> IngestError:
-    """Persist an ingestion error for later inspection."""
-
-    err = IngestError(device_id=device_id, reason=reason)
-    db.add(err)
-    db.commit()
-    db.refresh(err)
-    return err
+    db: Session | None = None,
+    *,
+    reason: str,
+    device_id: str | None = None,
+    source: str = "http",
+) -> None:
+    """Record an ingestion error for later inspection (see ``app.errorsink``).
+
+    Errors are buffered and written in the background; passing ``db`` is
+    deprecated and the session is not used.
+    """
+
+    if db is not None:
+        warnings.warn(
+            "record_ingest_error() no longer uses its db argument",
+            DeprecationWarning,
+            stacklevel=2,
+        )
+    error_sink.record([(reason, device_id)], source)
+
+
+def record_ingest_errors(
+    errors: Iterable[tuple[str, str | None]], source: str = "http"
+) -> int:
+    """Record several ``(reason, device_id)`` ingestion errors."""
+
+    return error_sink.record(errors, source)
@@ -0,0 +1,329 @@
+"""Durable on-disk spool for MQTT readings while the database is unavailable.
+
+When a writer flush fails, its rows are appended to the spool and the
+database is considered unhealthy: later flushes go straight to disk instead
+of waiting on connection timeouts. A replayer thread probes the database and,
+once it answers, drains closed segments back in bulk at a bounded rate.
+Replays are idempotent because ``telemetry`` is unique on
+``(device_id, ts)``. Rows the database refuses outright (rather than failing
+to answer) are recorded as ingest errors and skipped so they cannot stall
+the replay.
+
+Segments are ``<seq>.spool`` files of length-prefixed records::
+
+    u32 payload length, u32 CRC-32 of the payload
+    i64 ts, f64 temperature, f64 humidity, device id (UTF-8)
+
+Appends are flushed to the OS immediately and ``fsync``-ed at most every
+``fsync_interval`` seconds. Segments are read back through ``mmap``, and a
+torn record at the tail of a segment (a crash mid-write) ends it.
+"""
+
+from __future__ import annotations
+
+import logging
+import mmap
+import os
+import struct
+import threading
+import time
+import zlib
+from pathlib import Path
+from typing import Any, BinaryIO, Callable, Iterator, Sequence
+
+from sqlalchemy import text
+from sqlalchemy.exc import SQLAlchemyError
+from sqlalchemy.orm import Session
+
+from .decoder import check_reading
+from .services import DB_REJECTED_REASON, persist_telemetry_rows, record_ingest_errors
+
+logger = logging.getLogger(__name__)
+
+_HEADER = struct.Struct("<II")
+_ROW = struct.Struct("<qdd")
+_SUFFIX = ".spool"
+
+
+def encode_record(row: dict[str, Any]) -> bytes:
+    """Frame one row; raises :class:`~app.decoder.PayloadError` if unstorable."""
+
+    check_reading(row["device_id"], row["ts"])
+    payload = _ROW.pack(row["ts"], row["temperature"], row["humidity"]) + row[
+        "device_id"
+    ].encode("utf-8")
+    return _HEADER.pack(len(payload), zlib.crc32(payload)) + payload
+
+
+def read_segment(path: Path, offset: int = 0) -> Iterator[tuple[dict[str, Any], int]]:
+    """Yield ``(row, offset after row)`` for each intact record from ``offset``."""
+
+    with open(path, "rb") as fh:
+        size = os.fstat(fh.fileno()).st_size
+        if size <= offset:
+            return
+        with mmap.mmap(fh.fileno(), 0, access=mmap.ACCESS_READ) as mm:
+            while offset + _HEADER.size <= size:
+                length, crc = _HEADER.unpack_from(mm, offset)
+                start = offset + _HEADER.size
+                end = start + length
+                if length < _ROW.size or end > size:
+                    break
+                if zlib.crc32(mm[start:end]) != crc:
+                    logger.warning("Spool %s: corrupt record at %d", path, offset)
+                    break
+                ts, temperature, humidity = _ROW.unpack_from(mm, start)
+                row = {
+                    "device_id": str(mm[start + _ROW.size : end], "utf-8"),
+                    "ts": ts,
+                    "temperature": temperature,
+                    "humidity": humidity,
+                }
+                offset = end
+                yield row, offset
+
+
+class Spool:
+    """Segmented append-only log plus the replayer that drains it."""
+
+    def __init__(
+        self,
+        directory: str | os.PathLike[str],
+        *,
+        session_factory: Callable[[], Session],
+        segment_bytes: int = 16 * 1024 * 1024,
+        max_bytes: int = 1024 * 1024 * 1024,
+        fsync_interval: float = 0.2,
+        replay_rate: float = 5000.0,
+        replay_batch: int = 500,
+        retry_interval: float = 5.0,
+    ) -> None:
+        self._dir = Path(directory)
+        self._dir.mkdir(parents=True, exist_ok=True)
+        self._session_factory = session_factory
+        self._segment_bytes = max(1, segment_bytes)
+        self._max_bytes = max_bytes
+        self._fsync_interval = fsync_interval
+        self._replay_rate = replay_rate
+        self._replay_batch = max(1, replay_batch)
+        self._retry_interval = retry_interval
+
+        self._lock = threading.Lock()
+        self._closed: list[Path] = sorted(self._dir.glob(f"*{_SUFFIX}"))
+        self._bytes = sum(p.stat().st_size for p in self._closed)
+        self._created = {p: p.stat().st_mtime for p in self._closed}
+        self._active: BinaryIO | None = None
+        self._active_path: Path | None = None
+        self._active_bytes = 0
+        self._seq = int(self._closed[-1].stem) + 1 if self._closed else 0
+        self._last_fsync = time.monotonic()
+        self._replay_offset = 0
+        # Leftovers from a previous run mean the database was down then.
+        self.healthy = not self._closed
+        self._stats = {
+            "appended_total": 0,
+            "replayed_total": 0,
+            "rejected_total": 0,
+            "dropped_total": 0,
+        }
+
+        self._stop = threading.Event()
+        self._thread: threading.Thread | None = None
+
+    # Writer side --------------------------------------------------------
+    def append(self, rows: Sequence[dict[str, Any]]) -> int:
+        """Spool ``rows``; returns how many fit under ``max_bytes``."""
+
+        records = [encode_record(row) for row in rows]
+        with self._lock:
+            accepted = 0
+            for record in records:
+                if self._max_bytes and self._bytes + len(record) > self._max_bytes:
+                    break
+                if self._active is None or self._active_bytes >= self._segment_bytes:
+                    self._rotate()
+                assert self._active is not None
+                self._active.write(record)
+                self._active_bytes += len(record)
+                self._bytes += len(record)
+                accepted += 1
+            if self._active is not None:
+                self._active.flush()
+                self._maybe_fsync()
+            self._stats["appended_total"] += accepted
+            self._stats["dropped_total"] += len(rows) - accepted
+        return accepted
+
+    def mark_unhealthy(self) -> None:
+        if self.healthy:
+            logger.warning("Database unavailable; spooling MQTT readings to disk")
+        self.healthy = False
+
+    def stats(self) -> dict[str, Any]:
+        with self._lock:
+            data = {f"spool_{k}": v for k, v in self._stats.items()}
+            segments = self._closed + ([self._active_path] if self._active else [])
+            oldest = min(self._created[p] for p in segments) if segments else None
+            data["spool_bytes"] = self._bytes
+            data["spool_segments"] = len(segments)
+        data["spool_oldest_age_seconds"] = (
+            max(0.0, time.time() - oldest) if oldest is not None else 0.0
+        )
+        data["spool_healthy"] = int(self.healthy)
+        return data
+
+    def _rotate(self) -> None:
+        """Close the active segment (if any) and open the next one."""
+
+        self._close_active()
+        path = self._dir / f"{self._seq:012d}{_SUFFIX}"
+        self._seq += 1
+        self._active = open(path, "ab")
+        self._active_path = path
+        self._active_bytes = 0
+        self._created[path] = time.time()
+
+    def _close_active(self) -> None:
+        if self._active is None:
+            return
+        self._active.flush()
+        os.fsync(self._active.fileno())
+        self._active.close()
+        assert self._active_path is not None
+        if self._active_bytes:
+            self._closed.append(self._active_path)
+        else:
+            self._active_path.unlink(missing_ok=True)
+            self._created.pop(self._active_path, None)
+        self._active = None
+        self._active_path = None
+        self._last_fsync = time.monotonic()
+
+    def _maybe_fsync(self) -> None:
+        if self._active is not None and (
+            time.monotonic() - self._last_fsync >= self._fsync_interval
+        ):
+            os.fsync(self._active.fileno())
+            self._last_fsync = time.monotonic()
+
+    # Replayer -----------------------------------------------------------
+    def start(self) -> None:
+        if self._thread is not None:
+            return
+        self._stop.clear()
+        self._thread = threading.Thread(
+            target=self._run, name="spool-replayer", daemon=True
+        )
+        self._thread.start()
+
+    def stop(self) -> None:
+        self._stop.set()
+        if self._thread is not None:
+            self._thread.join(timeout=10)
+            self._thread = None
+        with self._lock:
+            self._close_active()
+
+    def replay(self) -> int:
+        """Drain every closed segment once the database answers.
+
+        The active segment is closed first so it is drained too. Returns the
+        number of rows replayed; stops at the first connection-level error.
+        """
+
+        if not self._probe():
+            self.mark_unhealthy()
+            return 0
+        if not self.healthy:
+            logger.info("Database reachable again; replaying spooled readings")
+        self.healthy = True
+        with self._lock:
+            self._close_active()
+            segments = list(self._closed)
+
+        total = 0
+        for path in segments:
+            written = self._replay_segment(path)
+            if written is None:
+                break
+            total += written
+        return total
+
+    def _replay_segment(self, path: Path) -> int | None:
+        batch: list[dict[str, Any]] = []
+        offset = self._replay_offset
+        written = 0
+        started = time.monotonic()
+        for row, next_offset in read_segment(path, self._replay_offset):
+            batch.append(row)
+            offset = next_offset
+            if len(batch) >= self._replay_batch:
+                replayed = self._write(batch, offset)
+                if replayed is None:
+                    return None
+                written += replayed
+                batch = []
+                self._throttle(written, started)
+        if batch:
+            replayed = self._write(batch, offset)
+            if replayed is None:
+                return None
+            written += replayed
+
+        with self._lock:
+            self._bytes -= path.stat().st_size
+            self._closed.remove(path)
+            self._created.pop(path, None)
+            self._replay_offset = 0
+        path.unlink(missing_ok=True)
+        return written
+
+    def _write(self, rows: list[dict[str, Any]], offset: int) -> int | None:
+        try:
+            with self._session_factory() as db:
+                _, rejected = persist_telemetry_rows(db, rows, source="spool")
+        except SQLAlchemyError:
+            logger.exception("Spool replay failed; will retry")
+            self.mark_unhealthy()
+            return None
+        if rejected:
+            record_ingest_errors(
+                [(DB_REJECTED_REASON, row["device_id"]) for row in rejected],
+                source="spool",
+            )
+        with self._lock:
+            self._replay_offset = offset
+            self._stats["replayed_total"] += len(rows) - len(rejected)
+            self._stats["rejected_total"] += len(rejected)
+        return len(rows) - len(rejected)
+
+    def _throttle(self, written: int, started: float) -> None:
+        if self._replay_rate > 0:
+            ahead = written / self._replay_rate - (time.monotonic() - started)
+            if ahead > 0:
+                self._stop.wait(ahead)
+
+    def _probe(self) -> bool:
+        try:
+            with self._session_factory() as db:
+                db.execute(text("SELECT 1"))
+        except SQLAlchemyError:
+            return False
+        return True
+
+    def _pending(self) -> bool:
+        with self._lock:
+            return bool(self._closed) or self._active_bytes > 0
+
+    def _run(self) -> None:
+        while not self._stop.is_set():
+            with self._lock:
+                self._maybe_fsync()
+            if self._pending():
+                try:
+                    self.replay()
+                except Exception:  # pragma: no cover - keep the loop alive
+                    logger.exception("Spool replay crashed")
+            self._stop.wait(
+                self._retry_interval if not self.healthy else self._fsync_interval
+            )
@@ -0,0 +1,119 @@
+"""Startup timing and the background warm-up behind ``/readyz``.
+
+The API starts serving as soon as its routes are imported. Everything that
+needs the database (schema check, MQTT ingest, cache warm-up, presence
+resume) runs as named steps on a :class:`Warmup` thread, which retries a step
+until the database answers instead of failing the process. Each phase's
+duration is collected by a :class:`StartupTimer` and logged as one line.
+"""
+
+from __future__ import annotations
+
+import logging
+import threading
+import time
+from typing import Any, Callable, Sequence
+
+from sqlalchemy.exc import SQLAlchemyError
+
+from . import STARTED
+
+logger = logging.getLogger(__name__)
+
+
+class StartupTimer:
+    """Named phase durations measured from a common starting point.
+
+    ``started`` is a ``time.perf_counter()`` value; it defaults to now.
+    """
+
+    def __init__(self, started: float | None = None) -> None:
+        self._started = time.perf_counter() if started is None else started
+        self._last = self._started
+        self._lock = threading.Lock()
+        self.phases: dict[str, float] = {}
+
+    def mark(self, name: str) -> None:
+        """Record the time since the previous mark as phase ``name``."""
+
+        now = time.perf_counter()
+        with self._lock:
+            self.phases[name] = now - self._last
+            self._last = now
+
+    def record(self, name: str, seconds: float) -> None:
+        with self._lock:
+            self.phases[name] = seconds
+
+    def log(self, what: str) -> None:
+        with self._lock:
+            total = time.perf_counter() - self._started
+            phases = ", ".join(f"{k}={v * 1000:.0f}ms" for k, v in self.phases.items())
+        logger.info("%s after %.0f ms (%s)", what, total * 1000, phases)
+
+
+class Warmup:
+    """Run startup steps in order on a background thread.
+
+    A step that raises :class:`~sqlalchemy.exc.SQLAlchemyError` is retried
+    every ``retry_interval`` seconds; any other error is logged and the step
+    skipped. :attr:`done` is set once every step has run.
+    """
+
+    def __init__(
+        self,
+        steps: Sequence[tuple[str, Callable[[], Any]]],
+        timer: StartupTimer,
+        retry_interval: float = 2.0,
+    ) -> None:
+        self._steps = list(steps)
+        self._timer = timer
+        self._retry_interval = retry_interval
+        self.done = threading.Event()
+        self._stop = threading.Event()
+        self._thread: threading.Thread | None = None
+
+    def start(self) -> None:
+        if self._thread is not None:
+            return
+        self.done.clear()
+        self._stop.clear()
+        self._thread = threading.Thread(target=self._run, name="warmup", daemon=True)
+        self._thread.start()
+
+    def stop(self) -> None:
+        self._stop.set()
+        if self._thread is not None:
+            self._thread.join(timeout=10)
+            self._thread = None
+
+    def _run(self) -> None:
+        for name, step in self._steps:
+            if not self._run_step(name, step):
+                return
+        self.done.set()
+        self._timer.log("Warm-up finished")
+
+    def _run_step(self, name: str, step: Callable[[], Any]) -> bool:
+        started = time.perf_counter()
+        while not self._stop.is_set():
+            try:
+                step()
+            except SQLAlchemyError as exc:
+                logger.warning(
+                    "Startup step %s failed (%s); retrying in %.0fs",
+                    name,
+                    exc.__class__.__name__,
+                    self._retry_interval,
+                )
+                self._stop.wait(self._retry_interval)
+                continue
+            except Exception:
+                logger.exception("Startup step %s failed; skipped", name)
+            self._timer.record(name, time.perf_counter() - started)
+            return True
+        return False
+
+
+# Measured from the first import of the ``app`` package, before any app module.
+startup_timer = StartupTimer(STARTED)
@@ -0,0 +1,13 @@
+"""Timestamp helpers shared by the API and the push stream."""
+
+from __future__ import annotations
+
+from datetime import datetime, timezone
+
+
+def to_iso(ts: int) -> str:
+    """Format epoch seconds as an ISO-8601 UTC string with a ``Z`` suffix."""
+
+    return (
+        datetime.fromtimestamp(ts, tz=timezone.utc).isoformat().replace("+00:00", "Z")
+    )
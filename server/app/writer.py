@@ -0,0 +1,239 @@
+"""Batched telemetry writer stage for the MQTT ingest path."""
+
+from __future__ import annotations
+
+import logging
+import queue
+import threading
+import time
+from collections import Counter
+from typing import Any, Callable, Literal
+
+from sqlalchemy.exc import SQLAlchemyError
+from sqlalchemy.orm import Session
+
+from .decoder import PayloadError, check_reading
+from .prometheus import ingest_seconds
+from .services import DB_REJECTED_REASON, persist_telemetry_rows, record_ingest_errors
+from .spool import Spool
+
+logger = logging.getLogger(__name__)
+
+Backpressure = Literal["block", "drop"]
+
+_STOP = object()
+
+QUEUE_FULL_REASON = "ingest queue full; reading dropped"
+SPOOL_FULL_REASON = "spool full; reading dropped"
+DB_ERROR_REASON = "database error during MQTT ingest"
+
+
+class TelemetryWriter:
+    """Drain a bounded queue of readings and flush them in bulk.
+
+    Producers call :meth:`submit` with row mappings; one or more writer threads
+    collect rows until ``flush_size`` rows are pending or ``flush_interval``
+    seconds have elapsed since the first pending row, then write them with a
+    single multi-row INSERT. When the queue is full, ``backpressure="block"``
+    makes the producer wait while ``"drop"`` discards the reading and records
+    an ingest error for it from the writer thread.
+
+    With a ``spool``, rows that cannot be written because the database is
+    failing go to disk instead of being dropped, and the spool's replayer
+    runs alongside the writer threads.
+    """
+
+    def __init__(
+        self,
+        *,
+        session_factory: Callable[[], Session],
+        queue_size: int = 10000,
+        flush_size: int = 500,
+        flush_interval: float = 0.2,
+        threads: int = 1,
+        backpressure: Backpressure = "block",
+        spool: Spool | None = None,
+    ) -> None:
+        self._session_factory = session_factory
+        self._spool = spool
+        self._queue: queue.Queue[Any] = queue.Queue(maxsize=max(1, queue_size))
+        self._flush_size = max(1, flush_size)
+        self._flush_interval = max(0.0, flush_interval)
+        self._thread_count = max(1, threads)
+        self._backpressure = backpressure
+        self._threads: list[threading.Thread] = []
+        self._lock = threading.Lock()
+        self._dropped: Counter[str | None] = Counter()
+        self._stats = {
+            "dropped_total": 0,
+            "flushed_total": 0,
+            "flush_errors_total": 0,
+            "last_flush_size": 0,
+            "last_flush_seconds": 0.0,
+            "max_flush_seconds": 0.0,
+        }
+
+    # Lifecycle ----------------------------------------------------------
+    def start(self) -> None:
+        with self._lock:
+            if self._threads:
+                return
+            for idx in range(self._thread_count):
+                thread = threading.Thread(
+                    target=self._run, name=f"telemetry-writer-{idx}", daemon=True
+                )
+                thread.start()
+                self._threads.append(thread)
+            if self._spool is not None:
+                self._spool.start()
+
+    def stop(self, timeout: float | None = 10.0) -> None:
+        """Flush everything queued so far and join the writer threads."""
+
+        with self._lock:
+            threads, self._threads = self._threads, []
+        for _ in threads:
+            self._queue.put(_STOP)
+        for thread in threads:
+            thread.join(timeout)
+        if self._spool is not None:
+            self._spool.stop()
+
+    @property
+    def running(self) -> bool:
+        return bool(self._threads)
+
+    # Producer side ------------------------------------------------------
+    def submit(self, row: dict[str, Any], received_at: float | None = None) -> bool:
+        """Enqueue a reading; return ``False`` when it was dropped.
+
+        ``received_at`` is the ``time.perf_counter()`` value at which the
+        reading arrived, used for the end-to-end ingest latency histogram.
+        """
+
+        item = (row, time.perf_counter() if received_at is None else received_at)
+        if self._backpressure == "block":
+            self._queue.put(item)
+            return True
+        try:
+            self._queue.put_nowait(item)
+        except queue.Full:
+            with self._lock:
+                self._dropped[row.get("device_id")] += 1
+                self._stats["dropped_total"] += 1
+            return False
+        return True
+
+    def stats(self) -> dict[str, Any]:
+        with self._lock:
+            data = dict(self._stats)
+        data["queue_depth"] = self._queue.qsize()
+        data["queue_capacity"] = self._queue.maxsize
+        if self._spool is not None:
+            data.update(self._spool.stats())
+        return data
+
+    # Writer side --------------------------------------------------------
+    def _run(self) -> None:
+        batch: list[tuple[dict[str, Any], float]] = []
+        deadline = 0.0
+        while True:
+            timeout = None if not batch else max(0.0, deadline - time.monotonic())
+            try:
+                item = self._queue.get(timeout=timeout)
+            except queue.Empty:
+                item = None
+
+            if item is _STOP:
+                self._flush_safely(batch)
+                return
+            if item is not None:
+                if not batch:
+                    deadline = time.monotonic() + self._flush_interval
+                batch.append(item)
+
+            if len(batch) >= self._flush_size or (
+                batch and time.monotonic() >= deadline
+            ):
+                self._flush_safely(batch)
+                batch = []
+
+    def _flush_safely(self, batch: list[tuple[dict[str, Any], float]]) -> None:
+        # Nothing may end a writer thread: with blocking backpressure the MQTT
+        # callback would wait on the full queue forever.
+        try:
+            self._flush(batch)
+        except Exception:
+            logger.exception("Telemetry flush failed; %d reading(s) lost", len(batch))
+            with self._lock:
+                self._stats["flush_errors_total"] += 1
+
+    def _flush(self, batch: list[tuple[dict[str, Any], float]]) -> None:
+        drops = self._take_drops()
+        if not batch and not drops:
+            return
+
+        rows = [row for row, _ in batch]
+        written = 0
+        started = time.perf_counter()
+        if rows and self._spool is not None and not self._spool.healthy:
+            # Don't wait on a database known to be down.
+            drops.extend(self._to_spool(rows))
+            rows = []
+        if rows:
+            try:
+                with self._session_factory() as db:
+                    written, rejected = persist_telemetry_rows(db, rows, source="mqtt")
+            except SQLAlchemyError as exc:
+                logger.exception("Failed to persist telemetry batch: %s", exc)
+                with self._lock:
+                    self._stats["flush_errors_total"] += 1
+                if self._spool is not None:
+                    self._spool.mark_unhealthy()
+                    drops.extend(self._to_spool(rows))
+                else:
+                    drops.extend((DB_ERROR_REASON, row["device_id"]) for row in rows)
+            else:
+                drops.extend((DB_REJECTED_REASON, row["device_id"]) for row in rejected)
+                done = time.perf_counter()
+                for _, received_at in batch:
+                    ingest_seconds.observe(done - received_at, "mqtt")
+        if drops:
+            record_ingest_errors(drops, source="mqtt")
+        elapsed = time.perf_counter() - started
+
+        with self._lock:
+            self._stats["flushed_total"] += written
+            self._stats["last_flush_size"] = len(batch)
+            self._stats["last_flush_seconds"] = elapsed
+            self._stats["max_flush_seconds"] = max(
+                self._stats["max_flush_seconds"], elapsed
+            )
+
+    def _to_spool(self, rows: list[dict[str, Any]]) -> list[tuple[str, str | None]]:
+        """Spool ``rows``; returns errors for those that are invalid or did not fit."""
+
+        assert self._spool is not None
+        errors: list[tuple[str, str | None]] = []
+        spoolable = []
+        for row in rows:
+            try:
+                check_reading(row["device_id"], row["ts"])
+            except PayloadError as exc:
+                errors.append((exc.reason, exc.device_id))
+            else:
+                spoolable.append(row)
+        accepted = self._spool.append(spoolable)
+        errors.extend(
+            (SPOOL_FULL_REASON, row["device_id"]) for row in spoolable[accepted:]
+        )
+        return errors
+
+    def _take_drops(self) -> list[tuple[str, str | None]]:
+        with self._lock:
+            dropped, self._dropped = self._dropped, Counter()
+        return [
+            (QUEUE_FULL_REASON, device_id)
+            for device_id, count in dropped.items()
+            for _ in range(count)
+        ]
@@ -11,13 +11,15 @@ from sqlalchemy.pool import StaticPool
 from fastapi.testclient import TestClient
 
 os.environ.setdefault("MQTT_ENABLED", "0")
+# Most tests exercise the opt-in unique (device_id, ts) key.
+os.environ.setdefault("INGEST_DEDUP", "ignore")
 
 ROOT = Path(__file__).resolve().parents[1]
 if str(ROOT) not in sys.path:
     sys.path.insert(0, str(ROOT))
 
-from app.main import app
-from app.db import Base, get_db
+from app.main import app, warmup
+from app.db import Base, SessionLocal, engine as app_engine, get_db, get_read_db
 from alembic import command
 from alembic.config import Config as AlembicConfig
 
@@ -63,6 +65,7 @@ def migrated_engine():
             return
     else:
         engine = create_engine(base)
+        Base.metadata.create_all(engine)
         try:
             yield engine
         finally:
@@ -77,11 +80,15 @@ def migrated_engine():
 
 
 @pytest.fixture()
-def db_session(migrated_engine):
-    TestingSessionLocal = sessionmaker(
-        bind=migrated_engine, autoflush=False, autocommit=False
-    )
-    sess = TestingSessionLocal()
+def session_factory(migrated_engine):
+    # Background services (error sink, presence) use the app's SessionLocal.
+    SessionLocal.configure(bind=migrated_engine)
+    return sessionmaker(bind=migrated_engine, autoflush=False, autocommit=False)
+
+
+@pytest.fixture()
+def db_session(session_factory):
+    sess = session_factory()
     try:
         yield sess
     finally:
@@ -97,6 +104,16 @@ def client(db_session):
             pass
 
     app.dependency_overrides[get_db] = _get_db_override
+    app.dependency_overrides[get_read_db] = _get_db_override
+    # The warm-up retries an unreachable database forever; fail fast instead.
+    try:
+        with app_engine.connect() as conn:
+            conn.execute(text("SELECT 1"))
+    except OperationalError as exc:
+        pytest.fail(f"app database {app_engine.url!r} is unreachable: {exc}")
     with TestClient(app) as c:
+        # Let the background warm-up finish before it races the test's writes.
+        if not warmup.done.wait(10):
+            pytest.fail("app warm-up did not finish within 10s")
         yield c
     app.dependency_overrides.clear()
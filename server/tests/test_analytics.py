@@ -0,0 +1,68 @@
+import time
+
+import numpy as np
+
+from app.analytics import Columns, Thresholds, summarize, summary_cache
+
+
+def test_summarize_is_per_device():
+    columns = Columns(
+        np.array(["a", "a", "a", "b"], dtype=object),
+        np.array([0, 1800, 3600, 100], dtype=np.int64),
+        np.array([10.0, 20.0, 12.0, 99.0]),
+        np.array([40.0, 40.0, 40.0, 50.0]),
+    )
+    a, b = summarize(columns, Thresholds(0, 15, 0, 100))
+
+    assert a["deviceId"] == "a" and a["count"] == 3
+    assert a["temperature"]["mean"] == 14.0
+    assert a["temperature"]["p50"] == 12.0
+    assert a["temperature"]["min"] == 10.0 and a["temperature"]["max"] == 20.0
+    assert a["temperature"]["outOfRange"] == 1
+    assert a["temperature"]["trendPerHour"] == 2.0
+    assert a["temperature"]["maxStepPerHour"] == 20.0
+    assert a["humidity"]["std"] == 0.0
+    assert b["count"] == 1 and b["temperature"]["std"] == 0.0
+    assert b["temperature"]["trendPerHour"] is None
+    assert b["temperature"]["outOfRange"] == 1
+
+
+def test_analytics_summary_endpoint_caches_per_bucket(client):
+    summary_cache.invalidate()
+    now = int(time.time())
+    rows = [
+        {
+            "deviceId": "esp32-analytics",
+            "ts": now - 600 + i,
+            "temperature": 20 + i,
+            "humidity": 50,
+        }
+        for i in range(5)
+    ]
+    client.post("/ingest/batch", json=rows)
+
+    first = client.get("/analytics/summary", params={"window": 3600, "bucket": 1})
+    assert first.status_code == 200
+    device = next(
+        d for d in first.json()["devices"] if d["deviceId"] == "esp32-analytics"
+    )
+    assert device["count"] == 5 and device["temperature"]["mean"] == 22.0
+
+    # A day-long bucket keeps the window (and cache key) fixed for the test.
+    params = {"window": 7 * 86400, "bucket": 86400}
+    cached = client.get("/analytics/summary", params=params).json()
+    client.post(
+        "/ingest",
+        json={
+            "deviceId": "esp32-analytics",
+            "ts": now - 90000,
+            "temperature": 1,
+            "humidity": 1,
+        },
+    )
+    assert client.get("/analytics/summary", params=params).json() == cached
+
+
+def test_analytics_summary_rejects_oversized_window(client):
+    resp = client.get("/analytics/summary", params={"window": 10**9})
+    assert resp.status_code == 400
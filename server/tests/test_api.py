@@ -2,6 +2,8 @@ from datetime import datetime, timedelta, timezone
 
 from sqlalchemy import text
 
+from app.errorsink import error_sink
+from app.latest import LatestCache, LatestReading, latest_cache
 from app.services import record_ingest_error
 
 
@@ -13,22 +15,16 @@ def test_status_endpoint_handles_missing_device(client):
 
 def test_errors_endpoint_returns_recent_entries(client, db_session):
     now = int(datetime.now(tz=timezone.utc).timestamp())
-    older = record_ingest_error(
-        db_session,
-        reason="wifi reconnect",
-        device_id="esp32-err",
-    )
+    record_ingest_error(reason="wifi reconnect", device_id="esp32-err")
+    error_sink.flush()
     db_session.execute(
-        text("UPDATE errors SET ts=:ts WHERE id=:id"),
-        {"ts": now - 600, "id": older.id},
+        text("UPDATE errors SET ts=:ts, last_ts=:ts WHERE device_id=:d"),
+        {"ts": now - 600, "d": "esp32-err"},
     )
     db_session.commit()
 
-    record_ingest_error(
-        db_session,
-        reason="sensor timeout",
-        device_id="esp32-err",
-    )
+    record_ingest_error(reason="sensor timeout", device_id="esp32-err")
+    error_sink.flush()
 
     resp = client.get("/errors", params={"deviceId": "esp32-err"})
     assert resp.status_code == 200
@@ -36,6 +32,48 @@ def test_errors_endpoint_returns_recent_entries(client, db_session):
     assert body[0]["msg"] == "sensor timeout"
     assert body[0]["id"]
     assert body[0]["ts"].endswith("Z")
+    assert body[0]["count"] == 1
+
+
+def test_errors_since_and_etag(client):
+    record_ingest_error(reason="first", device_id="esp32-err-since")
+    error_sink.flush()
+    params = {"deviceId": "esp32-err-since"}
+    first = client.get("/errors", params=params)
+    cursor = first.json()[0]["ts"]
+    etag = first.headers["etag"]
+
+    assert client.get("/errors", params={**params, "since": cursor}).json() == []
+    cached = client.get("/errors", params=params, headers={"If-None-Match": etag})
+    assert cached.status_code == 304
+
+    # A repeat bumps the coalesced row, which changes the tag.
+    record_ingest_error(reason="first", device_id="esp32-err-since")
+    error_sink.flush()
+    bumped = client.get("/errors", params=params, headers={"If-None-Match": etag})
+    assert bumped.status_code == 200 and bumped.json()[0]["count"] == 2
+
+
+def test_latest_since_and_etag(client):
+    device_id = "esp32-latest-since"
+    ts = int(datetime.now(tz=timezone.utc).timestamp())
+    client.post(
+        "/ingest",
+        json={"deviceId": device_id, "ts": ts, "temperature": 21, "humidity": 40},
+    )
+
+    resp = client.get("/latest", params={"deviceId": device_id})
+    assert resp.status_code == 200
+    headers = {"If-None-Match": resp.headers["etag"]}
+    cached = client.get("/latest", params={"deviceId": device_id}, headers=headers)
+    assert cached.status_code == 304
+
+    params = {"deviceId": device_id, "since": ts}
+    assert client.get("/latest", params=params).status_code == 204
+    params = {"deviceIds": f"{device_id},missing", "since": ts - 1}
+    assert [r["deviceId"] for r in client.get("/latest", params=params).json()] == [
+        device_id
+    ]
 
 
 def test_status_becomes_offline_when_stale(client):
@@ -56,3 +94,68 @@ def test_status_becomes_offline_when_stale(client):
     data = resp.json()
     assert data["online"] is False
     assert data["updatedAt"].endswith("Z")
+
+
+def test_latest_and_status_are_served_from_cache(client, db_session):
+    device_id = "esp32-cached"
+    ts = int(datetime.now(tz=timezone.utc).timestamp())
+    client.post(
+        "/ingest",
+        json={"deviceId": device_id, "ts": ts, "temperature": 25.5, "humidity": 55},
+    )
+
+    # Rows removed behind the cache's back are still reported from memory.
+    db_session.execute(
+        text("DELETE FROM telemetry WHERE device_id=:d"), {"d": device_id}
+    )
+    db_session.commit()
+
+    latest = client.get("/latest", params={"deviceId": device_id}).json()
+    assert latest["temp"] == 25.5 and latest["online"] is True
+    status = client.get("/status", params={"deviceId": device_id}).json()
+    assert status == {"id": device_id, "online": True, "updatedAt": latest["ts"]}
+
+    latest_cache.invalidate(device_id)
+    assert client.get("/latest", params={"deviceId": device_id}).status_code == 404
+
+
+def test_latest_cache_never_moves_backwards():
+    cache = LatestCache(ttl=0)
+    cache.update_many(
+        [
+            {"device_id": "d", "ts": 5, "temperature": 1.0, "humidity": 1.0},
+            {"device_id": "d", "ts": 7, "temperature": 2.0, "humidity": 2.0},
+        ]
+    )
+    cache.update("d", 6, 3.0, 3.0)
+    assert cache.peek("d") == (True, LatestReading(7, 2.0, 2.0))
+
+
+def test_fleet_status_seeds_misses_in_one_query(client):
+    now = int(datetime.now(tz=timezone.utc).timestamp())
+    for device_id, ts in (("esp32-fleet-on", now), ("esp32-fleet-off", now - 3600)):
+        for offset in (2, 0):
+            client.post(
+                "/ingest",
+                json={
+                    "deviceId": device_id,
+                    "ts": ts - offset,
+                    "temperature": 20 + offset,
+                    "humidity": 50,
+                },
+            )
+    latest_cache.invalidate()
+
+    ids = "esp32-fleet-on,esp32-fleet-off,esp32-fleet-none"
+    fleet = client.get("/fleet/status", params={"deviceIds": ids}).json()
+    assert [(d["deviceId"], d["online"], d["temperature"]) for d in fleet] == [
+        ("esp32-fleet-on", True, 20),
+        ("esp32-fleet-off", False, 20),
+        ("esp32-fleet-none", False, None),
+    ]
+    offline = client.get("/fleet/status", params={"online": "false"}).json()
+    assert "esp32-fleet-off" in {d["deviceId"] for d in offline}
+    assert "esp32-fleet-on" not in {d["deviceId"] for d in offline}
+
+    latest = client.get("/latest", params={"deviceIds": ids}).json()
+    assert [d["deviceId"] for d in latest] == ["esp32-fleet-on", "esp32-fleet-off"]
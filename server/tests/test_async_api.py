@@ -0,0 +1,68 @@
+import pytest
+from fastapi import FastAPI
+from fastapi.testclient import TestClient
+from sqlalchemy.ext.asyncio import async_sessionmaker, create_async_engine
+
+from app.api_async import router
+from app.db import async_url, get_async_read_db
+
+
+@pytest.fixture()
+def async_client(migrated_engine):
+    if migrated_engine.url.database in (None, "", ":memory:"):
+        pytest.skip("in-memory SQLite cannot be shared with an async engine")
+    engine = create_async_engine(
+        async_url(migrated_engine.url.render_as_string(hide_password=False))
+    )
+    sessions = async_sessionmaker(engine, expire_on_commit=False)
+
+    async def _get_async_db_override():
+        async with sessions() as db:
+            yield db
+
+    app = FastAPI()
+    app.include_router(router)
+    app.dependency_overrides[get_async_read_db] = _get_async_db_override
+    with TestClient(app) as c:
+        yield c
+
+
+def test_async_url_maps_drivers():
+    assert async_url("sqlite:///./x.db") == "sqlite+aiosqlite:///./x.db"
+    assert (
+        async_url("postgresql://dev:pw@db/iot") == "postgresql+psycopg://dev:pw@db/iot"
+    )
+
+
+def test_async_read_endpoints_match_sync_payloads(client, async_client):
+    device_id = "esp32-async"
+    rows = [
+        {"deviceId": device_id, "ts": 500 + i, "temperature": 20 + i, "humidity": 40}
+        for i in range(5)
+    ]
+    client.post("/ingest/batch", json=rows)
+
+    for path, params in (
+        ("/latest", {"deviceId": device_id}),
+        ("/status", {"deviceId": device_id}),
+        ("/latest", {"deviceIds": f"{device_id},missing"}),
+        ("/fleet/status", {"deviceIds": f"{device_id},missing"}),
+        ("/metrics", {"deviceId": device_id}),
+        ("/metrics", {"deviceId": device_id, "since": 502}),
+        ("/metrics", {"deviceId": device_id, "from": 500, "to": 504, "bucket": 2}),
+        (
+            "/metrics",
+            {
+                "deviceId": device_id,
+                "from": 500,
+                "maxPoints": 3,
+                "mode": "lttb",
+                "to": 504,
+            },
+        ),
+        ("/errors", {"deviceId": device_id}),
+    ):
+        sync_resp = client.get(path, params=params)
+        async_resp = async_client.get(path, params=params)
+        assert async_resp.json() == sync_resp.json()
+        assert async_resp.headers.get("etag") == sync_resp.headers.get("etag")
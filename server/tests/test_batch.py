@@ -0,0 +1,94 @@
+import json
+
+from sqlalchemy import select
+from sqlalchemy.exc import IntegrityError
+
+from app import services
+from app.errorsink import error_sink
+from app.models import IngestError, Telemetry
+
+
+def test_batch_ingest_json_array_reports_rejects(client, db_session):
+    rows = [
+        {"deviceId": "esp32-batch", "ts": 10, "temperature": 20.0, "humidity": 50},
+        {"deviceId": "esp32-batch", "ts": "later", "temperature": 20.0},
+        {"deviceId": "esp32-batch", "ts": 11, "temperature": 21.0, "humidity": 51},
+    ]
+    resp = client.post("/ingest/batch", json=rows)
+    assert resp.status_code == 200
+    body = resp.json()
+    assert body["ok"] is False
+    assert body["accepted"] == 2
+    assert [r["index"] for r in body["rejected"]] == [1]
+
+    stored = db_session.execute(
+        select(Telemetry.ts).where(Telemetry.device_id == "esp32-batch")
+    ).scalars()
+    assert sorted(stored) == [10, 11]
+    error_sink.flush()
+    reasons = (
+        db_session.execute(
+            select(IngestError.reason).where(IngestError.device_id == "esp32-batch")
+        )
+        .scalars()
+        .all()
+    )
+    assert len(reasons) == 1
+    assert reasons[0].startswith("batch row 1: ")
+
+
+def test_batch_ingest_ndjson_stream(client, db_session):
+    lines = [
+        json.dumps(
+            {"deviceId": "esp32-ndjson", "ts": ts, "temperature": 1, "humidity": 2}
+        )
+        for ts in range(5)
+    ]
+    payload = ("\n".join(lines) + "\nnot json\n").encode()
+    resp = client.post(
+        "/ingest/batch",
+        content=payload,
+        headers={"Content-Type": "application/x-ndjson"},
+    )
+    assert resp.status_code == 200
+    body = resp.json()
+    assert body["accepted"] == 5
+    assert [r["index"] for r in body["rejected"]] == [5]
+
+
+def test_batch_ingest_rejects_non_array(client):
+    resp = client.post("/ingest/batch", json={"deviceId": "x"})
+    assert resp.status_code == 400
+
+
+def test_batch_ingest_rejects_unstorable_rows_individually(
+    client, db_session, monkeypatch
+):
+    persist = services.persist_telemetry_batch
+
+    def refuse_ts_13(db, rows, source="http"):
+        if any(row["ts"] == 13 for row in rows):
+            raise IntegrityError("INSERT", None, Exception("rejected"))
+        return persist(db, rows, source)
+
+    monkeypatch.setattr(services, "persist_telemetry_batch", refuse_ts_13)
+    row = {"deviceId": "esp32-limits", "temperature": 1, "humidity": 2}
+    rows = [
+        dict(row, ts=12),
+        dict(row, ts=2**70),
+        dict(row, deviceId="x" * 101, ts=12),
+        dict(row, ts=13),
+        dict(row, ts=14),
+    ]
+    resp = client.post("/ingest/batch", json=rows)
+    body = resp.json()
+    assert body["accepted"] == 2 and body["duplicates"] == 0
+    assert [r["index"] for r in body["rejected"]] == [1, 2, 3]
+    assert body["rejected"][0]["error"].startswith("ts: ")
+    assert body["rejected"][1]["error"].startswith("deviceId: ")
+    assert body["rejected"][2]["error"] == services.DB_REJECTED_REASON
+
+    stored = db_session.execute(
+        select(Telemetry.ts).where(Telemetry.device_id == "esp32-limits")
+    ).scalars()
+    assert sorted(stored) == [12, 14]
@@ -0,0 +1,31 @@
+from sqlalchemy import func, select
+
+from app.bench import bench_http_ingest, bench_mqtt_ingest, bench_reads, percentile
+from app.models import Telemetry
+
+
+def test_percentile_uses_nearest_rank():
+    values = [float(v) for v in range(1, 101)]
+    assert percentile(values, 50) == 50.0
+    assert percentile(values, 99) == 99.0
+    assert percentile([], 95) == 0.0
+
+
+def test_bench_scenarios_report_throughput_and_percentiles(
+    client, session_factory, db_session
+):
+    # The test client shares one session, so HTTP scenarios run single-threaded.
+    ingest = bench_http_ingest(client, devices=2, total=10, concurrency=1)
+    mqtt = bench_mqtt_ingest(session_factory, devices=2, total=10, concurrency=2)
+    reads = bench_reads(client, "/latest", devices=2, total=6, concurrency=1)
+
+    assert ingest["requests"] == 10 and ingest["errors"] == 0
+    assert mqtt["errors"] == 0 and mqtt["drained_throughput"] > 0
+    assert reads["errors"] == 0
+    assert set(reads["latency_ms"]) == {"p50", "p95", "p99", "max"}
+    written = db_session.execute(
+        select(func.count())
+        .select_from(Telemetry)
+        .where(Telemetry.device_id.like("bench-%"))
+    ).scalar_one()
+    assert written == 20
@@ -0,0 +1,82 @@
+import time
+
+import pytest
+
+from app.decoder import (
+    JSON_BACKEND,
+    PayloadError,
+    Reading,
+    decode_binary,
+    decode_json,
+    encode_binary,
+)
+
+
+def test_decode_json_parses_bytes_into_reading():
+    reading = decode_json(
+        b'{"device_id":"esp32-dec","ts":1700000000123,"temperature":"21.5","humidity":40}'
+    )
+    assert reading == Reading("esp32-dec", 1700000000, 21.5, 40.0)
+    assert (
+        decode_json(
+            b'{"deviceId":"d","ts":"2024-01-01T00:00:00Z","temperature":1,"humidity":2}'
+        ).ts
+        == 1704067200
+    )
+
+
+@pytest.mark.parametrize(
+    ("payload", "reason", "device_id"),
+    [
+        (b"\xff\xfe", "non-utf8 payload", None),
+        (b"{not json", "invalid JSON payload", None),
+        (b"[1, 2]", "invalid JSON payload", None),
+        (b'{"ts": 1}', "missing or invalid deviceId", None),
+        (b'{"deviceId":"d","ts":"soon","temperature":1,"humidity":1}', None, "d"),
+        (
+            b'{"deviceId":"d","ts":"%s","temperature":1,"humidity":1}' % (b"9" * 25),
+            "timestamp out of range",
+            "d",
+        ),
+        (
+            b'{"deviceId":"%s","ts":1,"temperature":1,"humidity":1}' % (b"x" * 101),
+            "deviceId too long",
+            "x" * 100,
+        ),
+    ],
+)
+def test_decode_json_reports_reasons(payload, reason, device_id):
+    with pytest.raises(PayloadError) as info:
+        decode_json(payload)
+    if reason is not None:
+        assert info.value.reason == reason
+    assert info.value.device_id == device_id
+
+
+def test_binary_payload_round_trips_multiple_samples():
+    payload = encode_binary("esp32-bin", [(1000, 21.57, 40.1), (1002, -5.5, 99.99)])
+    assert len(payload) == 2 + 9 + 2 + 2 * 8
+    assert decode_binary(payload) == [
+        Reading("esp32-bin", 1000, 21.57, 40.1),
+        Reading("esp32-bin", 1002, -5.5, 99.99),
+    ]
+
+    with pytest.raises(PayloadError, match="version"):
+        decode_binary(b"\x02" + payload[1:])
+    with pytest.raises(PayloadError, match="length") as info:
+        decode_binary(payload[:-1])
+    assert info.value.device_id == "esp32-bin"
+
+
+def test_decode_json_parse_cost_per_message():
+    payload = (
+        b'{"deviceId":"esp32-01","ts":1700000000,"temperature":21.5,"humidity":40.25}'
+    )
+    count = 20000
+    started = time.perf_counter()
+    for _ in range(count):
+        decode_json(payload)
+    per_message_us = (time.perf_counter() - started) / count * 1e6
+    print(f"decode_json[{JSON_BACKEND}]: {per_message_us:.2f} us/message")
+    # Loose bound so slow CI machines pass; typical cost is a few microseconds.
+    assert per_message_us < 200
@@ -0,0 +1,115 @@
+import pytest
+from sqlalchemy import create_engine, inspect, select, text
+from sqlalchemy.orm import sessionmaker
+from sqlalchemy.pool import StaticPool
+
+from app import services
+from app.dedup import (
+    PLAIN_INDEX,
+    UNIQUE_INDEX,
+    RecentKeys,
+    disable_unique_key,
+    enable_unique_key,
+)
+from app.db import Base
+from app.models import Telemetry, Telemetry1m
+from app.prometheus import ingest_duplicates
+from app.settings import settings
+
+
+def _reading(ts, temperature=20.0, device_id="esp32-dedup"):
+    return {"deviceId": device_id, "ts": ts, "temperature": temperature, "humidity": 50}
+
+
+def _stored(db_session, device_id):
+    return db_session.execute(
+        select(Telemetry.ts, Telemetry.temperature)
+        .where(Telemetry.device_id == device_id)
+        .order_by(Telemetry.ts)
+    ).all()
+
+
+def test_recent_keys_filters_repeats_after_commit():
+    keys = RecentKeys(per_device=2)
+    row = {"device_id": "d", "ts": 1, "temperature": 1.0, "humidity": 2.0}
+    assert keys.filter([row, dict(row)]) == [row]
+    keys.remember([row])
+    assert keys.filter([row]) == []
+    keys.remember([dict(row, ts=2), dict(row, ts=3)])
+    assert keys.filter([row]) == [row]  # evicted: only two keys per device
+
+    updating = RecentKeys(per_device=4, match_values=True)
+    updating.remember([row])
+    corrected = dict(row, temperature=1.5)
+    assert updating.filter([row, corrected]) == [corrected]
+
+
+def test_duplicate_readings_are_skipped_and_counted(client, db_session):
+    before = ingest_duplicates.value("http", "db")
+    client.post("/ingest", json=_reading(100))
+    client.post("/ingest", json=_reading(100, temperature=99))
+    resp = client.post(
+        "/ingest/batch", json=[_reading(100), _reading(101), _reading(101)]
+    )
+
+    assert resp.json()["accepted"] == 1
+    assert resp.json()["duplicates"] == 2
+    assert _stored(db_session, "esp32-dedup") == [(100, 20.0), (101, 20.0)]
+    assert ingest_duplicates.value("http", "db") >= before + 2
+
+
+def test_update_mode_overwrites_and_memory_filter_short_circuits(
+    client, db_session, monkeypatch
+):
+    monkeypatch.setattr(settings, "INGEST_DEDUP", "update")
+    monkeypatch.setattr(settings, "ROLLUPS_ENABLED", True)
+    monkeypatch.setattr(
+        services, "recent_keys", RecentKeys(per_device=8, match_values=True)
+    )
+    device_id = "esp32-dedup-upd"
+    before = ingest_duplicates.value("http", "memory")
+
+    client.post("/ingest", json=_reading(120, device_id=device_id))
+    client.post("/ingest", json=_reading(120, device_id=device_id))
+    client.post("/ingest", json=_reading(120, temperature=21.5, device_id=device_id))
+
+    assert ingest_duplicates.value("http", "memory") == before + 1
+    assert _stored(db_session, device_id) == [(120, 21.5)]
+    counts = db_session.execute(
+        select(Telemetry1m.count).where(Telemetry1m.device_id == device_id)
+    ).scalars()
+    assert list(counts) == [1]
+
+
+def test_dedup_off_keeps_repeats_until_the_unique_key_is_enabled(monkeypatch):
+    engine = create_engine(
+        "sqlite://",
+        connect_args={"check_same_thread": False},
+        poolclass=StaticPool,
+    )
+    Base.metadata.create_all(engine)
+    with engine.begin() as conn:
+        disable_unique_key(conn)
+    monkeypatch.setattr(settings, "INGEST_DEDUP", "off")
+    row = {"device_id": "esp32-dedup-off", "ts": 1, "temperature": 1.0, "humidity": 2}
+    with sessionmaker(bind=engine)() as db:
+        assert services.persist_telemetry_batch(db, [row, dict(row)]) == 2
+        assert services.persist_telemetry_batch(db, [dict(row, ts=2)]) == 1
+
+    with engine.begin() as conn:
+        enable_unique_key(conn)
+        indexes = {ix["name"] for ix in inspect(conn).get_indexes("telemetry")}
+        assert UNIQUE_INDEX in indexes and PLAIN_INDEX not in indexes
+        count = "SELECT count(*) FROM {}"
+        assert conn.execute(text(count.format("telemetry"))).scalar() == 2
+        assert conn.execute(text(count.format("telemetry_duplicates"))).scalar() == 1
+
+        disable_unique_key(conn)
+        assert conn.execute(text(count.format("telemetry"))).scalar() == 3
+        assert not inspect(conn).has_table("telemetry_duplicates")
+    engine.dispose()
+
+
+def test_record_ingest_error_db_argument_is_deprecated():
+    with pytest.deprecated_call():
+        services.record_ingest_error(object(), reason="legacy caller")
@@ -0,0 +1,61 @@
+from sqlalchemy import select
+
+from app.errorsink import BUFFER_FULL_REASON, RATE_LIMITED_REASON, ErrorSink
+from app.models import IngestError
+
+
+def test_repeats_coalesce_into_one_row(session_factory, db_session):
+    sink = ErrorSink(session_factory, window=60, per_device_limit=2)
+    device_id = "esp32-spam"
+
+    sink.record([("invalid JSON payload", device_id)] * 3)
+    assert sink.flush() == 3
+    sink.record([("invalid JSON payload", device_id)] * 2)
+    assert sink.flush() == 2
+    sink.record(
+        [("missing humidity", device_id), ("bad ts", device_id), ("x", device_id)]
+    )
+    assert sink.flush() == 3
+    assert sink.pending() == 0
+
+    rows = db_session.execute(
+        select(IngestError.reason, IngestError.count)
+        .where(IngestError.device_id == device_id)
+        .order_by(IngestError.id)
+    ).all()
+    assert [tuple(r) for r in rows] == [
+        ("invalid JSON payload", 5),
+        ("missing humidity", 1),
+        (RATE_LIMITED_REASON, 2),
+    ]
+
+
+def test_rows_reopen_after_window(session_factory, db_session):
+    sink = ErrorSink(session_factory, window=0)
+    sink.record([("sensor timeout", "esp32-window")])
+    sink.flush()
+    sink.record([("sensor timeout", "esp32-window")])
+    sink.flush()
+
+    counts = db_session.execute(
+        select(IngestError.count).where(IngestError.device_id == "esp32-window")
+    ).scalars()
+    assert list(counts) == [1, 1]
+
+
+def test_buffer_is_capped_and_device_ids_truncated(session_factory, db_session):
+    sink = ErrorSink(session_factory, window=60, max_entries=2)
+    long_id = "esp32-" + "x" * 200
+    sink.record([("a", long_id), ("b", long_id), ("c", long_id), ("d", None)])
+    assert sink.flush() == 4
+
+    rows = db_session.execute(
+        select(IngestError.device_id, IngestError.reason, IngestError.count)
+        .where(IngestError.reason.in_(["a", "b", BUFFER_FULL_REASON]))
+        .order_by(IngestError.id)
+    ).all()
+    assert [tuple(r) for r in rows] == [
+        (long_id[:100], "a", 1),
+        (long_id[:100], "b", 1),
+        (None, BUFFER_FULL_REASON, 2),
+    ]
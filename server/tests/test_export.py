@@ -0,0 +1,49 @@
+import csv
+import io
+import json
+
+from app.settings import settings
+
+
+def _seed(client, device_id, count):
+    rows = [
+        {
+            "deviceId": device_id,
+            "ts": 2_000_000 + i,
+            "temperature": 20 + i,
+            "humidity": 40,
+        }
+        for i in range(count)
+    ]
+    assert client.post("/ingest/batch", json=rows).json()["accepted"] == count
+
+
+def test_export_csv_pages_through_range(client, monkeypatch):
+    monkeypatch.setattr(settings, "EXPORT_PAGE_SIZE", 3)
+    _seed(client, "esp32-export-a", 7)
+    _seed(client, "esp32-export-b", 2)
+
+    resp = client.get(
+        "/export",
+        params={"from": 2_000_001, "to": 2_000_005, "tsFormat": "epoch"},
+    )
+    assert resp.status_code == 200
+    assert resp.headers["content-type"].startswith("text/csv")
+    rows = list(csv.reader(io.StringIO(resp.text)))
+    assert rows[0] == ["deviceId", "ts", "temperature", "humidity"]
+    keys = [(r[0], int(r[1])) for r in rows[1:] if r[0].startswith("esp32-export")]
+    assert keys == [("esp32-export-a", 2_000_000 + i) for i in range(1, 6)] + [
+        ("esp32-export-b", 2_000_001)
+    ]
+
+
+def test_export_ndjson_for_one_device(client, monkeypatch):
+    monkeypatch.setattr(settings, "EXPORT_PAGE_SIZE", 2)
+    _seed(client, "esp32-export-nd", 5)
+
+    resp = client.get(
+        "/export", params={"deviceId": "esp32-export-nd", "format": "ndjson"}
+    )
+    lines = [json.loads(line) for line in resp.text.splitlines()]
+    assert [line["temperature"] for line in lines] == [20, 21, 22, 23, 24]
+    assert lines[0]["ts"] == "1970-01-24T03:33:20Z"
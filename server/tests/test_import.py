@@ -0,0 +1,59 @@
+import json
+
+from sqlalchemy import select
+
+from app.importer import import_file
+from app.models import Telemetry
+
+
+def test_import_csv_resumes_from_checkpoint(tmp_path, db_session):
+    path = tmp_path / "dump.csv"
+    lines = ["deviceId,ts,temperature,humidity"]
+    lines += [f"esp32-import,{7000 + i},{20 + i},50" for i in range(5)]
+    lines.insert(3, "esp32-import,not-a-ts,1,1")
+    path.write_text("\n".join(lines) + "\n")
+
+    stats = import_file(db_session, path, chunk_size=2)
+    assert (stats.read, stats.inserted, stats.rejected) == (6, 5, 1)
+    checkpoint = json.loads((tmp_path / "dump.csv.import-checkpoint").read_text())
+    assert checkpoint["done"] and checkpoint["offset"] == path.stat().st_size
+
+    # Appending and re-running only imports the new tail.
+    with open(path, "a") as fh:
+        fh.write("esp32-import,7005,30,50\n")
+    again = import_file(db_session, path)
+    assert (again.read, again.inserted) == (1, 1)
+
+    stored = db_session.execute(
+        select(Telemetry.ts).where(Telemetry.device_id == "esp32-import")
+    ).scalars()
+    assert sorted(stored) == [7000 + i for i in range(6)]
+
+
+def test_import_ndjson_skips_existing_keys(tmp_path, db_session):
+    path = tmp_path / "site.ndjson"
+    rows = [
+        {
+            "deviceId": "esp32-ndimport",
+            "ts": 8000 + i % 3,
+            "temperature": 1,
+            "humidity": 2,
+        }
+        for i in range(4)
+    ]
+    path.write_text("".join(json.dumps(r) + "\n" for r in rows))
+
+    stats = import_file(db_session, path, resume=False)
+    assert (stats.read, stats.inserted) == (4, 3)
+
+
+def test_import_skips_rows_outside_column_limits(tmp_path, db_session):
+    path = tmp_path / "limits.csv"
+    lines = ["deviceId,ts,temperature,humidity", "esp32-limits-csv,9000,1,2"]
+    lines += [f"{'x' * 101},9001,1,2", f"esp32-limits-csv,{'9' * 25},1,2"]
+    lines += ["esp32-limits-csv,9002,1,2"]
+    path.write_text("\n".join(lines) + "\n")
+
+    stats = import_file(db_session, path, chunk_size=10)
+    assert (stats.read, stats.inserted, stats.rejected) == (4, 2, 2)
+    assert json.loads((tmp_path / "limits.csv.import-checkpoint").read_text())["done"]
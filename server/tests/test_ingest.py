@@ -1,5 +1,10 @@
 from datetime import datetime, timedelta, timezone
 
+from sqlalchemy import func, select
+
+from app.models import Device
+from app.registry import device_registry
+
 
 def _iso_to_dt(value: str) -> datetime:
     return datetime.fromisoformat(value.replace("Z", "+00:00"))
@@ -41,3 +46,30 @@ def test_latest_and_metrics(client):
     metrics = client.get("/metrics", params={"deviceId": device_id}).json()
     assert [point["temp"] for point in metrics] == [22.2, 22.5, 22.7]
     assert metrics[-1]["ts"] == body["ts"]
+
+
+def test_ingest_registers_device_once(client, db_session):
+    device_id = "esp32-registry"
+    device_registry.invalidate(device_id)
+    for ts in (1, 2):
+        client.post(
+            "/ingest",
+            json={"deviceId": device_id, "ts": ts, "temperature": 1, "humidity": 1},
+        )
+
+    assert device_id in device_registry
+    count = db_session.execute(
+        select(func.count()).select_from(Device).where(Device.device_id == device_id)
+    ).scalar_one()
+    assert count == 1
+
+    # A stale cache miss must not create a duplicate row.
+    device_registry.invalidate(device_id)
+    client.post(
+        "/ingest",
+        json={"deviceId": device_id, "ts": 3, "temperature": 1, "humidity": 1},
+    )
+    count = db_session.execute(
+        select(func.count()).select_from(Device).where(Device.device_id == device_id)
+    ).scalar_one()
+    assert count == 1
@@ -0,0 +1,145 @@
+import asyncio
+
+from app.downsample import alttb, lttb
+
+
+def _seed(client, device_id, count, step=10):
+    rows = [
+        {
+            "deviceId": device_id,
+            "ts": 1_000_000 + i * step,
+            "temperature": 20 + (i % 10),
+            "humidity": 50,
+        }
+        for i in range(count)
+    ]
+    assert client.post("/ingest/batch", json=rows).json()["accepted"] == count
+
+
+def test_metrics_aggregates_buckets_in_range(client):
+    _seed(client, "esp32-rollup", 30)
+
+    resp = client.get(
+        "/metrics",
+        params={
+            "deviceId": "esp32-rollup",
+            "from": 1_000_000,
+            "to": 1_000_299,
+            "bucket": 100,
+        },
+    )
+    assert resp.status_code == 200
+    buckets = resp.json()
+    assert [b["count"] for b in buckets] == [10, 10, 10]
+    assert buckets[0]["ts"] == "1970-01-12T13:46:40Z"
+    assert buckets[0]["tempMin"] == 20 and buckets[0]["tempMax"] == 29
+    assert buckets[0]["temp"] == 24.5 and buckets[0]["hum"] == 50
+
+
+def test_metrics_max_points_limits_bucket_count(client):
+    _seed(client, "esp32-maxpoints", 50)
+
+    params = {"deviceId": "esp32-maxpoints", "from": 1_000_000, "to": 1_000_499}
+    buckets = client.get("/metrics", params={**params, "maxPoints": 5}).json()
+    assert len(buckets) == 5
+    assert sum(b["count"] for b in buckets) == 50
+
+    points = client.get(
+        "/metrics", params={**params, "maxPoints": 7, "mode": "lttb"}
+    ).json()
+    assert len(points) == 7
+    assert points[0]["ts"] == "1970-01-12T13:46:40Z"
+
+
+def test_metrics_since_returns_only_newer_points(client):
+    _seed(client, "esp32-since", 5)
+
+    params = {"deviceId": "esp32-since"}
+    points = client.get("/metrics", params={**params, "since": 1_000_020}).json()
+    assert [p["ts"] for p in points] == ["1970-01-12T13:47:10Z", "1970-01-12T13:47:20Z"]
+
+    # The ISO ``ts`` of the last point held works as the cursor too.
+    assert (
+        client.get("/metrics", params={**params, "since": points[-1]["ts"]}).json()
+        == []
+    )
+    assert client.get("/metrics", params={**params, "since": "soon"}).status_code == 400
+
+
+def test_metrics_etag_answers_304_until_new_data(client):
+    _seed(client, "esp32-etag", 3)
+
+    params = {"deviceId": "esp32-etag"}
+    first = client.get("/metrics", params=params)
+    etag = first.headers["etag"]
+    assert first.headers["last-modified"].endswith(" GMT")
+
+    again = client.get("/metrics", params=params, headers={"If-None-Match": etag})
+    assert again.status_code == 304 and again.content == b""
+
+    client.post(
+        "/ingest",
+        json={
+            "deviceId": "esp32-etag",
+            "ts": 1_000_030,
+            "temperature": 1,
+            "humidity": 2,
+        },
+    )
+    changed = client.get("/metrics", params=params, headers={"If-None-Match": etag})
+    assert changed.status_code == 200 and len(changed.json()) == 4
+    assert changed.headers["etag"] != etag
+
+
+def test_metrics_etag_changes_for_late_readings(client):
+    _seed(client, "esp32-late", 3)
+
+    raw = {"deviceId": "esp32-late"}
+    ranged = {**raw, "from": 1_000_000, "to": 1_000_100, "bucket": 10}
+    etags = {
+        "raw": client.get("/metrics", params=raw).headers["etag"],
+        "ranged": client.get("/metrics", params=ranged).headers["etag"],
+    }
+
+    # Older than the latest reading, as from a spool replay or an import.
+    client.post(
+        "/ingest",
+        json={
+            "deviceId": "esp32-late",
+            "ts": 1_000_005,
+            "temperature": 1,
+            "humidity": 2,
+        },
+    )
+    resp = client.get("/metrics", params=raw, headers={"If-None-Match": etags["raw"]})
+    assert resp.status_code == 200 and len(resp.json()) == 4
+    resp = client.get(
+        "/metrics", params=ranged, headers={"If-None-Match": etags["ranged"]}
+    )
+    assert resp.status_code == 200
+    assert sum(bucket["count"] for bucket in resp.json()) == 4
+
+
+def test_lttb_keeps_endpoints_and_extremes():
+    series = [(x, 100.0 if x == 37 else 0.0, 0.0) for x in range(100)]
+    reduced = list(lttb(series, len(series), 10))
+    assert len(reduced) == 10
+    assert reduced[0][0] == 0 and reduced[-1][0] == 99
+    assert (37, 100.0, 0.0) in reduced
+
+
+def test_lttb_clamps_tiny_thresholds():
+    series = [(x, float(x), 0.0) for x in range(100)]
+
+    async def source():
+        for point in series:
+            yield point
+
+    async def reduce(threshold):
+        return [point async for point in alttb(source(), len(series), threshold)]
+
+    for threshold in (0, 1, 2):
+        reduced = list(lttb(series, len(series), threshold))
+        assert len(reduced) == 3
+        assert reduced[0][0] == 0 and reduced[-1][0] == 99
+        assert asyncio.run(reduce(threshold)) == reduced
@@ -0,0 +1,140 @@
+import paho.mqtt.client as mqtt
+from sqlalchemy import select
+
+from app.decoder import encode_binary
+from app.errorsink import error_sink
+from app.models import IngestError, Telemetry
+from app.mqtt import MQTTIngestService, device_from_topic
+from app.services import DB_REJECTED_REASON
+from app.writer import QUEUE_FULL_REASON, TelemetryWriter
+
+
+def _message(payload: bytes, topic: str = "Test") -> mqtt.MQTTMessage:
+    msg = mqtt.MQTTMessage(topic=topic.encode())
+    msg.payload = payload
+    return msg
+
+
+def _service(session_factory, **kwargs) -> MQTTIngestService:
+    kwargs.setdefault("topic", "Test")
+    return MQTTIngestService(
+        broker="",
+        port=1883,
+        default_device_id="esp32-01",
+        session_factory=session_factory,
+        **kwargs,
+    )
+
+
+def test_on_message_is_flushed_by_writer(session_factory, db_session):
+    service = _service(session_factory, flush_size=2, flush_interval=5)
+    service.writer.start()
+    for ts in (1000, 1001, 1002):
+        service._on_message(
+            None,
+            None,
+            _message(
+                b'{"deviceId":"esp32-mqtt","ts":%d,"temperature":21.5,"humidity":40}'
+                % ts
+            ),
+        )
+    service.writer.stop()
+
+    rows = db_session.execute(
+        select(Telemetry.ts).where(Telemetry.device_id == "esp32-mqtt")
+    ).scalars()
+    assert sorted(rows) == [1000, 1001, 1002]
+    stats = service.stats()
+    assert stats["flushed_total"] == 3
+    assert stats["queue_depth"] == 0
+
+
+def test_writer_drop_mode_records_error(session_factory, db_session):
+    writer = TelemetryWriter(
+        session_factory=session_factory, queue_size=1, backpressure="drop"
+    )
+    row = {"device_id": "esp32-drop", "ts": 1, "temperature": 1.0, "humidity": 1.0}
+    assert writer.submit(row) is True
+    assert writer.submit(dict(row, ts=2)) is False
+
+    writer.start()
+    writer.stop()
+
+    assert writer.stats()["dropped_total"] == 1
+    error_sink.flush()
+    reasons = db_session.execute(
+        select(IngestError.reason).where(IngestError.device_id == "esp32-drop")
+    ).scalars()
+    assert list(reasons) == [QUEUE_FULL_REASON]
+
+
+def test_writer_isolates_rows_the_database_rejects(session_factory, db_session):
+    writer = TelemetryWriter(session_factory=session_factory, flush_size=4)
+    rows = [
+        {"device_id": "esp32-bad", "ts": ts, "temperature": 1.0, "humidity": 1.0}
+        for ts in (1, 2, 2**70, 4)
+    ]
+    writer.start()
+    for row in rows:
+        writer.submit(row)
+    writer.submit(dict(rows[0], ts=5))
+    writer.stop()
+
+    stored = db_session.execute(
+        select(Telemetry.ts).where(Telemetry.device_id == "esp32-bad")
+    ).scalars()
+    assert sorted(stored) == [1, 2, 4, 5]
+    error_sink.flush()
+    reasons = db_session.execute(
+        select(IngestError.reason).where(IngestError.device_id == "esp32-bad")
+    ).scalars()
+    assert list(reasons) == [DB_REJECTED_REASON]
+
+
+def test_binary_topic_ingests_batched_samples(session_factory, db_session):
+    service = _service(session_factory, binary_topic="Test/bin/+")
+    service.writer.start()
+    payload = encode_binary("esp32-bin", [(2000, 21.5, 40.0), (2002, 21.75, 41.0)])
+    service._on_message(None, None, _message(payload, topic="Test/bin/esp32-bin"))
+    service.writer.stop()
+
+    rows = db_session.execute(
+        select(Telemetry.ts, Telemetry.temperature)
+        .where(Telemetry.device_id == "esp32-bin")
+        .order_by(Telemetry.ts)
+    ).all()
+    assert [tuple(row) for row in rows] == [(2000, 21.5), (2002, 21.75)]
+
+
+def test_topic_filters_shared_group_and_device_from_topic(session_factory, db_session):
+    assert device_from_topic("devices/+/telemetry", "devices/esp32-7/telemetry") == (
+        "esp32-7"
+    )
+    assert device_from_topic("$share/g/devices/+/telemetry", "devices/x/y") is None
+
+    service = _service(
+        session_factory,
+        topic=["devices/+/telemetry", "Test"],
+        binary_topic="devices/+/bin",
+        shared_group="ingest",
+    )
+    assert service.subscriptions == [
+        "$share/ingest/devices/+/telemetry",
+        "$share/ingest/Test",
+        "$share/ingest/devices/+/bin",
+    ]
+
+    service.writer.start()
+    service._on_message(
+        None,
+        None,
+        _message(
+            b'{"ts":3000,"temperature":20,"humidity":30}',
+            topic="devices/esp32-topic/telemetry",
+        ),
+    )
+    service.writer.stop()
+    rows = db_session.execute(
+        select(Telemetry.ts).where(Telemetry.device_id == "esp32-topic")
+    ).scalars()
+    assert list(rows) == [3000]
@@ -0,0 +1,75 @@
+import time
+
+from sqlalchemy.exc import IntegrityError, OperationalError
+
+from app.presence import PresenceWatchdog
+
+
+def test_watchdog_emits_transitions_once(client, db_session, session_factory):
+    device_id = "esp32-presence"
+    now = int(time.time())
+    client.post(
+        "/ingest",
+        json={"deviceId": device_id, "ts": now, "temperature": 20, "humidity": 50},
+    )
+    watchdog = PresenceWatchdog(60, session_factory)
+
+    watchdog.seen([{"device_id": device_id, "ts": now}], now=now)
+    watchdog.seen([{"device_id": device_id, "ts": now + 1}], now=now + 1)
+    assert watchdog.flush(now + 1) == 1
+    assert watchdog.is_online(device_id)
+
+    # A later reading pushes the deadline back instead of expiring.
+    watchdog.seen([{"device_id": device_id, "ts": now + 30}], now=now + 30)
+    assert watchdog.flush(now + 70) == 0
+    assert watchdog.flush(now + 91) == 1
+    assert not watchdog.is_online(device_id)
+
+    events = client.get("/presence", params={"deviceId": device_id}).json()
+    assert [e["online"] for e in events] == [False, True]
+    clamped = client.get("/presence", params={"deviceId": device_id, "limit": -1})
+    assert clamped.status_code == 200 and len(clamped.json()) == 1
+
+    # Backfilled readings older than the grace period do not flap the state.
+    watchdog.seen([{"device_id": device_id, "ts": now + 31}], now=now + 200)
+    assert watchdog.flush(now + 200) == 0
+
+    restarted = PresenceWatchdog(60, session_factory)
+    assert restarted.warm(db_session) == 0
+
+
+def test_failed_flush_keeps_transitions(client, session_factory):
+    device_id = "esp32-presence-outage"
+    now = int(time.time())
+    client.post(
+        "/ingest",
+        json={"deviceId": device_id, "ts": now, "temperature": 20, "humidity": 50},
+    )
+    database_up = False
+
+    def flaky_factory():
+        if not database_up:
+            raise OperationalError("INSERT", {}, Exception("database down"))
+        return session_factory()
+
+    watchdog = PresenceWatchdog(60, flaky_factory)
+    watchdog.seen([{"device_id": device_id, "ts": now}], now=now)
+    assert watchdog.flush(now) == 0
+    assert watchdog.flush(now + 61) == 0
+    assert not watchdog.is_online(device_id)
+
+    database_up = True
+    assert watchdog.flush(now + 62) == 2
+    events = client.get("/presence", params={"deviceId": device_id}).json()
+    assert [e["online"] for e in events] == [False, True]
+
+
+def test_refused_transitions_are_dropped(session_factory):
+    def refusing_factory():
+        raise IntegrityError("INSERT", {}, Exception("unknown device"))
+
+    now = int(time.time())
+    watchdog = PresenceWatchdog(60, refusing_factory)
+    watchdog.seen([{"device_id": "esp32-presence-gone", "ts": now}], now=now)
+    assert watchdog.flush(now) == 0
+    assert watchdog.expire(now) == []
@@ -0,0 +1,46 @@
+from app.prometheus import Histogram, ingest_ok
+
+
+def test_histogram_renders_cumulative_buckets():
+    hist = Histogram("demo_seconds", "Demo.", ("source",), buckets=(0.1, 1.0))
+    for value in (0.05, 0.5, 0.7, 3.0):
+        hist.observe(value, "http")
+
+    assert hist.samples() == [
+        'demo_seconds_bucket{source="http",le="0.1"} 1',
+        'demo_seconds_bucket{source="http",le="1"} 3',
+        'demo_seconds_bucket{source="http",le="+Inf"} 4',
+        'demo_seconds_sum{source="http"} 4.25',
+        'demo_seconds_count{source="http"} 4',
+    ]
+
+
+def test_prometheus_scrape_reports_ingest_and_request_metrics(client):
+    before = ingest_ok.value("http", "esp32-prom")
+    client.post(
+        "/ingest",
+        json={"deviceId": "esp32-prom", "ts": 100, "temperature": 1, "humidity": 2},
+    )
+    client.post(
+        "/ingest/batch",
+        json=[
+            {"deviceId": "esp32-prom", "ts": 101, "temperature": 1, "humidity": 2},
+            {"deviceId": "esp32-prom", "ts": "bad"},
+        ],
+    )
+    assert ingest_ok.value("http", "esp32-prom") == before + 2
+
+    resp = client.get("/metrics/prometheus")
+    assert resp.status_code == 200
+    assert resp.headers["content-type"].startswith("text/plain; version=0.0.4")
+    body = resp.text
+    assert "# TYPE ingest_ok_total counter" in body
+    assert 'ingest_error_total{source="http",device="esp32-prom"}' in body
+    assert 'ingest_db_commit_seconds_count{source="http"}' in body
+    assert 'ingest_parse_seconds_count{source="http"}' in body
+    assert "db_pool_checkout_wait_seconds" in body
+    assert "mqtt_ingest_queue_depth 0" in body
+    assert (
+        'http_request_duration_seconds_count{method="POST",route="/ingest",status="200"}'
+        in body
+    )
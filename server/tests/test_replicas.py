@@ -0,0 +1,37 @@
+from sqlalchemy import create_engine, text
+from sqlalchemy.orm import sessionmaker
+
+from app import db as db_module
+from app.db import ReplicaSet, read_session
+
+
+def test_replicas_rotate_and_skip_failed(monkeypatch):
+    a, b, c = (f"postgresql://replica-{n}/iot" for n in "abc")
+    replicas = ReplicaSet([a, b, c], retry_after=30)
+    assert replicas.candidates() == [a, b, c]
+    assert replicas.candidates() == [b, c, a]
+
+    replicas.mark_down(c)
+    assert replicas.candidates() == [a, b]
+
+    now = db_module.time.monotonic()
+    monkeypatch.setattr(db_module.time, "monotonic", lambda: now + 31)
+    assert replicas.candidates() == [a, b, c]
+
+
+def test_read_session_fails_over_to_next_replica(monkeypatch, tmp_path):
+    bad = "sqlite:////nonexistent/replica.db"
+    good = f"sqlite:///{tmp_path / 'replica.db'}"
+    replicas = ReplicaSet([bad, good], retry_after=30)
+    sessions = {url: sessionmaker(bind=create_engine(url)) for url in (bad, good)}
+    monkeypatch.setattr(db_module, "replicas", replicas)
+    monkeypatch.setattr(db_module, "_read_sessions", sessions)
+
+    with read_session() as db:
+        assert db.get_bind().url.render_as_string() == good
+        assert db.execute(text("SELECT 1")).scalar_one() == 1
+    # The failed replica is skipped without another connection attempt.
+    assert replicas.candidates() == [good]
+
+    with read_session(primary=True) as db:
+        assert db.get_bind() is db_module.SessionLocal.kw["bind"]
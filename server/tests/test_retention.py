@@ -0,0 +1,102 @@
+from datetime import datetime, timezone
+
+import pytest
+from sqlalchemy import select
+
+from app.models import Telemetry
+from app.retention import (
+    DEFAULT_PARTITION,
+    apply_retention,
+    ensure_partitions,
+    expired_rows_statement,
+    is_partitioned,
+    list_partitions,
+    partition_telemetry,
+    run_maintenance,
+)
+from app.settings import settings
+
+NOW = datetime(2026, 3, 15, 12, tzinfo=timezone.utc)
+DAY = 86400
+
+
+def _ingest(client, device_id, *timestamps):
+    rows = [
+        {"deviceId": device_id, "ts": ts, "temperature": 1, "humidity": 1}
+        for ts in timestamps
+    ]
+    client.post("/ingest/batch", json=rows)
+
+
+def _stored(db_session, device_id):
+    return sorted(
+        db_session.execute(
+            select(Telemetry.ts).where(Telemetry.device_id == device_id)
+        ).scalars()
+    )
+
+
+def test_retention_deletes_rows_past_cutoff(client, db_session, migrated_engine):
+    now_ts = int(NOW.timestamp())
+    _ingest(client, "esp32-retention", now_ts - 40 * DAY, now_ts - 2 * DAY, now_ts)
+
+    with migrated_engine.begin() as conn:
+        assert apply_retention(conn, 0, now=NOW) == 0
+        assert apply_retention(conn, 30, now=NOW, batch_size=1) >= 1
+
+    assert _stored(db_session, "esp32-retention") == [now_ts - 2 * DAY, now_ts]
+
+
+def test_maintenance_commits_retention_batches(
+    client, db_session, migrated_engine, monkeypatch
+):
+    now_ts = int(datetime.now(tz=timezone.utc).timestamp())
+    _ingest(client, "esp32-maintenance", now_ts - 40 * DAY, now_ts - 35 * DAY, now_ts)
+    monkeypatch.setattr(settings, "TELEMETRY_RETENTION_DAYS", 30)
+
+    run_maintenance(migrated_engine)
+
+    assert _stored(db_session, "esp32-maintenance") == [now_ts]
+
+
+def test_expired_rows_statement_targets_default_partition_only():
+    partitioned = str(expired_rows_statement(True, 100, 10))
+    assert partitioned.startswith(f"DELETE FROM {DEFAULT_PARTITION} ")
+    assert "FROM telemetry " not in partitioned
+    assert str(expired_rows_statement(False, 100, 10)).startswith(
+        "DELETE FROM telemetry "
+    )
+
+
+def test_partitioned_telemetry_drops_expired_partitions(
+    client, db_session, migrated_engine
+):
+    if migrated_engine.dialect.name != "postgresql":
+        pytest.skip("declarative partitioning requires PostgreSQL")
+
+    now_ts = int(NOW.timestamp())
+    _ingest(client, "esp32-partitioned", now_ts - 60 * DAY)
+    with migrated_engine.begin() as conn:
+        partition_telemetry(conn, "monthly", 1, now=NOW)
+        assert is_partitioned(conn)
+        names = [name for name, _, _ in list_partitions(conn)]
+        assert names == [DEFAULT_PARTITION, "telemetry_p202603", "telemetry_p202604"]
+
+    _ingest(client, "esp32-partitioned", now_ts)
+    with migrated_engine.begin() as conn:
+        ensure_partitions(
+            conn, "monthly", 1, now=datetime(2026, 5, 2, tzinfo=timezone.utc)
+        )
+        removed = apply_retention(
+            conn, 10, now=datetime(2026, 5, 2, tzinfo=timezone.utc)
+        )
+        names = [name for name, _, _ in list_partitions(conn)]
+
+    assert removed == 2  # the March partition plus the old default row
+    assert names == [
+        DEFAULT_PARTITION,
+        "telemetry_p202604",
+        "telemetry_p202605",
+        "telemetry_p202606",
+    ]
+    assert _stored(db_session, "esp32-partitioned") == []
@@ -0,0 +1,50 @@
+from sqlalchemy import delete, select
+
+from app.models import Telemetry1h, Telemetry1m
+from app.rollups import align_width, backfill, pick_rollup
+from app.settings import settings
+
+
+def _rollup_rows(db_session, model, device_id):
+    return db_session.execute(
+        select(model.bucket, model.count, model.temp_min, model.temp_max)
+        .where(model.device_id == device_id)
+        .order_by(model.bucket)
+    ).all()
+
+
+def test_pick_rollup_prefers_coarsest_table():
+    assert pick_rollup(30) is None
+    assert pick_rollup(90) is None
+    assert pick_rollup(120) is Telemetry1m
+    assert pick_rollup(7200) is Telemetry1h
+    assert align_width(90) == 120
+    assert align_width(3601) == 7200
+
+
+def test_ingest_maintains_rollups_and_metrics_reads_them(
+    client, db_session, monkeypatch
+):
+    monkeypatch.setattr(settings, "ROLLUPS_ENABLED", True)
+    device_id = "esp32-rollups"
+    rows = [
+        {"deviceId": device_id, "ts": 7200 + i * 20, "temperature": i, "humidity": 1}
+        for i in range(6)
+    ]
+    client.post("/ingest/batch", json=rows[:4])
+    client.post("/ingest/batch", json=rows[4:])
+
+    incremental = _rollup_rows(db_session, Telemetry1m, device_id)
+    assert incremental == [(7200, 3, 0, 2), (7260, 3, 3, 5)]
+    assert _rollup_rows(db_session, Telemetry1h, device_id) == [(7200, 6, 0, 5)]
+
+    buckets = client.get(
+        "/metrics",
+        params={"deviceId": device_id, "from": 7200, "to": 7319, "bucket": 60},
+    ).json()
+    assert [(b["count"], b["temp"]) for b in buckets] == [(3, 1.0), (3, 4.0)]
+
+    db_session.execute(delete(Telemetry1m).where(Telemetry1m.device_id == device_id))
+    db_session.commit()
+    backfill(db_session, device_id=device_id)
+    assert _rollup_rows(db_session, Telemetry1m, device_id) == incremental
@@ -0,0 +1,92 @@
+import pytest
+from sqlalchemy import create_engine, select
+from sqlalchemy.exc import IntegrityError
+from sqlalchemy.orm import sessionmaker
+
+from app import services
+from app.decoder import PayloadError
+from app.errorsink import error_sink
+from app.models import IngestError, Telemetry
+from app.spool import Spool, encode_record, read_segment
+from app.writer import TelemetryWriter
+
+
+def _rows(device_id, count):
+    return [
+        {"device_id": device_id, "ts": 5000 + i, "temperature": 20.5, "humidity": 40}
+        for i in range(count)
+    ]
+
+
+def test_segments_rotate_and_stop_at_torn_tail(tmp_path, session_factory):
+    spool = Spool(tmp_path, session_factory=session_factory, segment_bytes=100)
+    assert spool.append(_rows("esp32-spool", 5)) == 5
+    spool.stop()
+
+    segments = sorted(tmp_path.glob("*.spool"))
+    assert len(segments) == 2
+    with open(segments[-1], "ab") as fh:
+        fh.write(b"\x30\x00\x00\x00garbage")
+    rows = [row for path in segments for row, _ in read_segment(path)]
+    assert rows == _rows("esp32-spool", 5)
+    assert spool.stats()["spool_segments"] == 2
+
+
+def test_writer_spools_while_database_is_down(tmp_path, session_factory, db_session):
+    down = sessionmaker(bind=create_engine(f"sqlite:///{tmp_path}/missing/x.db"))
+    spool = Spool(tmp_path / "spool", session_factory=down, retry_interval=60)
+    writer = TelemetryWriter(session_factory=down, spool=spool)
+    for row in _rows("esp32-outage", 3):
+        writer.submit(row)
+    writer.start()
+    writer.stop()
+
+    stats = writer.stats()
+    assert stats["spool_appended_total"] == 3 and stats["spool_dropped_total"] == 0
+
+    # After a restart with the database back, the leftovers are replayed.
+    restarted = Spool(tmp_path / "spool", session_factory=session_factory)
+    assert not restarted.healthy
+    assert restarted.replay() == 3
+    assert restarted.healthy and restarted.stats()["spool_bytes"] == 0
+    stored = db_session.execute(
+        select(Telemetry.ts).where(Telemetry.device_id == "esp32-outage")
+    ).scalars()
+    assert sorted(stored) == [5000, 5001, 5002]
+
+
+def test_replay_skips_rows_the_database_rejects(
+    tmp_path, session_factory, db_session, monkeypatch
+):
+    persist = services.persist_telemetry_batch
+
+    def refuse_poison(db, rows, source="http"):
+        if any(row["device_id"] == "esp32-poison" for row in rows):
+            raise IntegrityError("INSERT", None, Exception("rejected"))
+        return persist(db, rows, source)
+
+    monkeypatch.setattr(services, "persist_telemetry_batch", refuse_poison)
+    spool = Spool(tmp_path, session_factory=session_factory)
+    rows = _rows("esp32-replay", 3)
+    spool.append(rows[:1] + _rows("esp32-poison", 1) + rows[1:])
+    spool.stop()
+
+    assert spool.replay() == 3
+    stats = spool.stats()
+    assert stats["spool_rejected_total"] == 1 and stats["spool_bytes"] == 0
+    stored = db_session.execute(
+        select(Telemetry.ts).where(Telemetry.device_id == "esp32-replay")
+    ).scalars()
+    assert sorted(stored) == [5000, 5001, 5002]
+    error_sink.flush()
+    assert (
+        db_session.execute(
+            select(IngestError.reason).where(IngestError.device_id == "esp32-poison")
+        ).scalar_one()
+        == services.DB_REJECTED_REASON
+    )
+
+
+def test_encode_record_rejects_out_of_range_timestamp():
+    with pytest.raises(PayloadError, match="timestamp out of range"):
+        encode_record(dict(_rows("esp32-range", 1)[0], ts=2**70))
@@ -0,0 +1,49 @@
+import time
+
+from sqlalchemy.exc import OperationalError
+
+from app.db import schema_at_head
+from app.startup import StartupTimer, Warmup, startup_timer
+
+
+def test_health_and_readiness_probes(client):
+    assert client.get("/healthz").json() == {"ok": True}
+
+    resp = client.get("/readyz")
+    assert resp.status_code == 200
+    # MQTT is disabled in the test settings, so it is not a readiness check.
+    assert resp.json() == {"ready": True, "checks": {"warm": True, "db": True}}
+
+
+def test_warmup_retries_database_errors():
+    calls = []
+
+    def flaky():
+        calls.append("flaky")
+        if len(calls) < 3:
+            raise OperationalError("SELECT 1", {}, Exception("down"))
+
+    timer = StartupTimer()
+    warmup = Warmup(
+        [("flaky", flaky), ("after", lambda: calls.append("after"))],
+        timer,
+        retry_interval=0.01,
+    )
+    warmup.start()
+    assert warmup.done.wait(5)
+    warmup.stop()
+    assert calls == ["flaky", "flaky", "flaky", "after"]
+    assert set(timer.phases) == {"flaky", "after"}
+
+
+def test_startup_timer_counts_from_given_start():
+    started = time.perf_counter() - 5
+    timer = StartupTimer(started)
+    timer.mark("imports")
+    assert timer.phases["imports"] >= 5
+    assert startup_timer.phases["imports"] > 0
+
+
+def test_schema_at_head_only_for_migrated_databases(migrated_engine):
+    migrated = migrated_engine.dialect.name == "postgresql"
+    assert schema_at_head(migrated_engine) is migrated
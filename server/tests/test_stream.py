@@ -0,0 +1,53 @@
+import asyncio
+import json
+
+from app.hub import ALL_DEVICES, StreamHub
+
+
+def test_hub_fans_out_and_bounds_slow_subscribers():
+    async def scenario():
+        hub = StreamHub(buffer_size=2)
+        one = hub.subscribe("dev-a")
+        other = hub.subscribe("dev-b")
+        everyone = hub.subscribe(ALL_DEVICES)
+
+        for ts in range(3):
+            hub.publish_readings(
+                [{"device_id": "dev-a", "ts": ts, "temperature": 1.0, "humidity": 2.0}]
+            )
+        await asyncio.sleep(0)
+
+        first = await one.get()
+        second = await one.get()
+        assert one.dropped == 1
+        assert [json.loads(e.data)["ts"] for e in (first, second)] == [
+            "1970-01-01T00:00:01Z",
+            "1970-01-01T00:00:02Z",
+        ]
+        assert first.sse.startswith("event: reading\ndata: ")
+        assert everyone.dropped == 1
+        assert other._queue.empty()
+
+        for sub in (one, other, everyone):
+            hub.unsubscribe(sub)
+        assert hub.subscriber_count() == 0
+
+    asyncio.run(scenario())
+
+
+def test_websocket_stream_receives_ingested_readings(client):
+    device_id = "esp32-stream"
+    with client.websocket_connect(f"/stream/ws?deviceId={device_id}") as ws:
+        client.post(
+            "/ingest",
+            json={"deviceId": device_id, "ts": 60, "temperature": 20, "humidity": 30},
+        )
+        frame = ws.receive_json()
+
+    assert frame["event"] == "reading"
+    assert frame["data"] == {
+        "deviceId": device_id,
+        "ts": "1970-01-01T00:01:00Z",
+        "temp": 20.0,
+        "hum": 30.0,
+    }
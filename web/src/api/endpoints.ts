@@ -5,6 +5,8 @@ import {
   MetricsSchema,
   StatusSchema,
   ErrorsSchema,
+  ErrorSchema,
+  MetricPointSchema,
 } from "../schemas";
 
 export async function fetchLatest(): Promise<Latest> {
@@ -12,9 +14,20 @@ export async function fetchLatest(): Promise<Latest> {
   return LatestSchema.parse(data);
 }
 
-export async function fetchMetrics(): Promise<MetricPoint[]> {
-  const { data } = await api.get("/metrics");
-  return MetricsSchema.parse(data);
+const MAX_POINTS = 300;
+const MAX_ERRORS = 20;
+
+// Fetches only points newer than the last one held (`since`) and appends them;
+// the server answers an unchanged poll from its in-memory latest reading.
+export async function fetchMetrics(
+  current: MetricPoint[] = [],
+): Promise<MetricPoint[]> {
+  const since = current.at(-1)?.ts;
+  const { data } = await api.get("/metrics", {
+    params: since ? { since } : undefined,
+  });
+  const delta = MetricsSchema.parse(data);
+  return since ? [...current, ...delta].slice(-MAX_POINTS) : delta;
 }
 
 export async function fetchStatus(): Promise<Status> {
@@ -22,7 +35,52 @@ export async function fetchStatus(): Promise<Status> {
   return StatusSchema.parse(data);
 }
 
-export async function fetchErrors(): Promise<DeviceError[]> {
-  const { data } = await api.get("/errors");
-  return ErrorsSchema.parse(data);
+// Errors seen after the newest one held; a repeat of a coalesced error comes
+// back with the same id and replaces the old entry.
+export async function fetchErrors(
+  current: DeviceError[] = [],
+): Promise<DeviceError[]> {
+  const since = current[0]?.ts;
+  const { data } = await api.get("/errors", {
+    params: since ? { since } : undefined,
+  });
+  const delta = ErrorsSchema.parse(data);
+  const fresh = new Set(delta.map((e) => e.id));
+  return [...delta, ...current.filter((e) => !fresh.has(e.id))].slice(
+    0,
+    MAX_ERRORS,
+  );
+}
+
+export type StreamHandlers = {
+  onReading: (deviceId: string, point: MetricPoint) => void;
+  onError: (error: DeviceError) => void;
+  onFailure: () => void;
+};
+
+// Server-Sent Events feed replacing the polling loop; returns a cleanup fn.
+export function openStream(
+  handlers: StreamHandlers,
+  deviceId?: string,
+): () => void {
+  const url = new URL("/stream", api.defaults.baseURL);
+  if (deviceId) url.searchParams.set("deviceId", deviceId);
+  const source = new EventSource(url);
+
+  source.addEventListener("reading", (ev) => {
+    const data = JSON.parse(ev.data);
+    handlers.onReading(String(data.deviceId), MetricPointSchema.parse(data));
+  });
+  source.addEventListener("error", (ev) => {
+    // Server-sent "error" events carry data; transport failures do not.
+    if (ev instanceof MessageEvent) {
+      const data = JSON.parse(ev.data);
+      const id = data.id ?? `${data.ts}-${data.msg}`;
+      handlers.onError(ErrorSchema.parse({ ...data, id }));
+    } else if (source.readyState === EventSource.CLOSED) {
+      handlers.onFailure();
+    }
+  });
+
+  return () => source.close();
 }
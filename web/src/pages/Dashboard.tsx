@@ -5,14 +5,14 @@ import StatusPill from "../components/StatusPill";
 import ErrorList from "../components/ErrorList";
 
 export default function Dashboard() {
-  const { latest, metrics, status, errors, lastError, loadAll, pollLatest } =
+  const { latest, metrics, status, errors, lastError, loadAll, subscribe } =
     useStore();
 
   useEffect(() => {
     loadAll();
-    const stop = pollLatest(3000);
+    const stop = subscribe(3000);
     return () => stop();
-  }, [loadAll, pollLatest]);
+  }, [loadAll, subscribe]);
 
   return (
     <div style={{ padding: 24, display: "grid", gap: 16 }}>
@@ -5,6 +5,7 @@ import {
   fetchMetrics,
   fetchStatus,
   fetchErrors,
+  openStream,
 } from "./api/endpoints";
 
 type State = {
@@ -19,6 +20,7 @@ type State = {
 type Actions = {
   loadAll: () => Promise<void>;
   pollLatest: (ms?: number) => () => void; // returns cleanup fn
+  subscribe: (fallbackMs?: number) => () => void; // returns cleanup fn
 };
 
 const STORAGE_KEY = "iot_last_snapshot";
@@ -36,9 +38,9 @@ export const useStore = create<State & Actions>((set, get) => ({
     try {
       const [latest, metrics, status, errors] = await Promise.all([
         fetchLatest(),
-        fetchMetrics(),
+        fetchMetrics(get().metrics),
         fetchStatus(),
-        fetchErrors(),
+        fetchErrors(get().errors),
       ]);
       set({ latest, metrics, status, errors, loading: false });
 
@@ -62,11 +64,11 @@ export const useStore = create<State & Actions>((set, get) => ({
     let alive = true;
     const tick = async () => {
       try {
-        const latest = await fetchLatest();
-        const metrics = [
-          ...get().metrics,
-          { ts: latest.ts, temp: latest.temp, hum: latest.hum },
-        ].slice(-300); // 保持最多 300 點
+        // 只抓上次之後的新點（最多保留 300 點）
+        const [latest, metrics] = await Promise.all([
+          fetchLatest(),
+          fetchMetrics(get().metrics),
+        ]);
         set({ latest, metrics, lastError: undefined });
         localStorage.setItem(
           STORAGE_KEY,
@@ -83,4 +85,35 @@ export const useStore = create<State & Actions>((set, get) => ({
       alive = false;
     };
   },
+
+  // 以 SSE 推播取代輪詢；連線失敗時退回 pollLatest
+  subscribe: (fallbackMs = 3000) => {
+    if (typeof EventSource === "undefined") {
+      return get().pollLatest(fallbackMs);
+    }
+
+    let stopPolling: (() => void) | undefined;
+    const close = openStream({
+      onReading: (id, point) => {
+        const latest = { ...point, id, online: true };
+        const metrics = [...get().metrics, point].slice(-300); // 保持最多 300 點
+        const status = { id: latest.id, online: true, updatedAt: point.ts };
+        set({ latest, metrics, status, lastError: undefined });
+        localStorage.setItem(
+          STORAGE_KEY,
+          JSON.stringify({ latest, metrics, status }),
+        );
+      },
+      onError: (error) => {
+        set({ errors: [error, ...get().errors].slice(0, 20) });
+      },
+      onFailure: () => {
+        stopPolling ??= get().pollLatest(fallbackMs);
+      },
+    });
+    return () => {
+      close();
+      stopPolling?.();
+    };
+  },
 }));